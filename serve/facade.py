@@ -1,45 +1,74 @@
 from __future__ import absolute_import, unicode_literals
 
 from celery import Celery
+from celery.signals import worker_init, worker_process_shutdown
 
+import serve.lfmc.config.caching as caching
 from serve.lfmc.query.ShapeQuery import ShapeQuery
 from serve.lfmc.models.ModelRegister import ModelRegister
-from serve.lfmc.results.ModelResult import ModelResultSchema
+from serve.lfmc.models.Availability import AvailabilityIndex
+from serve.lfmc.results.ModelResult import ModelResult
+from serve.lfmc.results.ResultStream import ResultStream
+from serve.lfmc.resource.ResultStore import ResultStore
 from serve.lfmc.process.Conversion import Conversion
+from serve.lfmc.process.Progress import ProgressReporter
+from serve.lfmc.process.Profiling import QueryProfile
+from serve.lfmc.util import metrics
+from serve.lfmc.util import datasets
 
 import json
 import asyncio
-import logging
+from dateutil.parser import parse
+from serve.lfmc.util import logs
 
-logging.basicConfig()
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-logger.debug("logger set to DEBUG")
+logger = logs.get_logger(__name__)
 
 app = Celery('facade',
-             backend='redis://caching:6379/0',
-             broker='redis://caching:6379/0')
+             backend=caching.REDIS_URL,
+             broker=caching.REDIS_URL)
 
 app.Task.resultrepr_maxsize = 2000
+app.conf.update(result_serializer=caching.RESULT_SERIALIZER,
+                accept_content=['json', 'msgpack'],
+                result_expires=caching.RESULT_RETENTION)
+
+
+@worker_init.connect
+def start_metrics_exporter(**kwargs):
+    metrics.clear_stale()
+    metrics.start_exporter()
+
+
+@worker_process_shutdown.connect
+def mark_metrics_process_dead(pid=None, **kwargs):
+    metrics.mark_process_dead(pid)
+
+
+@worker_process_shutdown.connect
+def close_pooled_datasets(**kwargs):
+    datasets.clear()
+
 
 ##################
 # NetCDF Results #
 ##################
 
 
-@app.task(trail=True)
-def do_netcdf(geo_json, start, finish, model):
+@app.task(bind=True, trail=True)
+def do_netcdf(self, geo_json, start, finish, model, profile=False):
     result = {}
     try:
         sq = ShapeQuery(geo_json=geo_json,
                         start=start,
                         finish=finish)
+        sq.progress = ProgressReporter(self)
         mr = ModelRegister()
         model = mr.get(model)
 
         looped = asyncio.new_event_loop()
-        result = looped.run_until_complete(
-            model.get_netcdf_results(sq))
+        with metrics.labelled(model=model.code, format='nc'), QueryProfile(self.request.id, enabled=profile):
+            result = looped.run_until_complete(
+                model.get_netcdf_results(sq))
     except ValueError as e:
         logger.error("ValueError")
         # result['error'] = json.dumps(e)
@@ -53,19 +82,21 @@ def do_netcdf(geo_json, start, finish, model):
 # MP4 Results #
 ###############
 
-@app.task(trail=True)
-def do_mp4(geo_json, start, finish, model):
+@app.task(bind=True, trail=True)
+def do_mp4(self, geo_json, start, finish, model, profile=False):
     result = {}
     try:
         sq = ShapeQuery(geo_json=geo_json,
                         start=start,
                         finish=finish)
+        sq.progress = ProgressReporter(self)
         mr = ModelRegister()
         model = mr.get(model)
 
         looped = asyncio.new_event_loop()
-        result = looped.run_until_complete(
-            model.get_mp4_results(sq))
+        with metrics.labelled(model=model.code, format='mp4'), QueryProfile(self.request.id, enabled=profile):
+            result = looped.run_until_complete(
+                model.get_mp4_results(sq))
     except ValueError as e:
         logger.error("ValueError")
         # result['error'] = json.dumps(e)
@@ -81,26 +112,40 @@ def do_mp4(geo_json, start, finish, model):
 ################
 
 
-@app.task(trail=True)
-def do_query(geo_json, start, finish, model):
+@app.task(bind=True, trail=True)
+def do_query(self, geo_json, start, finish, model, profile=False):
     result = {}
+    stream = ResultStream(self.request.id, model)
+    progress = ProgressReporter(self)
     try:
         sq = ShapeQuery(geo_json=geo_json,
                         start=start,
                         finish=finish)
+        # Partial results are published as each batch of days completes
+        sq.stream = stream
+        sq.progress = progress
         mr = ModelRegister()
         model = mr.get(model)
 
         looped = asyncio.new_event_loop()
-        result = looped.run_until_complete(
-            model.get_timeseries_results(sq))
+        with metrics.labelled(model=model.code, format='json'), QueryProfile(self.request.id, enabled=profile):
+            result = looped.run_until_complete(
+                model.get_timeseries_results(sq))
     except ValueError as e:
         logger.error("ValueError")
         result['error'] = json.dumps(e)
-
-    mrs = ModelResultSchema()
-    json_result, errors = mrs.dump(result)
-    return json_result
+    finally:
+        stream.finish()
+
+    progress.report(0, 1, 'serialise')
+    with metrics.labelled(model=getattr(model, 'code', model), format='json'), metrics.timer('serialise'):
+        if isinstance(result, ModelResult):
+            # Columns of plain lists; the server expands them to the 'series' layout on request
+            result = result.to_columns()
+        # Large results go to the result store; the backend only keeps a pointer
+        result = ResultStore.stash(result)
+    progress.report(1, 1, 'serialise')
+    return result
 
 
 @app.task(trail=True)
@@ -110,9 +155,43 @@ def consolidate(year):
     model = mr.get('DFMC')
     looped = asyncio.new_event_loop()
     result = looped.run_until_complete(model.consolidate_year(year))
+    AvailabilityIndex().update(model)
     return result
 
 
+@app.task(trail=True)
+def slice_jasmin(year, layers=('surface',)):
+    """ Writes the pre-sliced JASMIN layer archives for a year, eg., after its native archive is updated. """
+    model = ModelRegister().get('JASMIN')
+    return [model.slice_year(year, layer) for layer in layers]
+
+
+@app.task(trail=True)
+def mosaic_lfmc(year):
+    """ Rebuilds a year's continent-wide LFMC mosaic and the tile index, eg., after new tiles are consolidated. """
+    return ModelRegister().get('LFMC').build_mosaic(year)
+
+
+@app.task(trail=True)
+def refresh_modis_inventory(start, finish):
+    """ Adds the MODIS granules USGS lists between start and finish (date strings) to the local inventory. """
+    model = ModelRegister().get('LFMC')
+    looped = asyncio.new_event_loop()
+    return looped.run_until_complete(model.refresh_inventory(parse(start), parse(finish)))
+
+
+@app.task(trail=True)
+def index_availability(model=None):
+    """
+    Brings the availability index up to date with the files on disk, for one model or all of them.
+    Only new and changed files are read.
+    """
+    mr = ModelRegister()
+    models = mr.models if model is None else [mr.get(model)]
+    index = AvailabilityIndex()
+    return {m.code: index.update(m) for m in models}
+
+
 @app.task(trail=True)
 def log_error(e):
     logger.warning(e)
@@ -121,7 +200,7 @@ def log_error(e):
 
 @app.task(trail=True)
 def do_conversion(shp):
-    logger.debug('Got conversion request: ' + shp)
+    logger.debug('Got conversion request: %s', shp)
     c = Conversion()
     return c.convert_this(shp)
 
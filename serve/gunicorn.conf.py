@@ -0,0 +1,6 @@
+from serve.lfmc.util import metrics
+
+
+def child_exit(server, worker):
+    """ Drops the live-process metrics of a worker that exited; its counts stay in the aggregate. """
+    metrics.mark_process_dead(worker.pid)
@@ -0,0 +1,33 @@
+import os
+
+# Redis instance shared by the Celery broker/result backend and the partial result streams
+REDIS_URL = os.environ.get('LFMC_REDIS_URL', 'redis://caching:6379/0')
+
+# Encoding of task results stored in the backend: 'json', or 'msgpack' (smaller and faster, needs msgpack installed)
+RESULT_SERIALIZER = os.environ.get('LFMC_RESULT_SERIALIZER', 'json')
+
+# Task results larger than this many bytes (as JSON) are moved to the result store, leaving a pointer in Redis
+RESULT_INLINE_LIMIT = int(os.environ.get('LFMC_RESULT_INLINE_LIMIT', str(64 * 1024)))
+
+# 'local' (a directory, also used for tests) or 'swift' (object storage)
+RESULT_STORE = os.environ.get('LFMC_RESULT_STORE', 'local')
+RESULT_STORE_DIR = os.environ.get('LFMC_RESULT_STORE_DIR', '/FuelModels/results')
+RESULT_STORE_CONTAINER = os.environ.get('LFMC_RESULT_STORE_CONTAINER', 'results')
+
+# Seconds results are kept, both in the result backend and the result store
+RESULT_RETENTION = int(os.environ.get('LFMC_RESULT_RETENTION', str(7 * 24 * 60 * 60)))
+
+# Size limit of the local result store; least recently used results are evicted beyond it
+RESULT_STORE_MAX_BYTES = int(os.environ.get('LFMC_RESULT_STORE_MAX_BYTES', str(10 * 1024 ** 3)))
+
+# Seconds browsers and the reverse proxy may reuse model metadata responses before revalidating them
+METADATA_MAX_AGE = int(os.environ.get('LFMC_METADATA_MAX_AGE', str(24 * 60 * 60)))
+
+# Per-model index of the dates and extents with data, shared by the workers (which update it) and the API
+AVAILABILITY_INDEX = os.environ.get('LFMC_AVAILABILITY_INDEX', '/FuelModels/availability.json')
+
+# Year, MODIS tile id and bounds of each yearly LFMC tile archive, written by the mosaic ingest step
+TILE_INDEX = os.environ.get('LFMC_TILE_INDEX', '/FuelModels/Live_FM/tiles.json')
+
+# MOD09A1 granules listed by USGS for the Australian tiles, refreshed by the ingest job so queries never call USGS
+GRANULE_INVENTORY = os.environ.get('LFMC_GRANULE_INVENTORY', '/FuelModels/Live_FM/modis/inventory.json')
@@ -0,0 +1,22 @@
+import os
+
+# Keep result cubes chunked and reduce them block by block instead of loading them whole
+OUT_OF_CORE = os.environ.get('LFMC_OUT_OF_CORE', 'false').lower() in ('1', 'true', 'yes', 'on')
+
+# Upper bound on the data held in memory at once by a single task, eg., '512MB' or '2GB'
+MEMORY_BUDGET = os.environ.get('LFMC_MEMORY_BUDGET', '512MB')
+
+# 'threads', 'synchronous', 'processes' or the address of a dask.distributed scheduler (tcp://...)
+SCHEDULER = os.environ.get('LFMC_DASK_SCHEDULER', 'threads')
+
+# Number of workers for the local threaded/process schedulers
+WORKERS = int(os.environ.get('LFMC_DASK_WORKERS', '2'))
+
+# Where profiles of queries submitted with profile=true are written, next to the query results
+PROFILE_DIR = os.environ.get('LFMC_PROFILE_DIR', '/FuelModels/queries/profiles')
+
+# Number of open NetCDF archives each worker process keeps between queries
+DATASET_POOL_SIZE = int(os.environ.get('LFMC_DATASET_POOL', '16'))
+
+# Processes used by the LFMC ingest, eg., one MODIS tile per process when deriving LFMC
+INGEST_WORKERS = int(os.environ.get('LFMC_INGEST_WORKERS', '6'))
@@ -1 +1,16 @@
-DEBUG = True
\ No newline at end of file
+import os
+
+# Extra diagnostic logging; changes no results
+DEBUG = os.environ.get('LFMC_DEBUG', 'false').lower() in ('1', 'true', 'yes', 'on')
+
+# BOM based queries return the forecasts past the requested finish date too
+INCLUDE_FORECASTS = os.environ.get('LFMC_INCLUDE_FORECASTS', 'true').lower() in ('1', 'true', 'yes', 'on')
+
+# DEBUG, INFO, WARNING, ERROR or CRITICAL
+LOG_LEVEL = os.environ.get('LFMC_LOG_LEVEL', 'WARNING').upper()
+
+# 'text' or 'json' (one JSON object per line)
+LOG_FORMAT = os.environ.get('LFMC_LOG_FORMAT', 'text').lower()
+
+# Maximum characters written to the log for any one object
+LOG_REPR_LIMIT = int(os.environ.get('LFMC_LOG_REPR_LIMIT', '500'))
@@ -2,6 +2,9 @@ from serve.lfmc.library.geoserver.catalog import Catalog
 from serve.lfmc.library.geoserver.support import DimensionInfo
 
 import serve.lfmc.config.debug as dev
+from serve.lfmc.util import logs
+
+logger = logs.get_logger(__name__)
 
 
 class GeoServer:
@@ -1,7 +1,7 @@
 import asyncio
 import datetime as dt
 import glob
-import logging
+from serve.lfmc.util import logs
 import os
 import os.path
 from pathlib import Path
@@ -13,14 +13,14 @@ from serve.lfmc.models.ModelMetaData import ModelMetaData
 from serve.lfmc.query import ShapeQuery
 from serve.lfmc.results.Abstracts import Abstracts
 from serve.lfmc.results.Author import Author
+from serve.lfmc.util import metrics
+from serve.lfmc.util import datasets
 
-logging.basicConfig()
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-logger.debug("logger set to DEBUG")
+logger = logs.get_logger(__name__)
 
 
 class AWRAModelLower(Model):
+    archive_only = True
 
     def __init__(self):
 
@@ -86,9 +86,13 @@ class AWRAModelLower(Model):
 
     # ShapeQuery
     async def get_shaped_resultcube(self, shape_query: ShapeQuery) -> xr.DataArray:
-        fs = list(set([self.netcdf_name_for_date(when)
-                       for when in shape_query.temporal.dates()]))
-        ts = xr.open_mfdataset(fs, chunks={'time': 1})
+        with metrics.timer('discover'):
+            fs = Model.archives_for_years(shape_query.temporal.start, shape_query.temporal.finish,
+                                          lambda year: self.netcdf_name_for_date(dt.date(year, 1, 1)))
+        if len(fs) == 0:
+            raise FileNotFoundError('No data exists for that date range.')
+        with metrics.timer('open'):
+            ts = datasets.open_mfdataset(fs, chunks={'time': 1})
 
         asyncio.sleep(1)
         ts = ts.sel(time=slice(shape_query.temporal.start.strftime("%Y-%m-%d"),
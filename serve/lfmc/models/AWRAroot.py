@@ -9,6 +9,8 @@ from serve.lfmc.query import ShapeQuery
 from serve.lfmc.query.GeoQuery import GeoQuery
 from serve.lfmc.results.Abstracts import Abstracts
 from serve.lfmc.results.Author import Author
+from serve.lfmc.util import metrics
+from serve.lfmc.util import datasets
 import datetime as dt
 from serve.lfmc.models.Model import Model
 from serve.lfmc.results.DataPoint import DataPoint
@@ -16,14 +18,12 @@ from serve.lfmc.results.ModelResult import ModelResult
 from serve.lfmc.models.ModelMetaData import ModelMetaData
 from serve.lfmc.query.SpatioTemporalQuery import SpatioTemporalQuery
 
-import logging
-logging.basicConfig()
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-logger.debug("logger set to DEBUG")
+from serve.lfmc.util import logs
+logger = logs.get_logger(__name__)
 
 
 class AWRAModelRoot(Model):
+    archive_only = True
 
     def __init__(self):
 
@@ -88,9 +88,13 @@ class AWRAModelRoot(Model):
 
     # ShapeQuery
     async def get_shaped_resultcube(self, shape_query: ShapeQuery) -> xr.DataArray:
-        fs = list(set([self.netcdf_name_for_date(when)
-                       for when in shape_query.temporal.dates()]))
-        ts = xr.open_mfdataset(fs, chunks={'time': 1})
+        with metrics.timer('discover'):
+            fs = Model.archives_for_years(shape_query.temporal.start, shape_query.temporal.finish,
+                                          lambda year: self.netcdf_name_for_date(dt.date(year, 1, 1)))
+        if len(fs) == 0:
+            raise FileNotFoundError('No data exists for that date range.')
+        with metrics.timer('open'):
+            ts = datasets.open_mfdataset(fs, chunks={'time': 1})
 
         asyncio.sleep(1)
         ts = ts.sel(time=slice(shape_query.temporal.start.strftime("%Y-%m-%d"),
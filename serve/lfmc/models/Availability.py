@@ -0,0 +1,208 @@
+import fcntl
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+import serve.lfmc.config.caching as caching
+from serve.lfmc.query.SpatialQuery import SpatialQuery
+
+from serve.lfmc.util import logs
+logger = logs.get_logger(__name__)
+
+
+class AvailabilityIndex:
+    """
+    Which dates (and where) each model has data for, built from the NetCDF files each model's all_netcdfs() finds.
+
+    Every file is summarised once, by path and modification time, as its runs of consecutive time steps, step size,
+    bounding box and cell size. Workers keep the index current as files are ingested; the API serves it from memory
+    and re-reads it only when the index file changes.
+    """
+
+    _shared = None
+    _lock = threading.Lock()
+
+    def __init__(self, path=None):
+        self.path = Path(path or caching.AVAILABILITY_INDEX)
+        self.models = {}
+        self.loaded = None
+        # Serialised summary, kept by the API until the index changes
+        self.response = None
+
+    @staticmethod
+    def shared():
+        """ The process-wide index, re-read whenever another process has updated it. """
+        with AvailabilityIndex._lock:
+            if AvailabilityIndex._shared is None:
+                AvailabilityIndex._shared = AvailabilityIndex()
+            AvailabilityIndex._shared.refresh()
+            return AvailabilityIndex._shared
+
+    def refresh(self, force=False):
+        """ Re-reads the index if it changed; an unreadable index leaves the one in memory in use. """
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return
+        if force or mtime != self.loaded:
+            try:
+                with open(self.path, 'r') as f:
+                    self.models = json.load(f)
+                self.response = None
+            except (OSError, ValueError) as e:
+                logger.warning('Could not read availability index %s: %s', self.path, e)
+            self.loaded = mtime
+
+    def modified(self):
+        """ When the index in memory was last written (epoch seconds), for Last-Modified; None if never read. """
+        return self.loaded / 1e9 if self.loaded is not None else None
+
+    @contextmanager
+    def locked(self):
+        """ Holds an exclusive lock on the index (across processes) for a read-modify-write. """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(str(self.path) + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield self
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile('w', dir=str(self.path.parent), suffix='.part', delete=False) as f:
+            json.dump(self.models, f)
+        os.replace(f.name, str(self.path))
+
+    def update(self, model, paths=None):
+        """
+        Re-summarises the model's new and changed files and drops the deleted ones.
+        :param model: a Model
+        :param paths: just these files (eg., those an ingest step has written); all_netcdfs() when None
+        :return: number of files (re)summarised
+        """
+        if paths is None:
+            paths = model.all_netcdfs()
+            replace = True
+        else:
+            replace = False
+
+        with self.locked():
+            self.refresh(force=True)
+            files = self.models.setdefault(model.code, {})
+            if replace:
+                for gone in set(files) - set(paths):
+                    del files[gone]
+
+            changed = 0
+            for p in paths:
+                try:
+                    mtime = os.path.getmtime(p)
+                except FileNotFoundError:
+                    files.pop(p, None)
+                    continue
+                if p in files and files[p]['mtime'] == mtime:
+                    continue
+                summary = AvailabilityIndex.summarise(p)
+                if summary is not None:
+                    summary['mtime'] = mtime
+                    files[p] = summary
+                    changed += 1
+
+            self.save()
+            self.loaded = None
+        logger.debug('Availability of %s: %s of %s files summarised.', model.code, changed, len(files))
+        return changed
+
+    @staticmethod
+    def summarise(path):
+        """ Time runs, step, bounding box and cell size of one NetCDF file, read from its coordinates only. """
+        try:
+            with xr.open_dataset(path, decode_cf=True) as ds:
+                times = np.sort(ds['time'].values.astype('datetime64[s]'))
+                lat_name, lon_name = SpatialQuery.coordinate_names(ds)
+                lats = ds[lat_name].values
+                lons = ds[lon_name].values
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning('Could not index %s: %s', path, e)
+            return None
+
+        step = int(np.median(np.diff(times).astype(np.int64))) if len(times) > 1 else None
+        return {'runs': AvailabilityIndex.runs(times, step),
+                'step': step,
+                'bbox': [float(np.min(lats)), float(np.min(lons)), float(np.max(lats)), float(np.max(lons))],
+                'cell': [float(abs(lats[1] - lats[0])) if len(lats) > 1 else None,
+                         float(abs(lons[1] - lons[0])) if len(lons) > 1 else None]}
+
+    @staticmethod
+    def runs(times, step):
+        """ [first, last] pairs (ISO strings) of the stretches of times no more than one step apart. """
+        if len(times) == 0:
+            return []
+        if step is None:
+            return [[str(times[0]), str(times[0])]]
+        breaks = np.where(np.diff(times).astype(np.int64) > step * 1.5)[0]
+        starts = np.concatenate([[0], breaks + 1])
+        ends = np.concatenate([breaks, [len(times) - 1]])
+        return [[str(times[s]), str(times[e])] for s, e in zip(starts, ends)]
+
+    def model_summary(self, code):
+        """
+        Coverage of one model across all its files: overall start and finish, time step (seconds),
+        the runs of available data and the gaps between them, bounding box and cell size.
+        """
+        files = self.models.get(code, {})
+        if len(files) == 0:
+            return None
+
+        steps = [f['step'] for f in files.values() if f['step'] is not None]
+        step = int(np.median(steps)) if len(steps) > 0 else 24 * 60 * 60
+        runs = sorted([pd.Timestamp(a), pd.Timestamp(b)] for f in files.values() for a, b in f['runs'])
+
+        merged = [runs[0]] if len(runs) > 0 else []
+        for start, finish in runs[1:]:
+            if (start - merged[-1][1]).total_seconds() <= step * 1.5:
+                merged[-1][1] = max(merged[-1][1], finish)
+            else:
+                merged.append([start, finish])
+
+        boxes = np.array([f['bbox'] for f in files.values()])
+        cells = [f['cell'] for f in files.values()]
+        return {'model': code,
+                'start': merged[0][0].isoformat() if len(merged) > 0 else None,
+                'finish': merged[-1][1].isoformat() if len(merged) > 0 else None,
+                'step': step,
+                'ranges': [[a.isoformat(), b.isoformat()] for a, b in merged],
+                'gaps': [[(a[1] + pd.Timedelta(seconds=step)).isoformat(), (b[0] - pd.Timedelta(seconds=step)).isoformat()]
+                         for a, b in zip(merged[:-1], merged[1:])],
+                'bbox': [float(boxes[:, 0].min()), float(boxes[:, 1].min()),
+                         float(boxes[:, 2].max()), float(boxes[:, 3].max())],
+                'cell': cells[0],
+                'files': len(files)}
+
+    def summary(self):
+        return {code: self.model_summary(code) for code in self.models}
+
+    def covers(self, code, start, finish):
+        """
+        :return: whether any of the model's data falls between start and finish (datetimes);
+                 None if the model isn't indexed, so callers should go ahead and try
+        """
+        files = self.models.get(code)
+        if not files:
+            return None
+        # Queries select whole days, so anything on the finish date counts
+        start = pd.Timestamp(start).normalize()
+        finish = pd.Timestamp(finish).normalize() + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+        for f in files.values():
+            for a, b in f['runs']:
+                if pd.Timestamp(a) <= finish and pd.Timestamp(b) >= start:
+                    return True
+        return False
@@ -8,17 +8,17 @@ import xarray as xr
 from pathlib2 import Path
 import serve.lfmc.config.debug as dev
 from serve.lfmc.models.Model import Model
+from serve.lfmc.models.Availability import AvailabilityIndex
 from serve.lfmc.query.ShapeQuery import ShapeQuery
 from serve.lfmc.query.GeoQuery import GeoQuery
 
 from serve.lfmc.results.DataPoint import DataPoint
 from serve.lfmc.results.MPEGFormatter import MPEGFormatter
 from serve.lfmc.results.ModelResult import ModelResult
-import logging
-logging.basicConfig()
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-logger.debug("logger set to DEBUG")
+from serve.lfmc.util import metrics
+from serve.lfmc.util import datasets
+from serve.lfmc.util import logs
+logger = logs.get_logger(__name__)
 
 
 class BomBasedModel(Model):
@@ -30,7 +30,7 @@ class BomBasedModel(Model):
 
     async def mpg(self, query: ShapeQuery):
         sr = await (self.get_shaped_resultcube(query))
-        logger.debug(sr)
+        logger.debug('%s', logs.brief(sr))
         mp4 = await (MPEGFormatter.format(
             sr, self.outputs["readings"]["prefix"]))
         asyncio.sleep(1)
@@ -44,26 +44,29 @@ class BomBasedModel(Model):
     async def get_shaped_resultcube(self, shape_query: ShapeQuery) -> xr.DataArray:
 
         fs = set()
-        for when in shape_query.temporal.dates():
-            # logger.debug("Looking for files for: %s in '%s'",
-            #             when.strftime('%d / %m / %Y'),
-            #             self.netcdf_name_for_date(when))
-            [fs.add(file) for file in self.netcdf_name_for_date(
-                when) if Path(file).is_file()]
-
-        [logger.debug('Found: %s', p) for p in fs]
+        dates = shape_query.temporal.dates()
+        with metrics.timer('discover'):
+            for i, when in enumerate(dates):
+                shape_query.report(i + 1, len(dates), 'discover')
+                # logger.debug("Looking for files for: %s in '%s'",
+                #             when.strftime('%d / %m / %Y'),
+                #             self.netcdf_name_for_date(when))
+                [fs.add(file) for file in self.netcdf_name_for_date(
+                    when) if Path(file).is_file()]
+
+        logger.debug('Found: %s', logs.brief(fs))
 
         fl = list(fs)
         xr1 = xr.DataArray(())
         if dev.DEBUG:
-            [logger.debug("\n--> Will load: %s" % f) for f in fl]
+            logger.debug("\n--> Will load: %s", logs.brief(fl))
 
         # Load these files in date order overwriting older data with the newer
         if len(fl) > 0:
             fl.sort()
-            xr1 = xr.open_dataset(fl.pop(0))
+            xr1 = self.open_windowed(fl.pop(0), shape_query)
             while len(fl) > 1:
-                xr2 = xr.open_dataset(fl.pop(0))
+                xr2 = self.open_windowed(fl.pop(0), shape_query)
                 # if dev.DEBUG:
                 #     logger.debug("\n--> Loading BOM SFC TS by overwriting older data: %s" % fl[0])
                 xr1 = self.load_by_overwrite(xr1, xr2)
@@ -72,8 +75,8 @@ class BomBasedModel(Model):
             # xr1.to_netcdf(Model.path() + 'temp/latest_{}_query.nc'.format(self.name), format='NETCDF4')
 
             if dev.DEBUG:
-                # Include forecasts!
-                logger.debug(xr1)
+                logger.debug('%s', logs.brief(xr1))
+            if dev.INCLUDE_FORECASTS:
                 ts = xr1.sel(time=slice(
                     shape_query.temporal.start.strftime("%Y-%m-%d"), None))
             else:
@@ -84,6 +87,17 @@ class BomBasedModel(Model):
         else:
             raise FileNotFoundError('No data exists for that date range')
 
+    @staticmethod
+    def open_windowed(file_name, shape_query: ShapeQuery):
+        """
+        Lazily opens a NetCDF file and restricts it to the query's expanded bounding box
+        so that only that hyperslab is ever read from disk.
+        """
+        with metrics.timer('open'):
+            ds = datasets.open_dataset(file_name)
+        with metrics.timer('slice'):
+            return shape_query.spatial.window(ds, GeoQuery.cell_size)
+
     def load_by_overwrite(self, xr1, xr2):
         ds1_start = xr1[self.outputs["readings"]
                         ["prefix"]].isel(time=0).time.values
@@ -123,7 +137,7 @@ class BomBasedModel(Model):
 
             xr1.attrs['var_name'] = self.outputs["readings"]["prefix"]
 
-            logger.debug(xr1)
+            logger.debug('%s', logs.brief(xr1))
 
             if xr1['time'] is None:
                 logger.debug('No temporal component to DataSet?!')
@@ -133,6 +147,7 @@ class BomBasedModel(Model):
                 time_records = xr1.sel(time=str(year))
 
                 xr1.to_netcdf(self.archive_name(year), format='NETCDF4')
+                AvailabilityIndex().update(self, [self.archive_name(year)])
                 return True
 
                 # if len(time_records) >= 365:
@@ -165,7 +180,9 @@ class BomBasedModel(Model):
         # First, check to see if an annual archive exists
         archival_file = self.archive_name(when.year)
         if Path(archival_file).is_file():
+            metrics.cache(hit=True)
             return [archival_file]
+        metrics.cache(hit=False)
 
         # Can we create a full years archive for this whole year?
         if self.consolidate_to_year_archive(when.year, file_name):
@@ -225,7 +242,7 @@ class BomBasedModel(Model):
 
         if len(df) == 0:
             logger.debug('Found no datapoints.')
-            logger.debug(sr)
+            logger.debug('%s', logs.brief(sr))
 
         asyncio.sleep(1)
 
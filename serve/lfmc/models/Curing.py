@@ -18,11 +18,8 @@ from serve.lfmc.results.MPEGFormatter import MPEGFormatter
 from serve.lfmc.results.ModelResult import ModelResult
 
 CURING_PRODUCT = 'IDV71139_VIC_Curing_SFC.nc'
-import logging
-logging.basicConfig()
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-logger.debug("logger set to DEBUG")
+from serve.lfmc.util import logs
+logger = logs.get_logger(__name__)
 
 
 class CuringModel(BomBasedModel):
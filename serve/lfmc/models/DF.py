@@ -13,11 +13,8 @@ from serve.lfmc.models.ModelMetaData import ModelMetaData
 
 
 DF_PRODUCT = 'IDV71127_VIC_DF_SFC.nc'
-import logging
-logging.basicConfig()
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-logger.debug("logger set to DEBUG")
+from serve.lfmc.util import logs
+logger = logs.get_logger(__name__)
 
 
 class DFModel(BomBasedModel):
@@ -27,11 +27,8 @@ import geopandas as gp
 
 from uuid import uuid4
 
-import logging
-logging.basicConfig()
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-logger.debug("logger set to DEBUG")
+from serve.lfmc.util import logs
+logger = logs.get_logger(__name__)
 
 
 class DeadFuelModel(Model):
@@ -212,10 +209,10 @@ class DeadFuelModel(Model):
                 try:
                     lat1, lon1, lat2, lon2 = shape_query.spatial.expanded(0.1)
 
-                    logger.debug("lat1: %s" % lat1)
-                    logger.debug("lon1: %s" % lon1)
-                    logger.debug("lat1: %s" % lat2)
-                    logger.debug("lon2: %s" % lon2)
+                    logger.debug("lat1: %s", lat1)
+                    logger.debug("lon1: %s", lon1)
+                    logger.debug("lat1: %s", lat2)
+                    logger.debug("lon2: %s", lon2)
 
                     start = shape_query.temporal.start.strftime("%Y-%m-%d")
                     finish = shape_query.temporal.finish.strftime("%Y-%m-%d")
@@ -246,7 +243,7 @@ class DeadFuelModel(Model):
                 mask = AUmask.mask(dm['longitude'], dm['latitude'])
                 mask_ma = np.ma.masked_invalid(mask)
                 ds = ds.where(mask_ma == 0)
-                logger.debug("--- Saving %s" % (year))
+                logger.debug("--- Saving %s", year)
                 ds.attrs = dict()
                 ds.attrs['crs'] = "+proj=longlat +ellps=WGS84 +datum=WGS84 +no_defs "
                 ds.attrs['var_name'] = 'DFMC'
@@ -294,8 +291,7 @@ class DeadFuelModel(Model):
         y = when.strftime("%Y")
         m = when.strftime("%m")
         d = when.strftime("%d")
-        logger.debug(
-            "\n--> Processing data for: %s-%s-%s\n--> Converting: %s" % (d, m, y, file_name))
+        logger.debug("\n--> Processing data for: %s-%s-%s\n--> Converting: %s", d, m, y, file_name)
 
         nc_version = "%s.nc" % file_name
         arr = xr.open_rasterio("%s" % file_name)
@@ -325,17 +321,17 @@ class DeadFuelModel(Model):
             #     logger.debug("Will open just: %s" % param_datasets)
             # elif len(param_datasets) > 1:
 
-            logger.debug("\n----> Will open: %s" % f for f in param_datasets)
+            logger.debug("\n----> Will open: %s", param_datasets)
 
             with xr.open_mfdataset(param_datasets, concat_dim="observations") as ds:
                 vp = ds["VP3pm"].isel(time=0)
                 tmx = ds["Tmx"].isel(time=0)
                 dfmc = DeadFuelModel.calculate(vp, tmx)
                 dfmc = dfmc.expand_dims('time')
-                logger.debug("Processing data for: %s-%s-%s" % (d, m, y))
+                logger.debug("Processing data for: %s-%s-%s", d, m, y)
                 DFMC = dfmc.to_dataset('DFMC')
                 DFMC.to_netcdf(tempfile, format='NETCDF4')
-                logger.debug("\n------> Wrote: %s" % tempfile)
+                logger.debug("\n------> Wrote: %s", tempfile)
                 logger.debug(DFMC)
 
             param_datasets.append(tempfile)
@@ -401,8 +397,7 @@ class DeadFuelModel(Model):
                             data_file, param, when)
 
                     elif not data_file.is_file() and archive_file.is_file():
-                        logger.debug(
-                            'Found an unexpanded archive: %s' % archive_file)
+                        logger.debug('Found an unexpanded archive: %s', archive_file)
                         await self.do_expansion(archive_file)
                         parameter_dataset_name = self.do_conversion(
                             data_file, param, when)
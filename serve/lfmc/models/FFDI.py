@@ -16,11 +16,8 @@ from serve.lfmc.models.ModelMetaData import ModelMetaData
 
 
 FFDI_PRODUCT = 'IDV71117_VIC_FFDI_SFC.nc'
-import logging
-logging.basicConfig()
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-logger.debug("logger set to DEBUG")
+from serve.lfmc.util import logs
+logger = logs.get_logger(__name__)
 
 
 class FFDIModel(BomBasedModel):
@@ -14,11 +14,8 @@ from serve.lfmc.models.ModelMetaData import ModelMetaData
 
 
 GFDI_PRODUCT = "IDV71122_VIC_GFDI_SFC.nc"
-import logging
-logging.basicConfig()
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-logger.debug("logger set to DEBUG")
+from serve.lfmc.util import logs
+logger = logs.get_logger(__name__)
 
 
 class GFDIModel(BomBasedModel):
@@ -16,14 +16,21 @@ from serve.lfmc.results.Author import Author
 import datetime as dt
 from serve.lfmc.models.Model import Model
 from serve.lfmc.models.ModelMetaData import ModelMetaData
-import logging
-logging.basicConfig()
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-logger.debug("logger set to DEBUG")
+from serve.lfmc.util import metrics
+from serve.lfmc.util import datasets
+from serve.lfmc.util import outofcore
+from serve.lfmc.util import logs
+logger = logs.get_logger(__name__)
+
+# Soil levels (depth of the bottom of each layer, in metres) averaged into each derived archive
+LAYERS = {'surface': [0.1], 'rootzone': [0.1, 0.35, 1.0]}
+
+# Cells per side of a spatial chunk in derived archives; each chunk holds a whole year of time steps
+ARCHIVE_CHUNK = 64
 
 
 class JasminModel(Model):
+    archive_only = True
 
     def __init__(self):
         self.name = "jasmin"
@@ -83,13 +90,7 @@ class JasminModel(Model):
         # we need to pad dates +/- 7 days to ensure we grab the correct nc files that might contain 'when'
         window_begin = start - dt.timedelta(7)
         window_end = finish + dt.timedelta(7)
-        cdf_list = []
-
-        for d in pd.date_range(window_begin, window_end):
-            cdf_list += [p for p in
-                         glob.glob(Model.path() + "JASMIN/native/jasmin.vol.smc.{}.nc".format(d.strftime("%Y")))]
-
-        return [f for f in list(set(cdf_list)) if Path(f).is_file()]
+        return Model.archives_for_years(window_begin, window_end, self.native_archive)
 
     def all_netcdfs(self):
         """
@@ -98,47 +99,105 @@ class JasminModel(Model):
         :param fname:
         :return:
         """
-        possibles = [p for p in glob.glob(Model.path(
-        ) + "native/jasmin.vol.smc.*.nc")]
+        possibles = [p for p in glob.glob(self.path + "native/jasmin.vol.smc.*.nc")]
         return [f for f in possibles if Path(f).is_file()]
 
+    def native_archive(self, year):
+        return self.path + "native/jasmin.vol.smc.{}.nc".format(year)
+
+    def layer_archive(self, year, layer='surface'):
+        """ Per-year archive of one soil layer, written by slice_year. """
+        return self.path + "{}/jasmin.smc.{}.{}.nc".format(layer, layer, year)
+
+    def slice_year(self, year, layer='surface'):
+        """
+        Ingest step: writes the year's soil moisture for one layer (see LAYERS) as a 3-D (time, lat, lon) archive
+        with the DST duplicates removed, chunked for time-series reads, so queries never open all four levels.
+        Deeper layers are averaged by thickness.
+        :return: path of the archive, or None if there is no native archive for that year
+        """
+        native = self.native_archive(year)
+        if not Path(native).is_file():
+            return None
+
+        levels = LAYERS[layer]
+        target = self.layer_archive(year, layer)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+
+        with xr.open_dataset(native, chunks={'time': 1}) as ds:
+            if "observations" in ds.dims:
+                ds = ds.squeeze("observations")
+            times, first = np.unique(ds['time'].values, return_index=True)
+            ds = ds.isel(time=first).sel(level=levels, method='nearest')
+
+            depths = np.array([0.0] + levels)
+            thickness = xr.DataArray(np.diff(depths), dims=['level'])
+            sm = (ds['sm'] * thickness).sum('level') / thickness.sum()
+            sm.attrs = ds['sm'].attrs
+            sm.attrs['layer'] = layer
+            sm.attrs['levels'] = levels
+
+            out = sm.to_dataset(name=self.outputs['readings']['prefix'])
+            out.attrs['var_name'] = self.outputs['readings']['prefix']
+            chunks = tuple(len(first) if d == 'time' else min(out.sizes[d], ARCHIVE_CHUNK) for d in sm.dims)
+            encoding = {self.outputs['readings']['prefix']: {'zlib': True, 'complevel': 4, 'chunksizes': chunks}}
+
+            partial = target + '.part'
+            out.to_netcdf(partial, format='NETCDF4', encoding=encoding)
+        os.replace(partial, target)
+        logger.debug('Wrote %s layer of %s to %s', layer, year, target)
+        return target
+
+    @staticmethod
+    def requested_times(times, start, finish):
+        """
+        Positions, in time order, of the first entry of each distinct time falling on the days start to finish.
+        Also works around the daylight savings (double daily entry) bug without copying the cube per day.
+        """
+        times, first = np.unique(times, return_index=True)
+        begin = np.datetime64(start.strftime("%Y-%m-%d"))
+        end = np.datetime64(finish.strftime("%Y-%m-%d")) + np.timedelta64(1, 'D')
+        return first[(times >= begin) & (times < end)]
+
     # ShapeQuery
     async def get_shaped_resultcube(self, shape_query: ShapeQuery) -> xr.DataArray:
         logger.debug('Using local Models implementation of resultcube!')
         sr = None
-        fs = list(set(self.netcdf_names_for_dates(
-            shape_query.temporal.start, shape_query.temporal.finish)))
-        if dev.DEBUG:
-            logger.debug('{}\n'.format(f) for f in fs)
+        with metrics.timer('discover'):
+            years = range(shape_query.temporal.start.year, shape_query.temporal.finish.year + 1)
+            fs = [self.layer_archive(y) for y in years]
+            presliced = all(Path(f).is_file() for f in fs)
+            if not presliced:
+                fs = list(set(self.netcdf_names_for_dates(
+                    shape_query.temporal.start, shape_query.temporal.finish)))
+        logger.debug('Opening %s', fs)
         asyncio.sleep(1)
 
-        if len(fs) > 0:
-            with xr.open_mfdataset(fs, concat_dim='time') as ds:
-                if "observations" in ds.dims:
-                    sr = ds.squeeze("observations")
-                else:
-                    sr = ds
+        if presliced:
+            # Pre-sliced surface archives: already 3-D and free of duplicate times
+            ds = datasets.open_mfdataset(fs, chunks=outofcore.open_chunks())
+            sr = ds.sel(time=slice(shape_query.temporal.start.strftime("%Y-%m-%d"),
+                                   shape_query.temporal.finish.strftime("%Y-%m-%d")))
+            sr.attrs['var_name'] = self.outputs['readings']['prefix']
+
+        elif len(fs) > 0:
+            ds = datasets.open_mfdataset(fs, chunks={})
+            if "observations" in ds.dims:
+                sr = ds.squeeze("observations")
+            else:
+                sr = ds
 
             sr.attrs['var_name'] = self.outputs['readings']['prefix']
 
-            sr = sr.where(sr.level == 0.1, drop=True).squeeze('level')
+            # One index operation selects the requested days, once each, before any level is touched
+            sr = sr.isel(time=JasminModel.requested_times(sr['time'].values,
+                                                         shape_query.temporal.start, shape_query.temporal.finish))
 
-            # Workaround for Bug - Daylight Savings time (double daily entry bug)
-            ds = None
-            for t in sorted(list(set(sorted(sr.time.values)))):
-                a = sr.sel(time=t)
-                if 'time' in a.dims:
-                    a = a.isel(time=0)
-                if ds is None:
-                    ds = a
-                else:
-                    if 'sm' in a.data_vars:
-                        ds = xr.concat([ds, a], dim='time')
+            sr = sr.sel(level=0.1, method='nearest')
 
-            sr = ds.sel(time=slice(shape_query.temporal.start.strftime("%Y-%m-%d"),
-                                   shape_query.temporal.finish.strftime("%Y-%m-%d")))
+        if sr is not None:
             if dev.DEBUG:
-                logger.debug(sr)
+                logger.debug('%s', logs.brief(sr))
             return sr
         else:
             return xr.DataArray([])
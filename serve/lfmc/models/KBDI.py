@@ -17,11 +17,8 @@ from serve.lfmc.models.ModelMetaData import ModelMetaData
 
 
 KBDI_PRODUCT = 'IDV71147_VIC_KBDI_SFC.nc'
-import logging
-logging.basicConfig()
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-logger.debug("logger set to DEBUG")
+from serve.lfmc.util import logs
+logger = logs.get_logger(__name__)
 
 
 class KBDIModel(BomBasedModel):
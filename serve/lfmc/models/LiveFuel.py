@@ -21,9 +21,12 @@ from pathlib2 import Path
 from dateutil.parser import parse
 
 
+import serve.lfmc.config.caching as caching
 import serve.lfmc.config.debug as dev
 from serve.lfmc.models.Model import Model
 from serve.lfmc.models.ModelMetaData import ModelMetaData
+from serve.lfmc.models.TileIndex import TileIndex
+from serve.lfmc.process import TileArchive
 from serve.lfmc.query.ShapeQuery import ShapeQuery
 from serve.lfmc.query.GeoQuery import GeoQuery
 from serve.lfmc.query.SpatioTemporalQuery import SpatioTemporalQuery
@@ -32,14 +35,15 @@ from serve.lfmc.results.Abstracts import Abstracts
 from serve.lfmc.results.Author import Author
 from serve.lfmc.results.DataPoint import DataPoint
 from serve.lfmc.results.ModelResult import ModelResult
+from serve.lfmc.util import metrics
+from serve.lfmc.util import datasets
+from serve.lfmc.util import outofcore
+from serve.lfmc.util import modis
 #from serve.lfmc.models.LiveScraper import LiveScraper
 
-import logging
+from serve.lfmc.util import logs
 
-logging.basicConfig()
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-logger.debug("logger set to DEBUG")
+logger = logs.get_logger(__name__)
 
 
 class LiveFuelModel(Model):
@@ -102,7 +106,7 @@ class LiveFuelModel(Model):
         return [f for f in possibles if Path(f).is_file()]
 
     async def get_inventory_for_request(self, url_string):
-        logger.debug('Getting %s' % url_string)
+        logger.debug('Getting %s', url_string)
         r = requests.get(url_string)
         queue = []
         if r.status_code == requests.codes.ok:
@@ -111,7 +115,7 @@ class LiveFuelModel(Model):
                 if len(line) > 0 and self.is_acceptable_granule(line):
                     queue.append(line)
         else:
-            raise (
+            raise ConnectionError(
                 "[Error] Can't continue. Didn't receive what we expected from USGS / NASA.")
         return queue
 
@@ -121,10 +125,8 @@ class LiveFuelModel(Model):
         return self.hv_for_modis_granule(uri_parts[-1])
 
     def is_acceptable_granule(self, granule):
-        """ Generates a list of tuples describing HV coords for granules that are used
-        to generate a MODIS composite covering Australia. Returns list of granules that match.
-        """
-        return self.get_hv(granule) in [(h, v) for h in range(27, 31) for v in range(9, 13)]
+        """ Whether a granule is one of the tiles used to generate the MODIS composite covering Australia. """
+        return self.get_hv(granule) in modis.AUSTRALIA
 
     def hv_for_modis_granule(self, granule):
         """ Extracts HV grid coords from naming conventions of HDF-EOS file.
@@ -144,22 +146,61 @@ class LiveFuelModel(Model):
         return dt.datetime.strptime((parts[1].replace('A', '')), '%Y%j')
 
     def which_hvs_for_query(self, bbox):
-        rurl = 'https://lpdaacsvc.cr.usgs.gov/services/inventory?product=MOD09A1&version=6&bbox=' + \
-            bbox + '&date=2013-01-02,2013-04-05&output=text'
-        queue = []
-
-        r = requests.get(rurl)
-        if r.status_code == requests.codes.ok:
-            logger.debug('200 OK')
-            granules = r.text.split('\n')
-            for line in granules:
-                if len(line) > 0:  # and self.is_acceptable_granule(line):
-                    h, v = self.hv_for_modis_granule(line.split('/')[-1])
-                    queue.append("h%sv%s" % (h, v))
-        else:
-            logger.debug('Failed')
-
-        return list(set(queue))
+        """
+        MODIS tiles overlapping a bbox, from the sinusoidal grid geometry (no network request).
+        :param bbox: "lon1,lat1,lon2,lat2"
+        :return: tile ids, eg., ['h29v12']
+        """
+        lon1, lat1, lon2, lat2 = [float(c) for c in bbox.split(',')]
+        return modis.tiles_for_bbox(lat1, lon1, lat2, lon2)
+
+    def granule_inventory(self):
+        """ Granule URIs last listed by refresh_inventory; empty if it hasn't run yet. """
+        try:
+            with open(caching.GRANULE_INVENTORY, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            logger.warning('No MODIS granule inventory at %s', caching.GRANULE_INVENTORY)
+            return []
+
+    async def refresh_inventory(self, start, finish):
+        """
+        Adds the granules USGS lists for the Australian composite between start and finish to the local inventory.
+        Run by the ingest job; the query path only ever reads the inventory.
+        :return: number of granules in the inventory
+        """
+        product, version, bbox = self.modis_meta
+        rurl = "https://lpdaacsvc.cr.usgs.gov/services/inventory?product=" \
+            + product \
+            + "&version=" \
+            + version \
+            + "&bbox=" \
+            + bbox \
+            + "&date=" \
+            + start.strftime('%Y-%m-%d') \
+            + ',' \
+            + finish.strftime('%Y-%m-%d') \
+            + "&output=text"
+        granules = await self.get_inventory_for_request(rurl)
+        inventory = sorted(set(self.granule_inventory()) | set(granules))
+
+        os.makedirs(os.path.dirname(caching.GRANULE_INVENTORY), exist_ok=True)
+        partial = caching.GRANULE_INVENTORY + '.part'
+        with open(partial, 'w') as f:
+            json.dump(inventory, f)
+        os.replace(partial, caching.GRANULE_INVENTORY)
+        logger.debug('Granule inventory has %s granules.', len(inventory))
+        return len(inventory)
+
+    def inventory_granules(self, start, finish, hvs):
+        """ Granules in the local inventory for the tiles hvs observed between start and finish. """
+        begin, end = dt.datetime(start.year, start.month, start.day), dt.datetime(finish.year, finish.month, finish.day)
+        granules = []
+        for g in self.granule_inventory():
+            name = g.split('/')[-1]
+            if "h%sv%s" % self.hv_for_modis_granule(name) in hvs and begin <= self.date_for_modis_granule(name) <= end:
+                granules.append(g)
+        return granules
 
     def which_archival_years_for_daterange(self, start, finish):
         years = int(finish.year - start.year) + 1
@@ -174,6 +215,36 @@ class LiveFuelModel(Model):
         logger.debug(name)
         return name
 
+    def tile_archives(self, year='*'):
+        """ The yearly per-tile archives, eg., LFMC_2018_h29v12.nc; pass year='*' for all years. """
+        return [f for f in glob.glob("{}{}_{}_h*v*{}".format(self.path,
+                                                            self.outputs["readings"]["prefix"],
+                                                            year,
+                                                            self.outputs["readings"]["suffix"])) if Path(f).is_file()]
+
+    def mosaic_archive(self, year):
+        return "{}mosaic/{}_{}{}".format(self.path,
+                                         self.outputs["readings"]["prefix"],
+                                         year,
+                                         self.outputs["readings"]["suffix"])
+
+    def build_mosaic(self, year):
+        """
+        Merges a year's tile archives into one continent-wide archive, chunked by time step and ARCHIVE_CHUNK cells
+        so a query reads just its window, and brings the tile index up to date.
+        :return: path of the mosaic, or None if there are no tiles for that year
+        """
+        index = TileIndex()
+        index.update(self.tile_archives())
+        tiles = sorted(index.for_year(year))
+        if len(tiles) == 0:
+            return None
+
+        target = self.mosaic_archive(year)
+        TileArchive.write_mosaic(tiles, target)
+        logger.debug('Wrote mosaic of %s tiles for %s to %s', len(tiles), year, target)
+        return target
+
     def fuel_name(self, granule):
         h, v = self.hv_for_modis_granule(granule)
         d = self.date_for_modis_granule(granule)
@@ -182,51 +253,29 @@ class LiveFuelModel(Model):
 
     async def dataset_files(self, start, finish, bbox):
         """
-        Uses USGS service to match spatiotemporal query to granules required.
-        converts each granule name to LFMC name
+        Matches a spatiotemporal query to the granules required using the tile geometry and the local
+        granule inventory, converting each granule name to its LFMC name. Makes no network requests.
         """
         granules = []
+        hvs = self.which_hvs_for_query(bbox)
 
         # Generate names of hypothetical archives
         for when in self.which_archival_years_for_daterange(start, finish):
-            for hv in self.which_hvs_for_query(bbox):
+            for hv in hvs:
                 granules.append(
                     self.netcdf_name_for_date_and_granule(when, hv))
 
         # Test for the existence of these archives
-        [logger.debug(g) for g in list(set(granules))]
+        logger.debug('Archives: %s', logs.brief(granules))
 
         missing = [m for m in list(set(granules)) if not Path(m).is_file()]
 
         if len(missing) > 0:
-            logger.debug('Some granules are missing:')
-            logger.debug(missing)
-            logger.debug('Gathering missing granules...')
-
-            product, version, obbox = self.modis_meta
-            dfiles = []
-
-            rurl = "https://lpdaacsvc.cr.usgs.gov/services/inventory?product=" \
-                + product \
-                + "&version=" \
-                + version \
-                + "&bbox=" \
-                + bbox \
-                + "&date=" \
-                + start.strftime('%Y-%m-%d') \
-                + ',' \
-                + finish.strftime('%Y-%m-%d') \
-                + "&output=text"
-
-            inventory = await asyncio.gather(*[self.get_inventory_for_request(rurl)])
-
-            asyncio.sleep(1)
+            logger.debug('Some granules are missing: %s', missing)
+
             # Convert inventory to fuel_names
             dfiles = [(self.fuel_name(g.split('/')[-1]), g)
-                      for sl in inventory for g in sl]
-
-            # all_ok = await asyncio.gather(*[self.retrieve_earth_observation_data(
-            #     v) for k, v in dfiles if not Path(k).is_file()])
+                      for g in self.inventory_granules(start, finish, hvs)]
 
             logger.debug(dfiles)
             return [k for k, v in dfiles if Path(k).is_file()]
@@ -243,29 +292,42 @@ class LiveFuelModel(Model):
         # logger.debug('TR: %3.3f, %3.3f' % (lon2, lat2))
         # Eg., "108.0000,-45.0000,155.0000,-10.0000"  # Bottom-left, top-right
         bbox = "%3.3f,%3.3f,%3.3f,%3.3f" % (lon1, lat1, lon2, lat2)
-        logger.debug("BBOX is: %s" % bbox)
-
-        searcher = ['/FuelModels/Live_FM/LFMC_{}_*.nc'.format(year) for year in list(
-            range(shape_query.temporal.start.year, shape_query.temporal.finish.year + 1))]
-
-        search_res = []
-        for searching in searcher:
-            [search_res.append(s) for s in glob.glob(searching)]
-
-        collection = list(set(search_res))
-
-        logger.debug('Files to open are...')
-        logger.debug(collection)
+        logger.debug("BBOX is: %s", bbox)
+
+        years = range(shape_query.temporal.start.year, shape_query.temporal.finish.year + 1)
+        index = TileIndex.shared()
+        collection = []
+        with metrics.timer('discover'):
+            for year in years:
+                mosaic = self.mosaic_archive(year)
+                # The tiles themselves, as the ingest rewrites them without touching the index
+                tiles = self.tile_archives(year)
+                newest = max([os.path.getmtime(t) for t in tiles], default=None)
+                if Path(mosaic).is_file() and os.path.getmtime(mosaic) >= (newest or 0):
+                    # One window of the year's mosaic, unless tiles have been written since it was built
+                    collection.append(mosaic)
+                elif len(index.for_year(year)) > 0:
+                    collection += index.intersecting(year, lat1, lon1, lat2, lon2)
+                else:
+                    # Not indexed yet; the tile geometry still narrows it down
+                    collection += [t for t in [self.netcdf_name_for_date_and_granule(year, hv)
+                                               for hv in self.which_hvs_for_query(bbox)] if Path(t).is_file()]
+
+        logger.debug('Files to open are: %s', collection)
+        if len(collection) == 0:
+            raise FileNotFoundError('No data exists for that date range.')
 
         strs = []
 
         for c in collection:
-            ds = xr.open_dataset(c)
-            s_t_r = ds['lfmc'].sel(lat=slice(lat2, lat1), lon=slice(lon1, lon2), time=slice(
-                shape_query.temporal.start, shape_query.temporal.finish))
+            with metrics.timer('open'):
+                ds = datasets.open_dataset(c, chunks=outofcore.open_chunks())
+            with metrics.timer('slice'):
+                s_t_r = shape_query.spatial.window(ds, 0.1)['lfmc'].sel(time=slice(
+                    shape_query.temporal.start, shape_query.temporal.finish))
             strs.append(s_t_r)
 
-        dsa = xr.merge(strs)
+        dsa = xr.merge(strs, compat='no_conflicts', join='outer')
         dsa['LFMC'] = dsa['lfmc']
 
         return dsa
@@ -20,13 +20,19 @@ from glob import glob as glob
 from multiprocessing import Pool
 from tabulate import tabulate
 
-import logging
-logging.basicConfig()
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-logger.debug("logger set to DEBUG")
+import serve.lfmc.config.compute as compute
 
+from serve.lfmc.util import logs
+logger = logs.get_logger(__name__)
+
+from serve.facade import mosaic_lfmc
 from serve.lfmc.models.LiveFuel import LiveFuelModel
+from serve.lfmc.models.TileIndex import TileIndex
+from serve.lfmc.process.Climatology import Climatology
+from serve.lfmc.process.ModisTransform import ModisTransform
+from serve.lfmc.process.TileArchive import derive_tile_lfmc, granule_date
+from serve.lfmc.util import modis
+
 
 class LiveScraper:
     def __init__(self, path):
@@ -34,8 +40,7 @@ class LiveScraper:
 
     def data(self, fpath, granule, total_req, suffix):
         have = len(glob(fpath + '*' + granule + '*' + suffix))
-        logger.debug("Have %s days (%3.2f%%), of data for %s." %
-                     (have, (have / total_req * 100), granule))
+        logger.debug("Have %s days (%3.2f%%), of data for %s.", have, have / total_req * 100, granule)
 
     def percentage(self, fpath, granule, total_req, suffix):
         have = len(glob(fpath + '*' + granule + '*' + suffix))
@@ -58,146 +63,41 @@ class LiveScraper:
         return dataframe
 
 
-    def get_standard_set(self):
-        logger.debug('Finding coordinate system references for granules.')
-
-        with open('./FuelModels/Live_FM/modis/MODIS-minmax.txt', 'r') as req:
-            first_granules = [line for line in req if '.A2000049' in line]
-
-        logger.debug("[Found: %s of 25] expected granules." % len(first_granules))
-
-        standard_coord_set = sorted(['./FuelModels/Live_FM/projd/' + r.split(
-            '/')[-1].rstrip().replace('.hdf', '.nc') for r in first_granules])
-
-        logger.debug("\nChecking the base coordinate system files...")
-        for f in standard_coord_set:
-            if not Path(f).is_file():
-                logger.debug('[Missing] %s' % str(f))
-            else:
-                logger.debug('[OK] %s' % str(f))
-
-        return standard_coord_set
-
-
-    def homogenize_granule(self, current_granule, label, standard_set):
-        '''
-        Homogenize the coords
-        There are tiny fluctuations in the precision of the lat/lon coordinates from gdal.
-        For each file in a granule HV space, maintain the same coordinate system.
-        '''
-
-        logger.debug(
-            '\nHomogenizing the coordinate space of granule: %s.' % (label))
-        standardized_lats, standardized_lons = get_standard_coords(
-            label, standard_set)
-
-        fsize = len(current_granule)
-        # Standardize the coord system
-        for c, i in enumerate(current_granule):
-
-            lfmc_path = i.replace('projd', 'lfmc')
-            if not Path(lfmc_path).is_file():
-                with xr.open_dataset(i) as ds:
-                    ds['vari'].coords['lat'].data = standardized_lats.data
-                    ds['vari'].coords['lon'].data = standardized_lons.data
-                    ds.to_netcdf(i + '.tmp', mode='w', format='NETCDF4')
-                    logger.debug("[%3.0f/%3.0f] %s" % (c, fsize, i))
-                os.rename(i + '.tmp', i)
-            else:
-                logger.debug("[Skipping] %s %s exists." % (i, lfmc_path))
-
-        logger.debug('HOMOGENIZATION of Granule: %s complete.' % (label))
-
-
-    def get_standard_coords(self, label, standard_set):
-
-        df = [ss for ss in standard_set if label in ss]
-
-        if len(df) == 0:
-            raise Error(
-                'Standard coord data file for granule %s not found.' % label)
-        elif len(df) > 1:
-            logger.debug(df)
-            raise Error('Too many files for standard coord data file.')
-        else:
-            with xr.open_dataset(df[0]) as ds:
-                standardized_lats = ds['vari'].coords['lat']
-                standardized_lons = ds['vari'].coords['lon']
-
-            return standardized_lats, standardized_lons
-
-
-    def derive_minmax(self, fourteen_years_data, label):
-        logger.debug('Calculating MINMAX for Granule: %s' % (label))
-
-        # Open everything (because of dask, this is lightweight)
-        with xr.open_mfdataset(fourteen_years_data, chunks={'time': 1}, concat_dim='time') as ds:
-            minmax_set = ds['vari'].sel(time=slice('2000-01-01', '2015-01-01'))
-            logger.debug(minmax_set)
+    def get_standard_coords(self, label):
+        """
+        Lats and lons every file of a tile is read on: the grid ModisTransform reprojects the tile onto, so
+        granules transformed at different times always line up.
+        :return: lats, lons
+        """
+        return modis.tile_grid(*self.coord_from_granule(label))
 
-            # Minimum VARI over 14 years
-            min_vari_g = './FuelModels/Live_FM/min_vari_' + label + '.nc'
-            minmax_set.min(dim='time').to_netcdf(
-                min_vari_g, mode='w', format='NETCDF4')
 
-            # Maximum VARI over 14 years
-            max_vari_g = './FuelModels/Live_FM/max_vari_' + label + '.nc'
-            minmax_set.max(dim='time').to_netcdf(
-                max_vari_g, mode='w', format='NETCDF4')
-        logger.debug('MINMAX for Granule: %s complete.' % (label))
+    def derive_minmax(self, fourteen_years_data, label, coords):
+        """ Brings the tile's VARI climatology up to date, reading only granules it doesn't hold yet. """
+        logger.debug('Calculating MINMAX for Granule: %s', label)
+        climatology = Climatology(self.path, label)
+        if climatology.update(fourteen_years_data, granule_date, coords) > 0 or not self.minmax_exists(label):
+            climatology.write()
+        logger.debug('MINMAX for Granule: %s complete.', label)
 
 
     def get_granule_from_file(self, fname):
         return str(fname).split('/')[-1].split('.')[-4]
 
 
-    def derive_lfmc(self, collection, label):
-        # Assumes sorted and homogenous granule collection...
-        logger.debug(78 * "*", "\n")
-        logger.debug('[%s] Deriving LFMC values' % label)
-        logger.debug(78 * "*", "\n")
-        max_vari_g = './FuelModels/Live_FM/max_vari_' + label + '.nc'
-        min_vari_g = './FuelModels/Live_FM/min_vari_' + label + '.nc'
-
-        with xr.open_dataset(max_vari_g) as max_vari_ds:
-            MAX_VARI = max_vari_ds['vari']
-
-        with xr.open_dataset(min_vari_g) as min_vari_ds:
-            MIN_VARI = min_vari_ds['vari']
-
-        MAX_MINUS_MIN_VARI = MAX_VARI.data - MIN_VARI.data
-
-        for f in collection:
-            lfmc_path = f.replace('projd', 'lfmc')
-            if not Path(lfmc_path).is_file():
-                with xr.open_dataset(f) as ds:
-                    # Duplicate the variable (we'll update the data next step)
-                    ds['lfmc'] = ds['vari']
-                    RVARI = (ds['vari'].data - MIN_VARI.data) / MAX_MINUS_MIN_VARI
-                    # clamp between 0-1
-                    RVARI = np.clip(RVARI, 0, 1)
-                    ds['lfmc'].data = 52.51**(1.36 * RVARI)
-                    ds['lfmc'].attrs['granule'] = label
-                    ds['lfmc'].to_netcdf(lfmc_path, mode='w', format='NETCDF4')
-                    logger.debug('Wrote: %s' % (lfmc_path))
-            else:
-                logger.debug("[File already exists.] %s" % (lfmc_path))
-
-        logger.debug(78 * "*", "\n")
-        logger.debug('[%s] LFMC calculations complete.' % label)
-        logger.debug(78 * "*", "\n")
-
-
-    def consolidate(self, ds, label):
-        for year in range(2000, 2020):
-            start = str(year) + '-01-01'
-            end = str(year + 1) + '-01-01'
-            fpath = './FuelModels/Live_FM/LFMC_' + str(year) + '_' + label + '.nc'
-            if not Path(fpath).is_file():
-                ds['lfmc'].sel(time=slice(start, end)).to_netcdf(
-                    fpath, mode='w', format='NETCDF4')
-                logger.debug('Wrote: ' + fpath)
-        logger.debug('Done')
+    def derive_lfmc(self, collections):
+        """
+        Derives LFMC for many tiles at once, one tile per process.
+        :param collections: dict of tile label (eg., 'h29v12') to its projected granule files and standard coords
+        :return: dict of tile label to the years whose archives were updated
+        """
+        logger.debug('Deriving LFMC values for %s', sorted(collections))
+        with Pool(compute.INGEST_WORKERS) as pool:
+            years = pool.starmap(derive_tile_lfmc,
+                                 [(self.path, label, files, coords)
+                                  for label, (files, coords) in collections.items()])
+        logger.debug('LFMC calculations complete.')
+        return dict(zip(collections, years))
 
 
     def file_len(self, fname):
@@ -285,7 +185,7 @@ class LiveScraper:
 
             with open(outfile, 'w') as out:
                 [out.write("%s" % g) for g in res.text]
-                logger.debug('Wrote %s' % outfile)
+                logger.debug('Wrote %s', outfile)
             return res.text
         else:
             return []
@@ -330,9 +230,9 @@ class LiveScraper:
                     incomplete.append(Path(projd).joinpath(
                         fname.replace('.hdf', '.nc')))
 
-        logger.debug("%4.0f are missing." % len(missing))
-        logger.debug("%4.0f are unprojected." % len(unprojected))
-        logger.debug("%4.0f are incomplete" % len(incomplete))
+        logger.debug("%4.0f are missing.", len(missing))
+        logger.debug("%4.0f are unprojected.", len(unprojected))
+        logger.debug("%4.0f are incomplete", len(incomplete))
 
         return missing, unprojected, incomplete
 
@@ -352,87 +252,73 @@ class LiveScraper:
         fname = './FuelModels/Live_FM/granules.txt'
         with open(fname, 'w') as f:
             [f.write("%s\n" % n) for n in labels]
-        logger.debug("Wrote: %s" % fname)
+        logger.debug("Wrote: %s", fname)
         logger.debug(sorted(labels))
         missing, unprojected, incomplete = generate_processing_bins()
 
         un = [str(x).rstrip() for x in unprojected]
 
         for label in sorted(labels):
-            logger.debug("Doing %s" % label)
+            logger.debug("Doing %s", label)
             grouped = [str(x).split('/')[-1] for x in un if label in x]
             fname = './FuelModels/Live_FM/' + label + '.txt'
             with open(fname, 'w') as f:
                 [f.write("%s\n" % n) for n in grouped]
-            logger.debug("Wrote %s" % fname)
+            logger.debug("Wrote %s", fname)
         logger.debug("Done.")
 
 
-    def minmax_exists(label):
-        max_vari_g = './FuelModels/Live_FM/max_vari_' + label + '.nc'
-        min_vari_g = './FuelModels/Live_FM/min_vari_' + label + '.nc'
+    def minmax_exists(self, label):
+        max_vari_g = self.path + 'max_vari_' + label + '.nc'
+        min_vari_g = self.path + 'min_vari_' + label + '.nc'
         return Path(min_vari_g).is_file() and Path(max_vari_g).is_file()
 
 
-    def do_work(labels):
+    def do_work(self, labels):
+        collections = {}
         for label in labels:
 
-            if not minmax_exists(label):
-                with open('./FuelModels/Live_FM/modis/MODIS-minmax.txt', 'r') as req:
-                    minmax_files = [line for line in req if label in line]
-                    minmax_files_list = ['./FuelModels/Live_FM/projd/' + v.split(
-                        '/')[-1].rstrip().replace('hdf', 'nc') for v in minmax_files]
+            with open(self.path + 'modis/MODIS-minmax.txt', 'r') as req:
+                minmax_files = [line for line in req if label in line]
+                minmax_files_list = [self.path + 'projd/' + v.split(
+                    '/')[-1].rstrip().replace('hdf', 'nc') for v in minmax_files]
 
-                missing = preflight(minmax_files_list)
-                if type(missing) == list:
-                    with Pool(6) as pool:
-                        pool.map(transformR, missing)
-                        pool.close()
-                        pool.join()
+            missing = self.preflight(minmax_files_list)
+            if len(missing) > 0:
+                self.transform(missing)
 
-                # Same coords for all
-                homogenize_granule(minmax_files_list, label, standard_set)
+            # Same coords for all, applied as each file is read
+            coords = self.get_standard_coords(label)
 
-                # Get MIN & MAX VARI from 14 year period
-                derive_minmax(minmax_files_list, label)
+            # Get MIN & MAX VARI over the climatology period; a no-op unless granules were added
+            self.derive_minmax(minmax_files_list, label, coords)
 
-            with open('./FuelModels/Live_FM/modis/granules_ytd.txt', 'r') as req:
+            with open(self.path + 'modis/granules_ytd.txt', 'r') as req:
                 rest = [line for line in req if label in line]
-                rest_list = ['./FuelModels/Live_FM/projd/' +
+                rest_list = [self.path + 'projd/' +
                              v.split('/')[-1].rstrip().replace('hdf', 'nc') for v in rest]
 
-            missing = preflight(rest_list)
-            if type(missing) == list:
-                with Pool(6) as pool:
-                    pool.map(transformR, missing)
-                    pool.close()
-                    pool.join()
+            missing = self.preflight(rest_list)
+            if len(missing) > 0:
+                self.transform(missing)
+
+            collections[label] = (rest_list, coords)
 
-            # Same coords for all
-            homogenize_granule(rest_list, label, standard_set)
+        # Get the LFMC for ALL files of every granule label, straight into the yearly archives
+        updated = self.derive_lfmc(collections)
 
-            # Get the LFMC for ALL files for this granule label
-            derive_lfmc(rest_list, label)
+        # Queries use the tiles until the mosaics of the updated years are rebuilt
+        TileIndex().update(LiveFuelModel().tile_archives())
+        for year in sorted(set(y for years in updated.values() for y in years)):
+            mosaic_lfmc.delay(year)
+        return updated
 
-            with xr.open_mfdataset(glob(self.path + "lfmc/*." + label + ".*.nc")) as ds:
-                consolidate(ds, label)
 
+    def transform(self, granules):
+        """ Converts downloaded HDF granules (names, in modis/) to VARI NetCDFs in projd/, in a process pool. """
+        return ModisTransform.transform_all([self.path + 'modis/' + g for g in granules], self.path + 'projd/')
 
-    def preflight(required):
+    def preflight(self, required):
         missing = [l for l in required if not Path(l).is_file()]
     #     [logger.debug("[Missing] %s" % (m)) for m in missing]
         return [m.split('/')[-1].replace('.nc', '.hdf') for m in missing]
-
-
-    def transformR(file):
-        logger.debug('Transforming %s' % file)
-        r = requests.post("http://transformr:8000/modis_to_ncdf", data={
-            "thefile": file
-        })
-        return r.text
-
-
-    def years(label='h29v12'):
-        with xr.open_mfdataset(glob(self.path + "lfmc/*." + label + ".*.nc")) as ds:
-            consolidate(ds, label)
-        logger.debug('Done.')
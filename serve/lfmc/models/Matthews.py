@@ -24,11 +24,13 @@ from serve.lfmc.models.matthews.broadscale.post_process import PostProcessor
 
 import datetime as dt
 
-import logging
 import math
 import matplotlib.pyplot as plt
 
+from serve.lfmc.util import logs
+
 plt.switch_backend('agg')
+logger = logs.get_logger(__name__)
 
 
 class Matthews(Model):
@@ -135,7 +137,7 @@ class Matthews(Model):
 
     def set_date(self, when):
         ds = when.strftime('%Y%m%d')
-        logger.debug("Setting date folder to: %s" % ds)
+        logger.debug("Setting date folder to: %s", ds)
         self.model.set_netcdf_path(self.data_path + ds)
 
     async def run_main(self):
@@ -165,7 +167,7 @@ class Matthews(Model):
         if len(fs) > 0:
             logger.debug(fs)
             with xr.open_mfdataset(fs) as ds:
-                logger.debug(ds)
+                logger.debug('%s', logs.brief(ds))
                 if "observations" in ds.dims:
                     sr = ds.squeeze("observations")
 
@@ -175,7 +177,7 @@ class Matthews(Model):
 
     def netcdf_name_for_date(self, when):
 
-        logger.debug("Making NCDF name for date: %s" % when)
+        logger.debug("Making NCDF name for date: %s", when)
 
         return "{}{}_{}{}".format(self.outputs["readings"]["path"],
                                   self.outputs["readings"]["prefix"],
@@ -193,8 +195,7 @@ class Matthews(Model):
         this_ncdf = self.netcdf_name_for_date(when)
 
         ok = Path(this_ncdf).is_file()
-        logger.debug("\n--> Checking for existence of NetCDF, %s for %s: %s" %
-              (this_ncdf, when.strftime("%d %m %Y"), ok))
+        logger.debug("\n--> Checking for existence of NetCDF, %s for %s: %s", this_ncdf, when, ok)
 
         # TODO -if OK put the file into Swift Storage
 
@@ -204,18 +205,17 @@ class Matthews(Model):
             return False
 
     async def get_shaped_timeseries(self, query: ShapeQuery) -> ModelResult:
-        logger.debug(
-            "\n--->>> Shape Query Called successfully on %s Model!! <<<---" % self.name)
-        logger.debug("Spatial Component is: \n%s" % str(query.spatial))
-        logger.debug("Temporal Component is: \n%s" % str(query.temporal))
+        logger.debug("\n--->>> Shape Query Called successfully on %s Model!! <<<---", self.name)
+        logger.debug("Spatial Component is: \n%s", str(query.spatial))
+        logger.debug("Temporal Component is: \n%s", str(query.temporal))
 
-        logger.debug("\nDerived LAT1: %s\nDerived LON1: %s\nDerived LAT2: %s\nDerived LON2: %s" %
-              query.spatial.expanded(0.05))
+        logger.debug("\nDerived LAT1: %s\nDerived LON1: %s\nDerived LAT2: %s\nDerived LON2: %s",
+                     *query.spatial.expanded(0.05))
 
         sr = await (self.get_shaped_resultcube(query))
 
-        logger.debug(sr)
-        logger.debug(sr.data)
+        logger.debug('%s', logs.brief(sr))
+        logger.debug('%s', logs.brief(sr.data))
         # Check our param exists in the shaped result set
         if len(sr.data) > 0:
 
@@ -240,8 +240,7 @@ class Matthews(Model):
         return run
 
     async def get_shaped_timeseries(self, query: ShapeQuery) -> ModelResult:
-        logger.debug(
-            "\n--->>> Shape Query Called successfully on %s Model!! <<<---" % self.name)
+        logger.debug("\n--->>> Shape Query Called successfully on %s Model!! <<<---", self.name)
 
         dps = []
         try:
@@ -15,20 +15,24 @@ import os
 from marshmallow import Schema, fields
 from pathlib2 import Path
 
+import serve.lfmc.config.compute as compute
 from serve.lfmc.models.ModelMetaData import ModelMetaDataSchema
 from serve.lfmc.query.ShapeQuery import ShapeQuery
 from serve.lfmc.query.GeoQuery import GeoQuery
 from serve.lfmc.results.DataPoint import DataPoint
 from serve.lfmc.results.ModelResult import ModelResult
 from serve.lfmc.results.MPEGFormatter import MPEGFormatter
-import logging
-logging.basicConfig()
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-logger.debug("logger set to DEBUG")
+from serve.lfmc.util import metrics
+from serve.lfmc.util import outofcore
+from serve.lfmc.util import logs
+logger = logs.get_logger(__name__)
 
 
 class Model:
+    # Whether the model only serves data already in its archives; models that fetch or compile data
+    # on demand may have data for dates the availability index doesn't list yet
+    archive_only = False
+
     def __init__(self):
         self.name = "Base Model Class"
         self.metadata = {}
@@ -55,6 +59,22 @@ class Model:
     def path():
         return '/FuelModels/'
 
+    @staticmethod
+    def archives_for_years(start, finish, name_for_year):
+        """
+        Existing per-year archives covering start to finish, checking each distinct year once.
+        :param name_for_year: maps a year (int) to the path of its archive
+        :return: paths in year order; years without an archive are skipped
+        """
+        found = []
+        for year in range(start.year, finish.year + 1):
+            archive = name_for_year(year)
+            if Path(archive).is_file():
+                found.append(archive)
+            else:
+                logger.debug('No archive for %s: %s', year, archive)
+        return found
+
     def date_is_cached(self, when):
 
         # TODO -Swift Object Storage Checking
@@ -64,8 +84,7 @@ class Model:
             os.makedirs(file_path)
 
         ok = Path(self.netcdf_name_for_date(when)).is_file()
-        logger.debug("\n--> Checking for existence of NetCDF @ %s for %s: %s" %
-                     (file_path, when.strftime("%d %m %Y"), ok))
+        logger.debug("\n--> Checking for existence of NetCDF @ %s for %s: %s", file_path, when, ok)
 
         # TODO -if OK put the file into Swift Storage
 
@@ -99,7 +118,7 @@ class Model:
 
         archive_file = str(archive_file)
 
-        logger.debug("\n--> Expanding: %s" % archive_file)
+        logger.debug("\n--> Expanding: %s", archive_file)
         try:
             if archive_file.endswith('.Z'):
                 subprocess.run(['gunzip', '-k', archive_file],
@@ -109,12 +128,10 @@ class Model:
                 logger.debug('Not a .Z file!')
 
         except FileNotFoundError as e:
-            logger.debug("\n--> Expanding: %s, failed.\n%s" %
-                         (archive_file, e))
+            logger.debug("\n--> Expanding: %s, failed.\n%s", archive_file, e)
             return False
         except OSError as e:
-            logger.debug("\n--> Removing: %s, was not necessary.\n %s" %
-                         (archive_file, e))
+            logger.debug("\n--> Removing: %s, was not necessary.\n %s", archive_file, e)
         finally:
             logger.debug('Expansion attempt complete.')
         return True
@@ -134,8 +151,7 @@ class Model:
         tvalue = str(b["time"].values).replace('.000000000', '.000Z')
         avalue = bin_[param].median()
 
-        logger.debug(
-            "\n>>>> Datapoint creation. (time={}, value={})".format(tvalue, avalue))
+        logger.debug("\n>>>> Datapoint creation. (time=%s, value=%s)", tvalue, avalue)
 
         asyncio.sleep(1)
 
@@ -147,20 +163,26 @@ class Model:
                          deviation=bin_[param].std())
 
     async def get_shaped_timeseries(self, query: ShapeQuery) -> pd.DataFrame:
-        logger.debug(
-            "\n--->>> Shape Query Called successfully on %s Model!! <<<---" % self.name)
+        logger.debug("\n--->>> Shape Query Called successfully on %s Model!! <<<---", self.name)
         sr = await (self.get_shaped_resultcube(query))
-        sr.load()
+        if compute.OUT_OF_CORE:
+            sr = outofcore.chunked(sr)
+        else:
+            query.report(0, 1, 'load')
+            with metrics.timer('load'):
+                sr.load()
+            query.report(1, 1, 'load')
         var = self.outputs['readings']['prefix']
         df = []
         try:
             logger.debug('Trying to find datapoints.')
 
             geoQ = GeoQuery(query)
-            df = geoQ.cast_fishnet({'init': 'EPSG:4326'}, sr[var])
+            with outofcore.scheduler():
+                df = geoQ.cast_fishnet({'init': 'EPSG:4326'}, sr[var])
             if len(df) == 0:
                 logger.debug('Found no datapoints!')
-                logger.debug(sr)
+                logger.debug('%s', logs.brief(sr))
 
         except FileNotFoundError:
             logger.debug('Files not found for date range.')
@@ -179,7 +201,7 @@ class Model:
         dps = await (self.get_shaped_timeseries(query))
         # geoQ = GeoQuery(query)
         # dps = geoQ.pull_fishnet(df)
-        logger.debug('Got here with %s data points.' % (len(dps)))
+        logger.debug('Got here with %s data points.', len(dps))
         return ModelResult(model_name=self.name, data_points=dps)
 
     async def get_shapefile_results(self, sq: ShapeQuery):
@@ -190,19 +212,27 @@ class Model:
 
     async def get_netcdf_results(self, sq: ShapeQuery):
         df = await (self.get_shaped_resultcube(sq))
-        logger.debug(df)
+        logger.debug('%s', logs.brief(df))
+        sq.report(0, 1, 'serialise')
         stored_nc = '/FuelModels/queries/' + str(uuid4()) + '.nc'
-        df.to_netcdf(stored_nc, format='NETCDF4')
+        if compute.OUT_OF_CORE:
+            # Written chunk by chunk by dask
+            df = outofcore.chunked(df)
+        with outofcore.scheduler(), metrics.timer('serialise'):
+            df.to_netcdf(stored_nc, format='NETCDF4')
+        sq.report(1, 1, 'serialise')
         return stored_nc
 
     async def get_mp4_results(self, sq: ShapeQuery):
         sr = await (self.get_shaped_resultcube(sq))
-        logger.debug(sr)
+        logger.debug('%s', logs.brief(sr))
         mp4ormatter = MPEGFormatter()
+        sq.report(0, 1, 'serialise')
         mp4 = await (mp4ormatter.format(
             sr, self.outputs["readings"]["prefix"]))
+        sq.report(1, 1, 'serialise')
 
-        logger.debug(mp4)
+        logger.debug('%s', logs.brief(mp4))
 
         asyncio.sleep(1)
         return mp4  # Parsed from dictionary results
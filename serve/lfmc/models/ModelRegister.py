@@ -1,6 +1,6 @@
 from marshmallow import fields, Schema
 
-import logging
+from serve.lfmc.util import logs
 
 from marshmallow import fields, Schema
 
@@ -19,14 +19,13 @@ from serve.lfmc.models.LiveFuel import LiveFuelModel
 from serve.lfmc.models.Model import ModelSchema
 from serve.lfmc.models.Yebra import YebraModel
 
-logging.basicConfig()
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-logger.debug("logger set to DEBUG")
+logger = logs.get_logger(__name__)
 
 
 class ModelRegister:
 
+    _shared = None
+
     def __init__(self):
         # self.models = [
         #     ModelAdaptor(DeadFuelModel()),
@@ -58,7 +57,23 @@ class ModelRegister:
             YebraModel()
         ]
 
-        self.geo_server = GeoServer()
+        self._geo_server = None
+
+    @staticmethod
+    def shared():
+        """
+        One register per process for read-only use (metadata, lookups), so it isn't rebuilt on every request.
+        """
+        if ModelRegister._shared is None:
+            ModelRegister._shared = ModelRegister()
+        return ModelRegister._shared
+
+    @property
+    def geo_server(self):
+        # Connects to GeoServer only when the catalogue is actually needed
+        if self._geo_server is None:
+            self._geo_server = GeoServer()
+        return self._geo_server
 
     # @staticmethod
     # def validate_catalog():
@@ -158,6 +173,20 @@ class ModelRegister:
     def get_model_codes(self):
         return [m.code for m in self.models]
 
+    def metadata(self):
+        """
+        Content of every model metadata endpoint, keyed by request path. It only changes between deploys.
+        """
+        models, errors = ModelsRegisterSchema().dump(self)
+        content = {'/models': models,
+                   '/models/names': self.get_model_names(),
+                   '/models/idents': self.get_model_ids(),
+                   '/models/codes': self.get_model_codes()}
+        model_schema = ModelSchema()
+        for m in self.models:
+            content['/model?name=%s' % m.code], errors = model_schema.dump(m)
+        return content
+
     def get(self, model_name):
         logger.debug(model_name)
         for m in self.models:
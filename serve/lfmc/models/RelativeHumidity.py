@@ -13,11 +13,8 @@ from serve.lfmc.models.Model import Model
 from serve.lfmc.models.ModelMetaData import ModelMetaData
 
 RH_PRODUCT = 'IDV71018_VIC_RH_SFC.nc'
-import logging
-logging.basicConfig()
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-logger.debug("logger set to DEBUG")
+from serve.lfmc.util import logs
+logger = logs.get_logger(__name__)
 
 
 class RHModel(BomBasedModel):
@@ -0,0 +1,128 @@
+import fcntl
+import json
+import os
+import re
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import xarray as xr
+
+import serve.lfmc.config.caching as caching
+from serve.lfmc.query.SpatialQuery import SpatialQuery
+
+from serve.lfmc.util import logs
+logger = logs.get_logger(__name__)
+
+# Yearly LFMC tile archives are named LFMC_{year}_h{h}v{v}.nc
+TILE_NAME = re.compile(r'_(\d{4})_(h\d+v\d+)\.nc$')
+
+
+class TileIndex:
+    """
+    Year, MODIS tile id and lat/lon bounds of each yearly LFMC tile archive, so queries open only
+    the tiles their polygon touches. Files are (re)read once, by path and modification time.
+    """
+
+    _shared = None
+    _lock = threading.Lock()
+
+    def __init__(self, path=None):
+        self.path = Path(path or caching.TILE_INDEX)
+        self.tiles = {}
+        self.loaded = None
+
+    @staticmethod
+    def shared():
+        """ The process-wide index, re-read whenever the ingest job has updated it. """
+        with TileIndex._lock:
+            if TileIndex._shared is None:
+                TileIndex._shared = TileIndex()
+            TileIndex._shared.refresh()
+            return TileIndex._shared
+
+    def refresh(self, force=False):
+        """ Re-reads the index if it changed; an unreadable index leaves the one in memory in use. """
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return
+        if force or mtime != self.loaded:
+            try:
+                with open(self.path, 'r') as f:
+                    self.tiles = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning('Could not read tile index %s: %s', self.path, e)
+            self.loaded = mtime
+
+    @contextmanager
+    def locked(self):
+        """ Holds an exclusive lock on the index (across processes) for a read-modify-write. """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(str(self.path) + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield self
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile('w', dir=str(self.path.parent), suffix='.part', delete=False) as f:
+            json.dump(self.tiles, f)
+        os.replace(f.name, str(self.path))
+
+    def update(self, paths):
+        """
+        Indexes new and changed tile archives and drops the deleted ones.
+        :param paths: every tile archive on disk
+        :return: number of files (re)indexed
+        """
+        with self.locked():
+            self.refresh(force=True)
+            for gone in set(self.tiles) - set(paths):
+                del self.tiles[gone]
+
+            changed = 0
+            for p in paths:
+                name = TILE_NAME.search(p)
+                if name is None:
+                    continue
+                mtime = os.path.getmtime(p)
+                if p in self.tiles and self.tiles[p]['mtime'] == mtime:
+                    continue
+                bbox = TileIndex.bounds(p)
+                if bbox is not None:
+                    self.tiles[p] = {'year': int(name.group(1)), 'tile': name.group(2), 'bbox': bbox, 'mtime': mtime}
+                    changed += 1
+
+            self.save()
+            self.loaded = None
+        logger.debug('Tile index: %s of %s tiles indexed.', changed, len(self.tiles))
+        return changed
+
+    @staticmethod
+    def bounds(path):
+        """ [min lat, min lon, max lat, max lon] of a tile, read from its coordinates only. """
+        try:
+            with xr.open_dataset(path) as ds:
+                lat_name, lon_name = SpatialQuery.coordinate_names(ds)
+                lats = ds[lat_name].values
+                lons = ds[lon_name].values
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning('Could not index %s: %s', path, e)
+            return None
+        return [float(np.min(lats)), float(np.min(lons)), float(np.max(lats)), float(np.max(lons))]
+
+    def for_year(self, year):
+        return {p: t for p, t in self.tiles.items() if t['year'] == year}
+
+    def intersecting(self, year, lat1, lon1, lat2, lon2):
+        """ Tile archives of that year overlapping the box with corners (lat1, lon1) and (lat2, lon2). """
+        lat1, lat2 = sorted([lat1, lat2])
+        lon1, lon2 = sorted([lon1, lon2])
+        return sorted(p for p, t in self.for_year(year).items()
+                      if t['bbox'][0] <= lat2 and t['bbox'][2] >= lat1
+                      and t['bbox'][1] <= lon2 and t['bbox'][3] >= lon1)
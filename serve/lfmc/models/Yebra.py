@@ -1,7 +1,7 @@
 import asyncio
 import datetime as dt
 import glob
-import logging
+from serve.lfmc.util import logs
 import os
 import os.path
 from pathlib import Path
@@ -14,14 +14,15 @@ from serve.lfmc.query import ShapeQuery
 from serve.lfmc.results.Abstracts import Abstracts
 from serve.lfmc.results.Author import Author
 from serve.lfmc.results.MPEGFormatter import MPEGFormatter
+from serve.lfmc.util import metrics
+from serve.lfmc.util import datasets
+from serve.lfmc.util import outofcore
 
-logging.basicConfig()
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-logger.debug("logger set to DEBUG")
+logger = logs.get_logger(__name__)
 
 
 class YebraModel(Model):
+    archive_only = True
 
     def __init__(self):
 
@@ -106,7 +107,7 @@ Characteristic plot method of 0.70, 0.78 and 0.71, respectively, indicating reas
 
     async def mpg(self, query: ShapeQuery):
         sr = await (self.get_shaped_resultcube(query))
-        logger.debug(sr)
+        logger.debug('%s', logs.brief(sr))
         mp4 = await (MPEGFormatter.format(sr, "fmc_mean"))
         asyncio.sleep(1)
         return mp4
@@ -114,28 +115,20 @@ Characteristic plot method of 0.70, 0.78 and 0.71, respectively, indicating reas
     # ShapeQuery
     async def get_shaped_resultcube(self, shape_query: ShapeQuery) -> xr.DataArray:
         fs = set()
-        ps = await asyncio.gather(*[self.dataset_files(when) for when in shape_query.temporal.dates()])
-        [fs.add(f) for f in ps if (f is not None and Path(f).is_file())]
-
-        [logger.debug("Confirmed: %s" % f) for f in fs]
-
-        if len(fs) == 1:
-            with xr.open_dataset(*fs) as ds:
-                ds = xr.decode_cf(ds)
-                ds.attrs['var_name'] = "fmc_mean"
-                tr = ds.sel(time=slice(shape_query.temporal.start.strftime("%Y-%m-%d"),
-                                       shape_query.temporal.finish.strftime("%Y-%m-%d")))
-                return tr
-
-        elif len(fs) > 1:
-            fs = list(set(fs))
-            with xr.open_mfdataset(*fs) as ds:
-                ds = xr.decode_cf(ds)
-                ds.attrs['var_name'] = "fmc_mean"
-                ts = ds.sel(time=slice(shape_query.temporal.start.strftime("%Y-%m-%d"),
-                                       shape_query.temporal.finish.strftime("%Y-%m-%d")))
-
-                return ts
+        with metrics.timer('discover'):
+            ps = await asyncio.gather(*[self.dataset_files(when) for when in shape_query.temporal.dates()])
+            [fs.add(f) for f in ps if (f is not None and Path(f).is_file())]
+
+        logger.debug("Confirmed: %s", logs.brief(fs))
+
+        if len(fs) > 0:
+            with metrics.timer('open'):
+                ds = datasets.open_mfdataset(fs, chunks=outofcore.open_chunks())
+            ds = xr.decode_cf(ds)
+            ds.attrs['var_name'] = "fmc_mean"
+            ts = ds.sel(time=slice(shape_query.temporal.start.strftime("%Y-%m-%d"),
+                                   shape_query.temporal.finish.strftime("%Y-%m-%d")))
+            return ts
         else:
             logger.debug("No files available/gathered for that space/time.")
 
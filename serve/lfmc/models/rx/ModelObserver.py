@@ -21,7 +21,7 @@ class ModelObserver(Observer):
         pass
 
     def on_error(self, error):
-        logger.debug("Error: %s" % error)
+        logger.debug("Error: %s", error)
         pass
 
     def on_completed(self):
@@ -7,7 +7,7 @@ class RegisterObserver(Observer):
         pass
 
     def on_error(self, error):
-        logger.debug("Error: %s" % error)
+        logger.debug("Error: %s", error)
         pass
 
     def on_completed(self):
@@ -0,0 +1,125 @@
+import datetime
+import os
+from pathlib import Path
+
+import numpy as np
+import xarray as xr
+
+from serve.lfmc.util import logs
+logger = logs.get_logger(__name__)
+
+# Period of the VARI climatology LFMC is derived against
+START = datetime.datetime(2000, 1, 1)
+FINISH = datetime.datetime(2015, 1, 1)
+
+# Granules read between checkpoints of the running state
+CHECKPOINT = 50
+
+
+class Climatology:
+    """
+    Per-pixel running minimum, maximum, sum and count of VARI for one MODIS tile, built in a single sweep
+    over its granules. The state, including which granules it already holds, is checkpointed to disk, so
+    an interrupted run resumes and adding years (or a later finish) only reads the new granules.
+    """
+
+    def __init__(self, path, label, start=START, finish=FINISH):
+        """
+        :param path: the Live_FM directory
+        :param label: tile, eg., 'h29v12'
+        """
+        self.path = path
+        self.label = label
+        self.start = start
+        self.finish = finish
+        self.state = path + 'minmax/' + label + '.climatology.npz'
+        self.reset()
+        self.load()
+
+    def reset(self):
+        self.seen = set()
+        self.minimum = self.maximum = self.total = self.count = None
+        self.lats = self.lons = None
+
+    def load(self):
+        if not Path(self.state).is_file():
+            return
+        with np.load(self.state) as state:
+            self.minimum, self.maximum = state['minimum'], state['maximum']
+            self.total, self.count = state['total'], state['count']
+            self.lats, self.lons = state['lats'], state['lons']
+            self.seen = set(state['seen'].tolist())
+        logger.debug('[%s] Resuming climatology of %s granules.', self.label, len(self.seen))
+
+    def save(self):
+        if self.count is None or not self.count.any():
+            return
+        os.makedirs(os.path.dirname(self.state), exist_ok=True)
+        with open(self.state + '.part', 'wb') as f:
+            np.savez(f, minimum=self.minimum, maximum=self.maximum, total=self.total, count=self.count,
+                     lats=self.lats, lons=self.lons, seen=np.array(sorted(self.seen), dtype=str))
+        os.replace(self.state + '.part', self.state)
+
+    def add(self, vari):
+        """ Folds one time step of VARI into the running statistics, in place; NaNs (no data) are skipped. """
+        vari = np.asarray(vari, dtype=np.float32)
+        if self.minimum is None:
+            self.minimum = np.full(vari.shape, np.nan, dtype=np.float32)
+            self.maximum = np.full(vari.shape, np.nan, dtype=np.float32)
+            self.total = np.zeros(vari.shape, dtype=np.float64)
+            self.count = np.zeros(vari.shape, dtype=np.int32)
+        np.fmin(self.minimum, vari, out=self.minimum)
+        np.fmax(self.maximum, vari, out=self.maximum)
+        valid = ~np.isnan(vari)
+        np.add(self.total, vari, out=self.total, where=valid)
+        np.add(self.count, 1, out=self.count, where=valid)
+
+    def update(self, files, date_of, coords=None):
+        """
+        Reads the granules within the period that the state doesn't hold yet.
+        :param files: projected granule files of the tile
+        :param date_of: function giving a granule file's observation date
+        :param coords: the tile's standard lats and lons, used in place of the granules' own
+        :return: number of granules added
+        """
+        if coords is not None:
+            if self.lats is not None and not (np.array_equal(self.lats, coords[0]) and
+                                              np.array_equal(self.lons, coords[1])):
+                logger.warning('[%s] Climatology state is on other coords; rebuilding it.', self.label)
+                self.reset()
+            self.lats, self.lons = coords
+        pending = sorted(f for f in files
+                         if self.start <= date_of(f) <= self.finish and os.path.basename(f) not in self.seen)
+        for i, f in enumerate(pending):
+            with xr.open_dataset(f) as ds:
+                vari = ds['vari'].squeeze().values
+                if self.lats is None:
+                    self.lats, self.lons = ds['lat'].values, ds['lon'].values
+            if vari.shape != (len(self.lats), len(self.lons)):
+                raise ValueError('%s does not match the coords of the %s climatology' % (f, self.label))
+            self.add(vari)
+            self.seen.add(os.path.basename(f))
+            if (i + 1) % CHECKPOINT == 0:
+                self.save()
+                logger.debug('[%s] %s of %s granules added.', self.label, i + 1, len(pending))
+        if len(pending) > 0:
+            self.save()
+        return len(pending)
+
+    def mean(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (self.total / self.count).astype(np.float32)
+
+    def write(self):
+        """ Writes the min_vari_, max_vari_ and mean_vari_ rasters of the tile; nothing if no pixel has data. """
+        if self.count is None or not self.count.any():
+            logger.warning('[%s] No VARI within %s to %s; climatology not written.', self.label,
+                           self.start.date(), self.finish.date())
+            return
+        coords = {'lat': self.lats, 'lon': self.lons}
+        for name, values in (('min', self.minimum), ('max', self.maximum), ('mean', self.mean())):
+            target = self.path + name + '_vari_' + self.label + '.nc'
+            xr.Dataset({'vari': (('lat', 'lon'), values)}, coords=coords).to_netcdf(
+                target + '.part', mode='w', format='NETCDF4')
+            os.replace(target + '.part', target)
+        logger.debug('[%s] Wrote VARI climatology of %s granules.', self.label, len(self.seen))
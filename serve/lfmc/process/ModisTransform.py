@@ -0,0 +1,99 @@
+import datetime
+import os
+from multiprocessing import Pool
+
+import numpy as np
+import xarray as xr
+
+import serve.lfmc.config.compute as compute
+from serve.lfmc.util import modis
+
+from serve.lfmc.util import logs
+logger = logs.get_logger(__name__)
+
+# MOD09A1 surface reflectance bands VARI is computed from, and their fill value
+RED, GREEN, BLUE = 'sur_refl_b01', 'sur_refl_b04', 'sur_refl_b03'
+FILL = -28672
+
+
+class ModisTransform:
+    """
+    Converts MOD09A1 HDF-EOS granules to the lat/lon VARI NetCDFs (projd/) the LFMC ingest reads:
+    VARI is computed on the sinusoidal grid, then resampled with the tile's cached nearest-neighbour index.
+    """
+
+    @staticmethod
+    def read_bands(hdf, bands=(RED, GREEN, BLUE)):
+        """ Reflectance bands of a granule, as float32 with fill values as NaN. """
+        # Only needed to read granules, so the rest of the module works where GDAL isn't installed
+        import gdal
+        granule = gdal.Open(hdf)
+        if granule is None:
+            raise OSError('Could not open %s' % hdf)
+        subdatasets = {name.split(':')[-1]: name for name, description in granule.GetSubDatasets()}
+        arrays = []
+        for band in bands:
+            values = gdal.Open(subdatasets[band]).ReadAsArray().astype(np.float32)
+            values[values == FILL] = np.nan
+            arrays.append(values)
+        return arrays
+
+    @staticmethod
+    def vari(red, green, blue):
+        """ Visible Atmospherically Resistant Index, (green - red) / (green + red - blue); NaN where undefined. """
+        denominator = green + red - blue
+        denominator[denominator == 0] = np.nan
+        result = green - red
+        np.divide(result, denominator, out=result)
+        return result
+
+    @staticmethod
+    def reproject(values, index):
+        """ Resamples a sinusoidal tile onto its lat/lon grid using resample_index; NaN outside the tile. """
+        flat = values.ravel()
+        result = np.full(index.shape, np.nan, dtype=np.float32)
+        inside = index >= 0
+        result[inside] = flat[index[inside]]
+        return result
+
+    @staticmethod
+    def hv(fname):
+        """ (h, v) of a granule, eg., MOD09A1.A2000049.h29v12.006.2015136104424.hdf """
+        h, v = os.path.basename(fname).split('.')[2].split('v')
+        return int(h.replace('h', '')), int(v)
+
+    @staticmethod
+    def when(fname):
+        return datetime.datetime.strptime(os.path.basename(fname).split('.')[1].replace('A', ''), '%Y%j')
+
+    @staticmethod
+    def transform(hdf, projd):
+        """
+        Writes the VARI NetCDF of one granule into the projd directory, replacing the transformr service.
+        :return: path of the NetCDF
+        """
+        target = os.path.join(projd, os.path.basename(hdf).replace('.hdf', '.nc'))
+        red, green, blue = ModisTransform.read_bands(hdf)
+        lats, lons, index = modis.resample_index(*ModisTransform.hv(hdf), pixels=red.shape[0])
+        vari = ModisTransform.reproject(ModisTransform.vari(red, green, blue), index)
+
+        ds = xr.Dataset({'vari': (('time', 'lat', 'lon'), vari[np.newaxis])},
+                        coords={'time': [ModisTransform.when(hdf)], 'lat': lats, 'lon': lons})
+        try:
+            ds.to_netcdf(target + '.part', mode='w', format='NETCDF4',
+                         encoding={'vari': {'zlib': True, 'complevel': 4}})
+            os.replace(target + '.part', target)
+        except Exception:
+            if os.path.exists(target + '.part'):
+                os.remove(target + '.part')
+            raise
+        logger.debug('Transformed %s', hdf)
+        return target
+
+    @staticmethod
+    def transform_all(hdfs, projd, workers=None):
+        """ Transforms granules in a pool of LFMC_INGEST_WORKERS processes (each caches the tiles it sees). """
+        os.makedirs(projd, exist_ok=True)
+        hdfs = sorted(hdfs, key=ModisTransform.hv)
+        with Pool(workers or compute.INGEST_WORKERS) as pool:
+            return pool.starmap(ModisTransform.transform, [(hdf, projd) for hdf in hdfs])
@@ -0,0 +1,122 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+import tracemalloc
+from uuid import UUID
+
+import serve.lfmc.config.compute as compute
+
+from serve.lfmc.util import logs
+logger = logs.get_logger(__name__)
+
+try:
+    # Sampling profiler with much lower overhead than cProfile, used when installed
+    from pyinstrument import Profiler as SamplingProfiler
+except ImportError:
+    SamplingProfiler = None
+
+
+class QueryProfile:
+    """
+    Runs one task under a profiler and tracemalloc, then writes the profile artefact and a JSON summary
+    next to the query results so they can be fetched by task UUID.
+
+    Only the task's own thread is profiled; work handed to dask worker threads shows up as time spent waiting.
+    """
+
+    # Functions and allocation sites listed in the summary
+    top = 25
+
+    def __init__(self, uuid, enabled=True):
+        self.uuid = uuid
+        self.enabled = enabled
+        self.profiler = None
+        self.started = None
+
+    def __enter__(self):
+        if not self.enabled:
+            return self
+        tracemalloc.start()
+        self.started = time.time()
+        if SamplingProfiler is not None:
+            self.profiler = SamplingProfiler()
+            self.profiler.start()
+        else:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if not self.enabled:
+            return False
+        if SamplingProfiler is not None:
+            self.profiler.stop()
+        else:
+            self.profiler.disable()
+        wall = time.time() - self.started
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        try:
+            self.save(wall, peak, snapshot, exc_type)
+        except OSError as e:
+            logger.warning('Could not save profile for %s: %s', self.uuid, e)
+        return False
+
+    def save(self, wall, peak, snapshot, exc_type=None):
+        os.makedirs(compute.PROFILE_DIR, exist_ok=True)
+
+        if SamplingProfiler is not None:
+            artefact = QueryProfile.artefact_path(self.uuid, '.html')
+            with open(artefact, 'w') as f:
+                f.write(self.profiler.output_html())
+            functions = self.profiler.output_text(unicode=False, color=False).splitlines()[:QueryProfile.top]
+        else:
+            artefact = QueryProfile.artefact_path(self.uuid, '.prof')
+            self.profiler.dump_stats(artefact)
+            text = io.StringIO()
+            pstats.Stats(self.profiler, stream=text).sort_stats('cumulative').print_stats(QueryProfile.top)
+            functions = text.getvalue().splitlines()
+
+        summary = {
+            'id': self.uuid,
+            'profiler': 'pyinstrument' if SamplingProfiler is not None else 'cProfile',
+            'artefact': os.path.basename(artefact),
+            'wall_seconds': round(wall, 3),
+            'peak_memory_bytes': peak,
+            'failed': exc_type is not None,
+            'functions': functions,
+            'allocations': [str(stat) for stat in snapshot.statistics('lineno')[:QueryProfile.top]]
+        }
+        with open(QueryProfile.summary_path(self.uuid), 'w') as f:
+            json.dump(summary, f, indent=2)
+        logger.debug('Profile of %s written to %s (peak memory %s bytes).', self.uuid, artefact, peak)
+
+    @staticmethod
+    def task_id(uuid):
+        """ Canonical form of a task id; raises ValueError for anything else, so ids from requests are safe in paths. """
+        return str(UUID(str(uuid)))
+
+    @staticmethod
+    def summary_path(uuid):
+        return os.path.join(compute.PROFILE_DIR, '%s.json' % QueryProfile.task_id(uuid))
+
+    @staticmethod
+    def artefact_path(uuid, suffix):
+        return os.path.join(compute.PROFILE_DIR, '%s%s' % (QueryProfile.task_id(uuid), suffix))
+
+    @staticmethod
+    def read(uuid):
+        """
+        :param uuid: id of a task submitted with profile=true
+        :return: the profile summary dict, or None if the task was not profiled (or has not finished)
+        """
+        try:
+            with open(QueryProfile.summary_path(uuid), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
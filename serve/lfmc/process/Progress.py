@@ -0,0 +1,72 @@
+import time
+
+from serve.lfmc.util import logs
+logger = logs.get_logger(__name__)
+
+PROGRESS = 'PROGRESS'
+
+STAGES = ['discover', 'download', 'load', 'aggregate', 'serialise']
+
+# Typical share of a query's run time spent in each stage, in order; stages a model skips count as done
+WEIGHTS = {'discover': 0.05, 'download': 0.25, 'load': 0.25, 'aggregate': 0.4, 'serialise': 0.05}
+
+
+class ProgressReporter:
+    """
+    Collects (done, total, stage) reports from model code and publishes them as the custom
+    PROGRESS state of a Celery task, together with the percentage of the whole task complete (the stages
+    weighted by WEIGHTS), elapsed time and an estimate of the time remaining.
+    """
+
+    # Minimum seconds between two updates within the same stage
+    interval = 1.0
+
+    def __init__(self, task=None, clock=time.time):
+        self.task = task
+        self.clock = clock
+        self.started = clock()
+        self.stage = None
+        self.last_update = 0
+        self.fraction = 0.0
+
+    def report(self, done, total, stage):
+        if stage not in STAGES:
+            raise ValueError('Unknown progress stage: %s' % stage)
+
+        now = self.clock()
+        if stage != self.stage:
+            self.stage = stage
+        elif done < total and now - self.last_update < self.interval:
+            return
+
+        self.last_update = now
+        meta = self.meta(done, total, now)
+        logger.debug('[%s] %s of %s (%3.1f%% overall)', stage, done, total, meta['percent'])
+
+        if self.task is not None:
+            self.task.update_state(state=PROGRESS, meta=meta)
+
+    def overall(self, done, total):
+        """ Fraction of the whole task complete: the stages before this one, plus this one's share. """
+        before = sum(WEIGHTS[s] for s in STAGES[:STAGES.index(self.stage)])
+        in_stage = min(done / total, 1.0) if total > 0 else 0.0
+        # Never goes backwards, eg., when a stage is re-entered
+        self.fraction = max(self.fraction, round(before + WEIGHTS[self.stage] * in_stage, 6))
+        return self.fraction
+
+    def meta(self, done, total, now):
+        fraction = self.overall(done, total)
+        elapsed = now - self.started
+        eta = None
+        if fraction >= 1.0:
+            eta = 0.0
+        elif fraction > 0:
+            eta = elapsed / fraction * (1.0 - fraction)
+
+        return {'stage': self.stage,
+                'done': done,
+                'total': total,
+                'percent': round(100 * fraction, 1),
+                'stage_percent': round(100 * done / total, 1) if total > 0 else 0.0,
+                'elapsed': round(elapsed, 1),
+                'eta': None if eta is None else round(eta, 1)}
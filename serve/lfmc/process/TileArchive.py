@@ -0,0 +1,212 @@
+import datetime
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import netCDF4
+import numpy as np
+import xarray as xr
+
+from serve.lfmc.util import logs
+logger = logs.get_logger(__name__)
+
+# 52.51 ** (1.36 * RVARI) == exp(LFMC_EXPONENT * RVARI)
+LFMC_EXPONENT = np.float32(1.36 * np.log(52.51))
+
+# Time axis of the yearly tile archives
+TIME_UNITS = 'days since 2000-01-01 00:00:00'
+EPOCH = datetime.datetime(2000, 1, 1)
+
+# Spatial chunk edge (cells) of the yearly tile archives and mosaics
+ARCHIVE_CHUNK = 256
+
+
+def granule_date(fname):
+    """ Observation date of a granule file, eg., MOD09A1.A2000049.h29v12.006.2015136104424.nc """
+    return datetime.datetime.strptime(str(fname).split('/')[-1].split('.')[1].replace('A', ''), '%Y%j')
+
+
+def vari_range(path, label):
+    """
+    MIN VARI and 1 / (MAX VARI - MIN VARI) of a tile as float32, memory-mapped from .npy copies of its
+    min/max rasters. The copies are rebuilt whenever the rasters change.
+    """
+    min_vari_g = path + 'min_vari_' + label + '.nc'
+    max_vari_g = path + 'max_vari_' + label + '.nc'
+    low_npy = path + 'minmax/' + label + '.min.npy'
+    scale_npy = path + 'minmax/' + label + '.scale.npy'
+
+    source = max(os.path.getmtime(min_vari_g), os.path.getmtime(max_vari_g))
+    if not all(Path(f).is_file() and os.path.getmtime(f) >= source for f in (low_npy, scale_npy)):
+        os.makedirs(path + 'minmax', exist_ok=True)
+        with xr.open_dataset(min_vari_g) as ds:
+            low = ds['vari'].squeeze().values.astype(np.float32)
+        with xr.open_dataset(max_vari_g) as ds:
+            scale = ds['vari'].squeeze().values.astype(np.float32)
+        np.subtract(scale, low, out=scale)
+        with np.errstate(divide='ignore'):
+            np.reciprocal(scale, out=scale)
+        for target, values in ((low_npy, low), (scale_npy, scale)):
+            with open(target + '.part', 'wb') as f:
+                np.save(f, values)
+            os.replace(target + '.part', target)
+
+    return np.load(low_npy, mmap_mode='r'), np.load(scale_npy, mmap_mode='r')
+
+
+def lfmc_from_vari(vari, low, scale):
+    """ 52.51 ** (1.36 * clip((VARI - MIN) / (MAX - MIN), 0, 1)), computed in place on one float32 copy of vari. """
+    lfmc = np.array(vari, dtype=np.float32)
+    with np.errstate(invalid='ignore'):
+        np.subtract(lfmc, low, out=lfmc)
+        np.multiply(lfmc, scale, out=lfmc)
+        np.clip(lfmc, 0, 1, out=lfmc)
+    np.multiply(lfmc, LFMC_EXPONENT, out=lfmc)
+    np.exp(lfmc, out=lfmc)
+    return lfmc
+
+
+def archived_dates(archive):
+    """ Time steps (days since EPOCH) of a yearly tile archive, in the order they are stored. """
+    if not Path(archive).is_file():
+        return []
+    with netCDF4.Dataset(archive, 'r') as nc:
+        return np.asarray(nc['time'][:]).tolist()
+
+
+def on_grid(archive, lats, lons):
+    """ Whether an existing archive's lats and lons are exactly the tile's standard ones. """
+    with netCDF4.Dataset(archive, 'r') as nc:
+        return np.array_equal(np.asarray(nc['lat'][:]), lats) and np.array_equal(np.asarray(nc['lon'][:]), lons)
+
+
+def create_archive(target, lats, lons, label):
+    """ An empty yearly tile archive with an unlimited time axis, open for writing. """
+    nc = netCDF4.Dataset(target, 'w', format='NETCDF4')
+    nc.createDimension('time', None)
+    nc.createDimension('lat', len(lats))
+    nc.createDimension('lon', len(lons))
+    times = nc.createVariable('time', 'f8', ('time',))
+    times.units = TIME_UNITS
+    times.calendar = 'standard'
+    nc.createVariable('lat', 'f8', ('lat',))[:] = lats
+    nc.createVariable('lon', 'f8', ('lon',))[:] = lons
+    v = nc.createVariable('lfmc', 'f4', ('time', 'lat', 'lon'), zlib=True, complevel=4, fill_value=np.nan,
+                          chunksizes=(1, min(len(lats), ARCHIVE_CHUNK), min(len(lons), ARCHIVE_CHUNK)))
+    v.granule = label
+    return nc
+
+
+def append_step(nc, step, lfmc):
+    """ Appends one time step; its data is written before its time, so a step is never listed without data. """
+    i = len(nc['time'])
+    nc['lfmc'][i, :, :] = lfmc
+    nc['time'][i] = step
+
+
+def update_archive(archive, steps, lats, lons, label, rebuild=False):
+    """
+    Adds time steps to a tile's yearly archive, keeping its time axis in order. The archive is written to a
+    temporary copy in its directory and swapped in with os.replace, so API workers holding it open keep
+    reading a consistent file and a failed run leaves the previous archive as it was.
+    :param steps: dict of time step (days since EPOCH) to a function returning that step's LFMC
+    :param rebuild: discard the steps already archived, eg., ones on an older grid
+    """
+    existing = [] if rebuild else archived_dates(archive)
+    if len(existing) > 0 and not on_grid(archive, lats, lons):
+        raise ValueError('%s is not on the standard coords of %s' % (archive, label))
+    fd, partial = tempfile.mkstemp(dir=os.path.dirname(archive) or '.', suffix='.part')
+    os.close(fd)
+    try:
+        if len(existing) > 0 and existing == sorted(existing) and min(steps) > existing[-1]:
+            # New dates only: append to a copy
+            shutil.copyfile(archive, partial)
+            with netCDF4.Dataset(partial, 'a') as nc:
+                for step in sorted(steps):
+                    append_step(nc, step, steps[step]())
+        else:
+            # A late granule (or none archived yet): rewrite the year in time order
+            with create_archive(partial, lats, lons, label) as nc:
+                old = netCDF4.Dataset(archive, 'r') if len(existing) > 0 else None
+                try:
+                    position = {step: i for i, step in enumerate(existing)}
+                    for step in sorted(set(existing) | set(steps)):
+                        if step in steps:
+                            append_step(nc, step, steps[step]())
+                        else:
+                            append_step(nc, step, np.ma.filled(old['lfmc'][position[step], :, :], np.nan))
+                finally:
+                    if old is not None:
+                        old.close()
+        os.chmod(partial, 0o644)
+        os.replace(partial, archive)
+    except Exception:
+        os.remove(partial)
+        raise
+
+
+def granule_lfmc(f, low, scale, lats, lons, label):
+    """ LFMC of one projected granule, checked against the tile's standard coords. """
+    with xr.open_dataset(f) as ds:
+        lfmc = lfmc_from_vari(ds['vari'].squeeze().values, low, scale)
+    if lfmc.shape != (len(lats), len(lons)):
+        raise ValueError('%s does not match the standard coords of %s' % (f, label))
+    return lfmc
+
+
+def derive_tile_lfmc(path, label, collection, coords):
+    """
+    Derives LFMC for the projected granules of one tile into its yearly archives (LFMC_{year}_{label}.nc),
+    one rewrite per archive and run. Dates already archived are skipped, so reruns resume.
+    :param coords: the tile's standard lats and lons, written in place of each granule's own
+    :return: the years whose archives were updated
+    """
+    lats, lons = coords
+    low, scale = vari_range(path, label)
+    pending = {}
+    for f in collection:
+        if not Path(f).is_file():
+            logger.debug('[Missing] %s', f)
+            continue
+        when = granule_date(f)
+        pending.setdefault(when.year, {})[(when - EPOCH).total_seconds() / 86400] = f
+
+    years = []
+    for year, granules in sorted(pending.items()):
+        archive = path + 'LFMC_{}_{}.nc'.format(year, label)
+        rebuild = Path(archive).is_file() and not on_grid(archive, lats, lons)
+        if rebuild:
+            logger.warning('%s is not on the standard coords of %s; rebuilding it.', archive, label)
+        done = set() if rebuild else set(archived_dates(archive))
+        steps = {step: (lambda f=f: granule_lfmc(f, low, scale, lats, lons, label))
+                 for step, f in granules.items() if step not in done}
+        if len(steps) > 0:
+            update_archive(archive, steps, lats, lons, label, rebuild)
+            years.append(year)
+            logger.debug('[%s] Added %s time steps to %s.', label, len(steps), archive)
+    return years
+
+
+def write_mosaic(tiles, target):
+    """
+    Merges tile archives into one archive at target, chunked by time step and ARCHIVE_CHUNK cells so a query
+    reads just its window. Written to a temporary file and swapped in, so concurrent builds can't collide.
+    """
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    fd, partial = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.part')
+    os.close(fd)
+    opened = [xr.open_dataset(t, chunks={'time': 1}) for t in tiles]
+    try:
+        # Tiles overlap where their footprints meet: there one has data and the other NaN
+        mosaic = xr.merge([ds['lfmc'] for ds in opened], compat='no_conflicts', join='outer')
+        chunks = tuple(1 if d == 'time' else min(mosaic.sizes[d], ARCHIVE_CHUNK) for d in mosaic['lfmc'].dims)
+        encoding = {'lfmc': {'zlib': True, 'complevel': 4, 'chunksizes': chunks}}
+        mosaic.to_netcdf(partial, format='NETCDF4', encoding=encoding)
+        os.chmod(partial, 0o644)
+        os.replace(partial, target)
+    except Exception:
+        os.remove(partial)
+        raise
+    finally:
+        [ds.close() for ds in opened]
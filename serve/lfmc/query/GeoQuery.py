@@ -1,4 +1,3 @@
-import fiona
 import geojson
 import shapely
 import pyproj
@@ -6,22 +5,21 @@ import pandas as pd
 import numpy as np
 import xarray as xr
 import geopandas as gp
-from rtree import index
-from shapely.ops import polygonize, unary_union
 from shapely.wkt import dumps, loads
 from shapely.geometry import LineString, MultiLineString, Polygon, MultiPolygon, mapping, shape
 from cartopy import crs as ccrs
 
-from tabulate import tabulate
 
-from serve.lfmc.results.DataPoint import DataPoint
+from serve.lfmc.results.ResultStream import ResultStream
+from serve.lfmc.results.TimeSeries import TimeSeries
 from serve.lfmc.query.ShapeQuery import ShapeQuery
+from serve.lfmc.query.SpatialQuery import SpatialQuery
+from serve.lfmc.util import metrics
+from serve.lfmc.util import outofcore
+from serve.lfmc.util.coverage import coverage_fractions, transform_for_coords
 
-import logging
-logging.basicConfig()
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-logger.debug("logger set to DEBUG")
+from serve.lfmc.util import logs
+logger = logs.get_logger(__name__)
 
 
 class GeoQuery(ShapeQuery):
@@ -33,208 +31,132 @@ class GeoQuery(ShapeQuery):
     vicgrid94 = pyproj.Proj("+init=EPSG:3111")
     wgs84 = pyproj.Proj("+init=EPSG:4326")
 
-    # def __init__(self, start, finish, geo_json, weighted=False):
-    #     super().__init__(start=start, finish=finish, geo_json=geo_json)
-    #     self.idx = None
+    # Buffer (in degrees) added around the selection's bounding box
+    cell_size = 1.0
 
     def __init__(self, query):
         self.query = query
-        self.idx = None
-
-    def build_index(self, grids):
-        self.idx = index.Index()
-        logger.debug('Building Index()')
-        for pos, poly in enumerate(grids):
-            self.idx.insert(pos, poly.bounds)
 
 #    def pull_fishnet(self, data):
 #    final_data = []
 
-    def cast_fishnet(self, projection, df) -> gp.GeoDataFrame:
-        """ dataframe from dataframe  """
+    def cast_fishnet(self, projection, df) -> TimeSeries:
+        """ Shape statistics over time of the data array, as columns. """
 
         logger.debug('Called cast fishnet.')
-        cell_size = 1.0  # Default: 5 seconds
 
         # Get the largest nearest bounding box
         # (essentially just adding a buffer around the selection)
         bottom, left, top, right = self.query.spatio_temporal_query.spatial.expanded(
-            cell_size)
-
-        logger.debug("\nB: %s\n L: %s\n T: %s\n R: %s\n" %
-                     (bottom, left, top, right))
-
-        if 'latitude' in df.coords:
-            lats = df['latitude'].where(df['latitude'] <= top, drop=True).where(
-                df['latitude'] >= bottom, drop=True).values
-            lons = df['longitude'].where(df['longitude'] <= right, drop=True).where(
-                df['longitude'] >= left, drop=True).values
-            # logger.debug(lons)
-            # logger.debug(lats)
-        elif 'lat' in df.coords:
-            lats = df['lat'].where(df['lat'] <= top, drop=True).where(
-                df['lat'] >= bottom, drop=True).values
-            lons = df['lon'].where(df['lon'] <= right, drop=True).where(
-                df['lon'] >= left, drop=True).values
-            # logger.debug(lons)
-            # logger.debug(lats)
-        else:
-            logger.debug("Can't determine coordinate naming conventions.")
-        # lons = np.arange(140.9500, 149.9800, 0.05)
-        # lats = np.arange(-34.0000, -39.1500, -0.05)
-
-        # logger.debug(df)
-
-        xl = len(lons) + 1
-        yl = len(lats) + 1
-        x = np.linspace(0, xl, xl)
-        y = np.linspace(0, yl, yl)
-
-        # logger.debug('Selections X Length: %s' % len(x))
-        # logger.debug('DF lon range: %s to %s' %
-        #              (df['lon'].min(), df['lon'].max()))
-        # logger.debug('Selections Y Length: %s' % len(y))
-        # logger.debug('DF lon range: %s to %s' %
-        #              (df['lat'].min(), df['lat'].max()))
-
-        hlines = [((lon1, lai), (lon2, lai))
-                  for lon1, lon2 in zip(lons[:-1], lons[1:]) for lai in lats]
-        vlines = [((loi, lat1), (loi, lat2))
-                  for lat1, lat2 in zip(lats[:-1], lats[1:]) for loi in lons]
-
-        # -|--|--|-
-        # -|--|--|-
-        # -|--|--|-
-        # -|--|--|-
-        # -|--|--|-
-
-        grids = list(polygonize(MultiLineString(hlines + vlines)))
-
-        # |-----------|
-        # |--|--|--|--|
-        # |--|--|--|--|
-        # |--|--|--|--|
-        # |--|--|--|--|
-        # |--|--|--|--|
-        # |-----------|
-
-        # Do only once
-        if self.idx is None:
-            self.build_index(grids)
-
-        try:
-            weights = [[[pos, grids[pos], grids[pos].intersection(self.query.selections[i]),
-                         (grids[pos].intersection(self.query.selections[i]).area / grids[pos].area)]
-                        for pos in self.idx.intersection(self.query.selections[i].bounds)]
-                       for i in range(0, len(self.query.selections))]
-        except Exception as te:
-            logger.error(te.msg)
-            pass
-
-        agg_weights = dict()
-        agg_bounds = dict()
-        agg_geom = dict()
-
-        # Build up from all the tiny pieces
-        for w in weights:
-            for pos, cell, sect, weight in w:
-                if weight > 0:
-                    agg_weights[pos] = agg_weights.get(pos, 0) + weight
-                    agg_bounds[pos] = cell.bounds
-                    agg_geom[pos] = unary_union(
-                        [agg_geom.get(pos, Polygon()), sect])
-
-        rdf = []
-        shape_stats = []
-        dataframesList = []
-        for t in sorted(df['time'].values):
-
-            logger.debug('Doing timeslice...')
-
-            final_weights = dict()
-            mcs = dict()
-            # Loop through the aggregated weightings for each cell
-            for pos in agg_weights:
-                weight = agg_weights[pos]
-                left, bottom, right, top = agg_bounds[pos]
-                if weight > 0:
-                    if 'latitude' in df.coords:
-                        cells = df.sel(time=t).sel(latitude=bottom,
-                                                   longitude=left).values.flatten()
-                    elif 'lat' in df.coords:
-                        cells = df.sel(time=t).sel(lat=bottom,
-                                                   lon=left).values.flatten()
-                    final_weights[pos] = weight
-                    mcs[pos] = cells[0]
-
-            data = [[t, mcs[pos], final_weights[pos], agg_geom[pos].wkt]
-                    for pos in final_weights]
-
-            if len(data) > 0:
-                # Create a dataframe of the results
-                results = pd.DataFrame(
-                    data, columns=['time', 'moisture_content', 'weight', 'geometry'])
-
-                moisture = results[['moisture_content']].values
-
-                indices = ~pd.isnull(moisture)
-                non_nans = (indices).sum(1)
-
-                if len(non_nans) == 0:
-                    logger.debug(
-                        'All moisture values are NaN. No datapoints to gather.')
-                    logger.debug(
-                        tabulate(results[['moisture_content', 'weight']]))
-                else:
-                    logger.debug(
-                        'Found {} cells with moisture.'.format(len(non_nans)))
-
-                    if results[['weight']].values[indices].sum() == 0:
-                        raise ValueError('Cell weights total zero.')
-                    else:
-                        # Used for GeoJSON via __geo_interface__
-                        # Confirmed Proj can be like... {'init': 'epsg:3857'} or... wgs84
-                        # areaGDF = gp.GeoDataFrame(results, crs=projection)
-                        area_weighted_average_mc = np.average(
-                            moisture[indices], weights=results[['weight']].values[indices])
-                        mean_mc = np.nanmean(moisture)
-                        min_mc = np.nanmin(moisture)
-                        max_mc = np.nanmax(moisture)
-                        median_mc = np.nanmedian(moisture)
-                        std_mc = np.nanstd(moisture)
-                        median_mc = np.nanmedian(moisture)
-                        count_mc = len(moisture)  # Count NaN cells too??
-
-                        shape_stats.append((t, area_weighted_average_mc,
-                                            mean_mc, min_mc, max_mc, std_mc, median_mc, count_mc))
+            GeoQuery.cell_size)
+
+        logger.debug("\nB: %s\n L: %s\n T: %s\n R: %s\n", bottom, left, top, right)
+
+        lat_name, lon_name = SpatialQuery.coordinate_names(df)
+
+        lats = df[lat_name].where(df[lat_name] <= top, drop=True).where(
+            df[lat_name] >= bottom, drop=True).values
+        lons = df[lon_name].where(df[lon_name] <= right, drop=True).where(
+            df[lon_name] >= left, drop=True).values
+
+        # Exact fraction of each cell (centred on its coordinate) covered by the selections
+        with metrics.timer('weights'):
+            coverage = self.coverage_for(df[lat_name].values, df[lon_name].values, lats, lons)
+        covered = coverage > 0
+        weights = coverage[covered]
+
+        window = df.sel({lat_name: lats, lon_name: lons}).transpose('time', lat_name, lon_name)
+
+        with metrics.timer('aggregate'):
+            shape_stats, pending, done = self.gather_stats(window, covered, weights)
+
+        if self.query.stream is not None:
+            self.query.publish(TimeSeries.from_stats(pending), done, window.sizes['time'])
 
         logger.debug('Done gathering stats over time.')
-        final_stats = pd.DataFrame(shape_stats, columns=[
-                                   'time', 'area_weighted_average_mc', 'mean_mc', 'min_mc', 'max_mc', 'std_mc', 'median_mc', 'count_mc'])
-        final_stats.set_index('time', inplace=True)
-
-        logger.debug(tabulate(final_stats))
-
-        dps = []
-        logger.debug('Type of final_stats is: %s' % type(final_stats))
-        logger.debug(tabulate(final_stats))
-
-        for row in final_stats.itertuples(index=True, name='Pandas'):
-            # logger.debug(row.Index.isoformat().replace('.000000000', '.000Z'))
-            dps.append(DataPoint(observation_time=row.Index.isoformat() + '.000Z',
-                                 value=row.median_mc,
-                                 mean=row.mean_mc,
-                                 weighted_mean=row.area_weighted_average_mc,
-                                 minimum=row.min_mc,
-                                 maximum=row.max_mc,
-                                 deviation=row.std_mc,
-                                 median=row.median_mc,
-                                 count=row.count_mc))
-        return dps
+        series = TimeSeries.from_stats(sorted(shape_stats, key=lambda stats: stats[0]))
+        logger.debug('Gathered stats for %s time slices.', len(series))
+        return series
 
         # This would be much better as a GeoDataFrame and export to JSON using __geo_interface__
         # [Moisture, weight, geometry]
         # return data
 
+    def gather_stats(self, window, covered, weights):
+        """
+        Statistics of the covered cells for every time slice of the window, reported and (when streaming)
+        published as they are gathered.
+        :return: all stats, the stats not yet published and the number of slices done
+        """
+        shape_stats = []
+        pending = []
+        done = 0
+        total = window.sizes['time']
+        for block in outofcore.time_blocks(window):
+            for t in sorted(block['time'].values):
+
+                logger.debug('Doing timeslice...')
+
+                moisture = block.sel(time=t).values[covered]
+
+                stats = self.slice_stats(t, moisture, weights)
+                shape_stats += stats
+                done += 1
+                self.query.report(done, total, 'aggregate')
+
+                if self.query.stream is not None:
+                    pending += stats
+                    if len(pending) >= ResultStream.batch_size:
+                        self.query.publish(TimeSeries.from_stats(pending), done, total)
+                        pending = []
+
+        return shape_stats, pending, done
+
+    @staticmethod
+    def slice_stats(t, moisture, weights):
+        """
+        Summary statistics of the covered cells for one time slice.
+        :return: a list holding one stats tuple, or nothing if there is no valid data
+        """
+        if len(moisture) == 0:
+            return []
+
+        indices = ~np.isnan(moisture)
+
+        if not indices.any():
+            logger.debug(
+                'All moisture values are NaN. No datapoints to gather.')
+            return []
+
+        logger.debug('Found %s cells with moisture.', indices.sum())
+
+        if weights[indices].sum() == 0:
+            raise ValueError('Cell weights total zero.')
+
+        area_weighted_average_mc = np.average(
+            moisture[indices], weights=weights[indices])
+        mean_mc = np.nanmean(moisture)
+        min_mc = np.nanmin(moisture)
+        max_mc = np.nanmax(moisture)
+        std_mc = np.nanstd(moisture)
+        median_mc = np.nanmedian(moisture)
+        count_mc = len(moisture)  # Count NaN cells too??
+
+        return [(t, area_weighted_average_mc,
+                 mean_mc, min_mc, max_mc, std_mc, median_mc, count_mc)]
+
+    def coverage_for(self, all_lats, all_lons, lats, lons):
+        """
+        Fraction of each cell of the lats x lons window covered by the query selections.
+        The cell size is taken from the full coordinate axes so single row/column windows still work.
+        """
+        cell = transform_for_coords(all_lats, all_lons)
+        if len(lats) == 0 or len(lons) == 0:
+            return np.zeros((len(lats), len(lons)), dtype=np.float32)
+
+        transform = [cell[0], 0.0, float(lons[0]) - cell[0] / 2,
+                     0.0, cell[4], float(lats[0]) - cell[4] / 2]
+        return coverage_fractions(self.query.selections, transform, (len(lats), len(lons)))
+
     def fishnet_results_as_GeoDataFrame(self, data):
         return gp.GeoDataFrame(data, columns=['moisture_content', 'weight', 'geometry'])
@@ -13,7 +13,6 @@ import json
 import geojson
 # import glob
 # import time
-import cv2
 from numpy import asarray
 from scipy.spatial import ConvexHull
 # import cartopy.feature as cfeature
@@ -31,14 +30,11 @@ import pyproj
 # import rasterio
 # import rasterio.mask
 # from rasterio import features
-from rasterio.features import rasterize
-import logging
+from serve.lfmc.util.coverage import coverage_fractions, transform_for_coords
+from serve.lfmc.util import logs
 
 
-logging.basicConfig()
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-logger.debug("logger set to DEBUG")
+logger = logs.get_logger(__name__)
 
 
 class ShapeQuery(SpatialQuery, TemporalQuery):
@@ -92,7 +88,7 @@ class ShapeQuery(SpatialQuery, TemporalQuery):
 
             logger.debug("Found a Feature.")
             if p["geometry"]["type"] == "Polygon" or p["geometry"]["type"] == "MultiPolygon":
-                logger.debug("Found Polygon/MultiPolygon #%s" % count)
+                logger.debug("Found Polygon/MultiPolygon #%s", count)
                 s = shape(p["geometry"])
                 selections.append(s)
                 numbers.append(count)
@@ -100,20 +96,20 @@ class ShapeQuery(SpatialQuery, TemporalQuery):
                 abbrevs.append("SEL_%s" % count)
                 count += 1
 
-        logger.debug("Making Region Mask with %s Polygons." % count)
-        logger.debug("numbers: %s" % numbers)
-        logger.debug("names: %s" % names)
-        logger.debug("abbrevs: %s" % abbrevs)
-        logger.debug("selections: %s" % selections)
+        logger.debug("Making Region Mask with %s Polygons.", count)
+        logger.debug("numbers: %s", numbers)
+        logger.debug("names: %s", names)
+        logger.debug("abbrevs: %s", abbrevs)
+        logger.debug("selections: %s", selections)
 
         self.rmask = regionmask.Regions_cls(
             0, numbers, names, abbrevs, selections)
 
         self.selections = selections
-        logger.debug(["%s" % sel for sel in selections])
+        logger.debug('Selections: %s', logs.brief(selections))
 
         # Do once and store
-        # self.mask = self.get_super_sampled_mask()  # TODO - remove default creation of mask and require setting the transform according to dataset projection
+        # self.mask = self.get_coverage_mask()  # TODO - remove default creation of mask and require setting the transform according to dataset projection
 
         # hull = ShapeQuery.get_query_hull(self.rmask)
         # lat1, lon2, lat2, lon1 = hull.bounds
@@ -125,6 +121,11 @@ class ShapeQuery(SpatialQuery, TemporalQuery):
         self.transform = [0.05, 0.0, 111.975, 0.0, -0.05, -9.974999999999994]
         self.schema = ShapeQuerySchema()
 
+        # Optional ResultStream receiving partial results while the query runs
+        self.stream = None
+        # Optional ProgressReporter for the task running the query
+        self.progress = None
+
     def explode(self, coords):
         """Explode a GeoJSON geometry's coordinates object and yield coordinate tuples.
         As long as the input is conforming, the type of the geometry doesn't matter."""
@@ -141,7 +142,7 @@ class ShapeQuery(SpatialQuery, TemporalQuery):
         return min(x), min(y), max(x), max(y)
 
     def apply_transform(self, transform, out_shape):
-        self.mask = self.get_super_sampled_mask(transform, out_shape)
+        self.mask = self.get_coverage_mask(transform, out_shape)
 
     def get_selections(self):
         return self.selections
@@ -159,6 +160,16 @@ class ShapeQuery(SpatialQuery, TemporalQuery):
         self.temporal.logResponse()
         self.spatial.logResponse()
 
+    def report(self, done, total, stage):
+        """ Reports (done, total) for the current stage to the attached reporter, if any. """
+        if self.progress is not None:
+            self.progress.report(done, total, stage)
+
+    def publish(self, timeseries, done, total):
+        """ Hands a batch of partial results (a TimeSeries) to the attached stream, if any. """
+        if self.stream is not None:
+            self.stream.publish(timeseries, done, total)
+
     @staticmethod
     def get_bbox(poly: shapely.geometry.Polygon):
         return list((poly.bounds[0], poly.bounds[2], poly.bounds[1], poly.bounds[3]))
@@ -171,7 +182,7 @@ class ShapeQuery(SpatialQuery, TemporalQuery):
             return shapely.geometry.Polygon([hull.points[vertex] for vertex in hull.vertices])
         else:
             logger.debug('HullError: Mask coords contain Nans.')
-            logger.debug('Points were: \n%s\n' % (list(points)))
+            logger.debug('Points were: \n%s\n', list(points))
             raise ValueError(
                 'Cannot make a hull around points that contain NaNs')
             return None
@@ -199,29 +210,18 @@ class ShapeQuery(SpatialQuery, TemporalQuery):
     def as_buffered(self, poly, kilometers):
         return self.transform_to_latlong(self.get_buffered_coords(poly, kilometers))
 
-    def get_super_sampled_mask(self, transform=None,
-                               data_shape=(691, 886)):
+    def get_coverage_mask(self, transform=None,
+                          data_shape=(691, 886)):
+        """
+        Fraction of each cell of the grid described by transform and data_shape covered by the selections.
+        :param transform: affine grid transform, defaults to self.transform (which is left untouched)
+        :param data_shape: (rows, cols) of the grid
+        :return: float32 array of shape data_shape with values in [0, 1]
+        """
+        if transform is None:
+            transform = self.transform
 
-        if transform is not None:
-            scaled_transform = transform
-        else:
-            scaled_transform = self.transform
-
-        scaled_transform[0] /= 10
-        scaled_transform[4] /= 10
-        mask_shape = (10 * data_shape[0], 10 * data_shape[1])
-        rparams = dict(
-            transform=scaled_transform,
-            out_shape=mask_shape
-        )
-        # selection rasterization using rasterio!
-        raster = rasterize(self.selections, **rparams)
-        out_shape = (data_shape[1], data_shape[0])
-        # Use OpenCV to interpolate back to the correct dimensions
-        # This effectively 'super-samples' the mask
-        resized = cv2.resize(raster.astype(np.float32), out_shape,
-                             interpolation=cv2.INTER_AREA)
-        return resized
+        return coverage_fractions(self.selections, transform, data_shape)
 
     def apply_mask_to(self, result_cube: xr.DataArray) -> (xr.DataArray, xr.DataArray):
         rc = result_cube[result_cube.attrs['var_name']].isel(time=0)
@@ -236,7 +236,8 @@ class ShapeQuery(SpatialQuery, TemporalQuery):
         au_scaled_mask = AUmask.mask(rc['longitude'], rc['latitude'])
         au_masked = np.ma.masked_invalid(au_scaled_mask)
         result_cube = result_cube.where(au_masked == 0)
-        mask = self.get_super_sampled_mask(transform=None, data_shape=s)
+        transform = transform_for_coords(rc['latitude'].values, rc['longitude'].values)
+        mask = self.get_coverage_mask(transform=transform, data_shape=s)
         result_cube['mask'] = xr.DataArray(mask, coords=[result_cube['latitude'].data, result_cube['longitude'].data],
                                            dims=['latitude', 'longitude'])
         return result_cube, result_cube['mask']
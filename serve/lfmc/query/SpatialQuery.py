@@ -57,6 +57,37 @@ class SpatialQuery(Query):
         lon2 = SpatialQuery.round_up(np.float64(self.lon2), tolerance)
         return lat1, lon1, lat2, lon2
 
+    def window(self, ds, tolerance):
+        """
+        Restricts a dataset to the expanded bounding box using positional indexing on its coordinate axes.
+        On a lazily opened file only the selected hyperslab is read when the data is finally loaded.
+        Handles ascending and descending latitudes and both lat/lon and latitude/longitude naming.
+        """
+        lat_name, lon_name = SpatialQuery.coordinate_names(ds)
+        lat1, lon1, lat2, lon2 = self.expanded(tolerance)
+        return ds.isel({lat_name: SpatialQuery.index_window(ds[lat_name].values, lat1, lat2),
+                        lon_name: SpatialQuery.index_window(ds[lon_name].values, lon1, lon2)})
+
+    @staticmethod
+    def coordinate_names(ds):
+        if 'latitude' in ds.coords:
+            return 'latitude', 'longitude'
+        elif 'lat' in ds.coords:
+            return 'lat', 'lon'
+        raise ValueError("Can't determine coordinate naming conventions.")
+
+    @staticmethod
+    def index_window(values, low, high):
+        """ Slice of the positions in a monotonic coordinate array that fall within [low, high]. """
+        if len(values) < 2 or values[0] <= values[-1]:
+            start = np.searchsorted(values, low, side='left')
+            stop = np.searchsorted(values, high, side='right')
+        else:
+            descending = values[::-1]
+            start = len(values) - np.searchsorted(descending, high, side='right')
+            stop = len(values) - np.searchsorted(descending, low, side='left')
+        return slice(int(start), int(stop))
+
     @staticmethod
     def round_nearest(x, a):
         return round(round(x / a) * a, -int(math.floor(math.log10(a))))
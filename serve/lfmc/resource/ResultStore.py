@@ -0,0 +1,223 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+from swiftclient import exceptions
+
+import serve.lfmc.config.caching as caching
+from serve.lfmc.resource.Storable import Storable
+from serve.lfmc.resource.SwiftStorage import SwiftStorage
+
+from serve.lfmc.util import logs
+logger = logs.get_logger(__name__)
+
+# Marks a task result that was moved out of the result backend
+STORED = 'stored'
+
+
+class ResultStore(Storable, ABC):
+    """
+    Content-addressed store for task results too large to keep in the Redis result backend.
+    Results are gzipped JSON; the backend keeps only a small pointer (see stash/fetch).
+    """
+
+    # Seconds between two opportunistic evictions in the same process
+    evict_interval = 10 * 60
+    last_evicted = 0
+
+    @abstractmethod
+    def get_object(self, key):
+        """ :return: the stored bytes; raises FileNotFoundError or KeyError when there are none """
+
+    @abstractmethod
+    def delete_object(self, key):
+        """ Removes a stored result; absent keys are ignored. """
+
+    def evict(self):
+        """ Applies the retention and size limits. Stores that expire objects themselves do nothing. """
+        return 0
+
+    @staticmethod
+    def configured(name=None):
+        if (name or caching.RESULT_STORE) == 'swift':
+            return SwiftResultStore()
+        return LocalResultStore()
+
+    @staticmethod
+    def stash(content, store=None):
+        """
+        :param content: JSON-serialisable task result
+        :return: content itself when small enough to stay inline, otherwise a pointer to the stored copy
+        """
+        encoded = json.dumps(content).encode('utf-8')
+        if len(encoded) <= caching.RESULT_INLINE_LIMIT:
+            return content
+
+        store = store or ResultStore.configured()
+        # Keyed by content: gzip's header would stamp otherwise identical results with the time
+        compressed = gzip.compress(encoded, mtime=0)
+        key = hashlib.sha256(encoded).hexdigest() + '.json.gz'
+        # Storing an existing key again refreshes its retention
+        store.store_object((key, compressed))
+        logger.debug('Stored %s byte result as %s (%s bytes).', len(encoded), key, len(compressed))
+
+        if time.time() - ResultStore.last_evicted > ResultStore.evict_interval:
+            ResultStore.last_evicted = time.time()
+            store.evict()
+
+        return {'layout': STORED,
+                'store': store.name,
+                'key': key,
+                'bytes': len(encoded),
+                'compressed': len(compressed),
+                'created': time.time()}
+
+    @staticmethod
+    def fetch(content, store=None):
+        """
+        :param content: a task result as returned by stash
+        :return: the original result; None if it was stored but has since been evicted
+        """
+        if not isinstance(content, dict) or content.get('layout') != STORED:
+            return content
+        store = store or ResultStore.configured(content.get('store'))
+        try:
+            return json.loads(gzip.decompress(store.get_object(content['key'])).decode('utf-8'))
+        except (FileNotFoundError, KeyError):
+            logger.warning('Stored result %s is no longer available.', content['key'])
+            return None
+
+
+class LocalResultStore(ResultStore):
+    """ Results on a local (or shared) filesystem, fanned out by key prefix. Also the stand-in for tests. """
+
+    name = 'local'
+
+    def __init__(self, root=None):
+        self.root = Path(root or caching.RESULT_STORE_DIR)
+
+    def path_for(self, key):
+        return self.root.joinpath(key[:2], key)
+
+    def object_exists(self, key):
+        return self.path_for(key).is_file()
+
+    def store_object(self, obj):
+        key, data = obj
+        path = self.path_for(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # A temporary file of its own, so concurrent writers of the same key never interleave
+        fd, partial = tempfile.mkstemp(dir=str(path.parent), suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(partial, str(path))
+        except BaseException:
+            os.unlink(partial)
+            raise
+        return True
+
+    def get_object(self, key):
+        path = self.path_for(key)
+        data = path.read_bytes()
+        # Reading refreshes the modification time so eviction is least-recently-used
+        os.utime(path)
+        return data
+
+    def delete_object(self, key):
+        try:
+            self.path_for(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def list_objects(self, path=None):
+        return [p for p in self.root.glob('*/*.json.gz')]
+
+    def path_exists(self, path):
+        return self.root.joinpath(path).exists()
+
+    def file_exists(self, path):
+        return self.root.joinpath(path).is_file()
+
+    def evict(self):
+        """
+        Removes results older than the retention period, then the least recently used
+        until the store is within its size limit.
+        :return: number of results removed
+        """
+        entries = []
+        for p in self.list_objects():
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        entries.sort()
+
+        cutoff = time.time() - caching.RESULT_RETENTION
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, p in entries:
+            if mtime >= cutoff and total <= caching.RESULT_STORE_MAX_BYTES:
+                break
+            try:
+                p.unlink()
+                removed += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+
+        if removed > 0:
+            logger.debug('Evicted %s stored results.', removed)
+        return removed
+
+
+class SwiftResultStore(ResultStore):
+    """ Results in an object storage container; Swift itself deletes them after the retention period. """
+
+    name = 'swift'
+
+    def __init__(self, container=None):
+        self.swift = SwiftStorage().swift
+        self.container = container or caching.RESULT_STORE_CONTAINER
+
+    def object_exists(self, key):
+        try:
+            self.swift.head_object(self.container, key)
+            return True
+        except exceptions.ClientException:
+            return False
+
+    def store_object(self, obj):
+        key, data = obj
+        self.swift.put_object(self.container, key, contents=data, content_type='application/gzip',
+                              headers={'X-Delete-After': str(int(caching.RESULT_RETENTION))})
+        return True
+
+    def get_object(self, key):
+        try:
+            resp_headers, data = self.swift.get_object(self.container, key)
+        except exceptions.ClientException as e:
+            raise KeyError(key) from e
+        return data
+
+    def delete_object(self, key):
+        try:
+            self.swift.delete_object(self.container, key)
+        except exceptions.ClientException:
+            pass
+
+    def list_objects(self, path=None):
+        resp_headers, objects = self.swift.get_container(self.container, full_listing=True)
+        return [o['name'] for o in objects]
+
+    def path_exists(self, path):
+        return self.object_exists(path)
+
+    def file_exists(self, path):
+        return self.object_exists(path)
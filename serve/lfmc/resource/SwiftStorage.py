@@ -1,5 +1,9 @@
 from swiftclient import client, exceptions
 
+from serve.lfmc.util import logs
+
+logger = logs.get_logger(__name__)
+
 
 class SwiftStorage:
 
@@ -25,14 +29,13 @@ class SwiftStorage:
         success = False
         try:
             resp_headers = self.swift.head_object('MODIS', object_name)
-            logger.debug("%s exists." % object_name)
+            logger.debug("%s exists.", object_name)
             success = True
         except exceptions.ClientException as e:
             if e.http_status == '404':
-                logger.debug("The object: %s was not found." % object_name)
+                logger.debug("The object: %s was not found.", object_name)
             else:
-                logger.debug(
-                    "An error occurred checking the existence of object: %s" % object_name)
+                logger.debug("An error occurred checking the existence of object: %s", object_name)
         return success
 
     def swift_get_modis(self, object_name):
@@ -52,19 +55,18 @@ class SwiftStorage:
     def swift_check_lfmc(self, file_name):
         success = False
         try:
-            logger.debug('Checking SwiftStorage for: %s' % file_name)
+            logger.debug('Checking SwiftStorage for: %s', file_name)
             resp_headers = self.swift.head_object('lfmc', str(file_name))
 
-            logger.debug("%s exists." % file_name)
+            logger.debug("%s exists.", file_name)
             success = True
         except TypeError as te:
-            logger.debug('Problem parsing file name?? ', file_name)
+            logger.debug('Problem parsing file name?? %s', file_name)
         except exceptions.ClientException as e:
             if e.http_status == '404':
-                logger.debug("The object: %s was not found." % file_name)
+                logger.debug("The object: %s was not found.", file_name)
             else:
-                logger.debug(
-                    "An error occurred checking the existence of object: %s" % file_name)
+                logger.debug("An error occurred checking the existence of object: %s", file_name)
         return success
 
     def swift_get_lfmc(self, object_name):
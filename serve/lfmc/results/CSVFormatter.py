@@ -1,6 +1,10 @@
 import pandas as pd
 import xarray as xr
 
+from serve.lfmc.util import logs
+
+logger = logs.get_logger(__name__)
+
 
 class CSVFormatter:
 
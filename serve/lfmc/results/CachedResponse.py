@@ -0,0 +1,96 @@
+import hashlib
+import json
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+
+import hug
+
+import serve.lfmc.config.caching as caching
+
+from serve.lfmc.util import logs
+logger = logs.get_logger(__name__)
+
+
+class CachedResponse:
+    """
+    A JSON response body serialised once and then served as bytes, with a strong ETag and Last-Modified
+    so clients that already hold it get a bodiless 304 Not Modified.
+    """
+
+    _cache = {}
+    _lock = threading.Lock()
+
+    # When the cached content last changed; set to the deploy time by the server
+    modified = time.time()
+
+    def __init__(self, content, max_age=None, modified=None):
+        """
+        :param content: JSON-serialisable body
+        :param max_age: seconds browsers and proxies may reuse the response without revalidating; None to always revalidate
+        :param modified: when the content last changed (epoch seconds); the deploy time when None
+        """
+        self.body = json.dumps(content).encode('utf-8')
+        self.etag = '"%s"' % hashlib.sha1(self.body).hexdigest()
+        self.max_age = max_age
+        self.modified = CachedResponse.modified if modified is None else modified
+        self.last_modified = formatdate(self.modified, usegmt=True)
+
+    @staticmethod
+    def precompute(contents, max_age=caching.METADATA_MAX_AGE):
+        """
+        Serialises every response up front, eg., at startup.
+        :param contents: dict of cache key to JSON-serialisable content
+        """
+        with CachedResponse._lock:
+            for key, content in contents.items():
+                CachedResponse._cache[key] = CachedResponse(content, max_age)
+        logger.debug('Precomputed %s responses.', len(contents))
+
+    @staticmethod
+    def lookup(key):
+        return CachedResponse._cache.get(key)
+
+    @staticmethod
+    def get(key, build, max_age=None):
+        """
+        :param key: cache key, eg., the endpoint and its arguments
+        :param build: called (once per process) to produce the content when key is not cached yet
+        """
+        cached = CachedResponse._cache.get(key)
+        if cached is None:
+            with CachedResponse._lock:
+                cached = CachedResponse._cache.get(key)
+                if cached is None:
+                    logger.debug('Caching response for %s', key)
+                    cached = CachedResponse(build(), max_age)
+                    CachedResponse._cache[key] = cached
+        return cached
+
+    def not_modified(self, request):
+        if request is None:
+            return False
+        if_none_match = request.get_header('If-None-Match')
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            return '*' in tags or self.etag in tags
+        if_modified_since = request.get_header('If-Modified-Since')
+        if if_modified_since is not None:
+            try:
+                return parsedate_to_datetime(if_modified_since).timestamp() >= int(self.modified)
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def send(self, request, response):
+        """ Sets the caching headers and returns the body, or nothing if the client's copy is current. """
+        response.set_header('ETag', self.etag)
+        response.set_header('Last-Modified', self.last_modified)
+        if self.max_age is not None:
+            response.set_header('Cache-Control', 'public, max-age=%d' % self.max_age)
+        else:
+            response.set_header('Cache-Control', 'no-cache')
+        if self.not_modified(request):
+            response.status = hug.HTTP_304
+            return b''
+        return self.body
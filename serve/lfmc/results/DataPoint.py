@@ -2,14 +2,14 @@
 import json
 from marshmallow import Schema, fields
 import datetime as dt
-import logging
-logging.basicConfig()
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-logger.debug("logger set to DEBUG")
+from serve.lfmc.util import logs
+logger = logs.get_logger(__name__)
 
 
 class DataPoint:
+    # Fixed attributes; no per-instance __dict__
+    __slots__ = ['name', 'value', 'weighted_mean', 'mean', 'min', 'max', 'std', 'count', 'median']
+
     def __init__(self, observation_time: fields.String(), value: float, weighted_mean: float, mean: float,
                  minimum: float, maximum: float, deviation: float, median: float, count: float):
         """Short summary.
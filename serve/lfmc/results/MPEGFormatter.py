@@ -1,16 +1,15 @@
-import logging
+from serve.lfmc.util import logs
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 import pandas as pd
 from uuid import uuid4
 import asyncio
 
+from serve.lfmc.util import metrics
+
 plt.switch_backend('agg')
 
-logging.basicConfig()
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-logger.debug("logger set to DEBUG")
+logger = logs.get_logger(__name__)
 
 
 class MPEGFormatter:
@@ -45,11 +44,12 @@ class MPEGFormatter:
             frame = plt.imshow(im, cmap='viridis_r', animated=True)
             # Push onto array of frames
             frames.append([frame])
-            logger.debug("\n--> Generated frame %s of %s" % (t + 1, ts))
+            logger.debug("\n--> Generated frame %s of %s", t + 1, ts)
 
         vid = animation.ArtistAnimation(
             fig, frames, interval=50, blit=True, repeat_delay=1000)
-        vid.save(video_filepath, writer='ffmpeg', codec='mpeg4')
+        with metrics.timer('encode'):
+            vid.save(video_filepath, writer='ffmpeg', codec='mpeg4')
         logger.debug("\n--> Successfully wrote temp MP4 file.")
 
         return video_filepath
@@ -1,9 +1,15 @@
 import json
 from marshmallow import Schema, fields
 from serve.lfmc.results.DataPoint import DataPoint, DataPointSchema
+from serve.lfmc.results.TimeSeries import TimeSeries
+
+# Marks a result encoded by ModelResult.to_columns()
+COLUMNAR = 'columnar'
 
 
 class ModelResult:
+    __slots__ = ['timeseries', 'name']
+
     def __init__(self, model_name: fields.String(), data_points: [DataPoint]):
         """Short summary.
 
@@ -11,17 +17,36 @@ class ModelResult:
         ----------
         model_name : type
                         Description of parameter `model_name`.
-        data_points : type
-                        Description of parameter `data_points`.
-        Returns
-        -------
-        type
-                        Description of returned object.
+        data_points : TimeSeries or list of DataPoint
+                        The statistics over time, held in columns either way.
         """
-        # An Array (1D) of DataPoints
-        self.series = data_points
+        if not isinstance(data_points, TimeSeries):
+            data_points = TimeSeries.from_datapoints(data_points)
+        self.timeseries = data_points
         self.name = model_name
 
+    @property
+    def series(self):
+        """ Compatibility view: one dict per point, in the DataPointSchema layout. """
+        return self.timeseries.series()
+
+    def to_columns(self):
+        """
+        Columnar encoding of the result, made of builtin lists only so it goes straight through
+        the json or msgpack serialiser of the Celery result backend.
+        """
+        return {'name': self.name, 'layout': COLUMNAR, 'columns': self.timeseries.to_columns()}
+
+    @staticmethod
+    def as_series(content):
+        """
+        Expands a to_columns() dict into the {'name', 'series'} layout existing clients read.
+        Anything else (eg., an error) is returned unchanged.
+        """
+        if not isinstance(content, dict) or content.get('layout') != COLUMNAR:
+            return content
+        return {'name': content['name'], 'series': TimeSeries.to_records(content['columns'])}
+
     def __str__(self):
         schema = ModelResultSchema()
         return schema.dumps(self)
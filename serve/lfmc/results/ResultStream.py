@@ -0,0 +1,114 @@
+import json
+
+import redis
+from marshmallow import Schema, fields
+
+import serve.lfmc.config.caching as caching
+
+from serve.lfmc.util import logs
+logger = logs.get_logger(__name__)
+
+
+class ResultStream:
+    """
+    Partial time-series results of a running task, published to Redis batch by batch
+    so clients can draw the series-so-far before the task completes.
+    """
+
+    # Time slices gathered before a batch is published
+    batch_size = 30
+    # Seconds the partial results are kept after the last batch
+    expiry = 24 * 60 * 60
+
+    def __init__(self, uuid, model_name='', url=None):
+        self.uuid = uuid
+        self.redis = ResultStream.connect(url)
+        self.redis.hmset(ResultStream.meta_key(uuid), {
+            'name': model_name, 'done': 0, 'total': 0, 'complete': 0})
+        self.redis.expire(ResultStream.meta_key(uuid), ResultStream.expiry)
+
+    @staticmethod
+    def connect(url=None):
+        return redis.StrictRedis.from_url(url or caching.REDIS_URL)
+
+    @staticmethod
+    def series_key(uuid):
+        return 'lfmc:stream:%s:series' % uuid
+
+    @staticmethod
+    def meta_key(uuid):
+        return 'lfmc:stream:%s:meta' % uuid
+
+    def publish(self, timeseries, done, total):
+        series = timeseries.series()
+        pipe = self.redis.pipeline()
+        if len(series) > 0:
+            pipe.rpush(ResultStream.series_key(self.uuid), *[json.dumps(dp) for dp in series])
+            pipe.expire(ResultStream.series_key(self.uuid), ResultStream.expiry)
+        pipe.hmset(ResultStream.meta_key(self.uuid), {'done': done, 'total': total})
+        pipe.expire(ResultStream.meta_key(self.uuid), ResultStream.expiry)
+        pipe.execute()
+        logger.debug('Published %s data points (%s of %s) for %s.', len(series), done, total, self.uuid)
+
+    def finish(self):
+        self.redis.hset(ResultStream.meta_key(self.uuid), 'complete', 1)
+
+    @staticmethod
+    def read(uuid, offset=0, url=None):
+        """
+        The series published so far, starting at offset.
+        :return: PartialResult, or None if nothing was ever published for uuid
+        """
+        r = ResultStream.connect(url)
+        meta = {k.decode(): v.decode() for k, v in r.hgetall(ResultStream.meta_key(uuid)).items()}
+        if len(meta) == 0:
+            return None
+        series = [json.loads(dp.decode()) for dp in r.lrange(ResultStream.series_key(uuid), offset, -1)]
+        return PartialResult(uuid=uuid,
+                             name=meta.get('name', ''),
+                             series=series,
+                             offset=offset + len(series),
+                             done=int(meta.get('done', 0)),
+                             total=int(meta.get('total', 0)),
+                             complete=meta.get('complete') == '1')
+
+
+class EventStream:
+    """
+    File-like view of a generator of encoded events, so the API streams it as the response body
+    (hug only streams content that has a read() method).
+    """
+
+    def __init__(self, events):
+        self.events = events
+
+    def read(self, size=-1):
+        """ The next event; b'' once the generator is exhausted. size is ignored, events are never split. """
+        return next(self.events, b'')
+
+    def close(self):
+        self.events.close()
+
+
+class PartialResult:
+    def __init__(self, uuid, name, series, offset, done, total, complete):
+        self.id = uuid
+        self.name = name
+        self.series = series
+        self.offset = offset
+        self.complete = complete
+        if complete:
+            self.fraction = 1.0
+        elif total > 0:
+            self.fraction = done / total
+        else:
+            self.fraction = 0.0
+
+
+class PartialResultSchema(Schema):
+    id = fields.String()
+    name = fields.String()
+    series = fields.Raw()
+    offset = fields.Integer()
+    fraction = fields.Float()
+    complete = fields.Boolean()
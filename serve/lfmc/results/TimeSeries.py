@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+from serve.lfmc.util import logs
+logger = logs.get_logger(__name__)
+
+# Statistic columns in the order of GeoQuery.slice_stats tuples (after the time)
+STATS = ['weighted_mean', 'mean', 'min', 'max', 'std', 'median', 'count']
+
+# Keys of one point in the 'series' layout, as DataPointSchema emits them
+FIELDS = ['name', 'value', 'mean', 'weighted_mean', 'min', 'max', 'std', 'count', 'median']
+
+# One row of TimeSeries.values viewed as a record
+RECORD = np.dtype([(k, np.float64) for k in STATS])
+
+
+class TimeSeries:
+    """
+    Columnar time-series of shape statistics: an array of observation times and a single (time x statistic)
+    float64 block. Replaces a list of DataPoint objects, each a dict of NumPy scalars.
+    The block doubles as a structured array (see RECORD) and backs pandas frames without copying.
+    """
+
+    __slots__ = ['times', 'values']
+
+    def __init__(self, times, values):
+        """
+        :param times: observation times (anything numpy converts to datetime64)
+        :param values: (len(times) x len(STATS)) array-like, columns in STATS order
+        """
+        self.times = np.asarray(times, dtype='datetime64[ns]')
+        self.values = np.ascontiguousarray(values, dtype=np.float64).reshape(len(self.times), len(STATS))
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def columns(self):
+        """ Views (not copies) of each statistic column. """
+        return {k: self.values[:, i] for i, k in enumerate(STATS)}
+
+    @property
+    def structured(self):
+        """ The values as a structured array with one named field per statistic, sharing memory. """
+        return self.values.view(RECORD).reshape(len(self))
+
+    @staticmethod
+    def empty():
+        return TimeSeries([], np.empty((0, len(STATS))))
+
+    @staticmethod
+    def from_stats(stats):
+        """
+        :param stats: list of (time, weighted_mean, mean, min, max, std, median, count) tuples from GeoQuery.slice_stats
+        """
+        if len(stats) == 0:
+            return TimeSeries.empty()
+        return TimeSeries([s[0] for s in stats], [s[1:] for s in stats])
+
+    @staticmethod
+    def from_datapoints(data_points):
+        """ Columns from a list of DataPoints, for models that still build them one by one. """
+        if len(data_points) == 0:
+            return TimeSeries.empty()
+        times = [np.datetime64(dp.name.replace('Z', '')) for dp in data_points]
+        return TimeSeries(times, [[np.nan if getattr(dp, k) is None else getattr(dp, k) for k in STATS]
+                                  for dp in data_points])
+
+    def to_frame(self):
+        """ pandas DataFrame indexed by time over the same memory as the values block. """
+        return pd.DataFrame(self.values, index=pd.DatetimeIndex(self.times, name='time'), columns=STATS, copy=False)
+
+    def names(self):
+        """ Observation times formatted the way the D3 & ngx-charts clients expect. """
+        return [s + '.000Z' for s in np.datetime_as_string(self.times, unit='s').tolist()]
+
+    def to_columns(self):
+        """
+        Plain lists of builtin values, ready for a json/msgpack encoder without any per-point work.
+        :return: dict with 'name' plus one list per statistic
+        """
+        columns = {'name': self.names()}
+        columns.update(zip(STATS, self.values.T.tolist()))
+        return columns
+
+    @staticmethod
+    def to_records(columns):
+        """
+        Compatibility view: expands a to_columns() dict into today's 'series' layout, one dict per point.
+        'value' repeats the median, as it always has.
+        """
+        cols = [columns['name'], columns['median'], columns['mean'], columns['weighted_mean'], columns['min'],
+                columns['max'], columns['std'], columns['count'], columns['median']]
+        return [dict(zip(FIELDS, point)) for point in zip(*cols)]
+
+    def series(self):
+        return TimeSeries.to_records(self.to_columns())
@@ -1,12 +1,9 @@
 import subprocess
 import os
 from pathlib import Path
-import logging
+from serve.lfmc.util import logs
 
-logging.basicConfig()
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-logger.debug("logger set to DEBUG")
+logger = logs.get_logger(__name__)
 
 
 def expand_in_place(file_list, auto_remove=True):
@@ -19,7 +16,7 @@ def expand_in_place(file_list, auto_remove=True):
 
         target = archive_file.replace(".gz", "")
         if not Path(target).is_file():
-            logger.debug("\n--> Expanding: %s" % archive_file)
+            logger.debug("\n--> Expanding: %s", archive_file)
 
             try:
                 if str(archive_file).endswith('.gz'):
@@ -29,12 +26,10 @@ def expand_in_place(file_list, auto_remove=True):
                     logger.debug('Not a .gz file!')
 
             except FileNotFoundError as e:
-                logger.debug("\n--> Expanding: %s, failed.\n%s" %
-                             (archive_file, e))
+                logger.debug("\n--> Expanding: %s, failed.\n%s", archive_file, e)
                 return False
             except OSError as e:
-                logger.debug("\n--> Removing: %s, was not necessary.\n %s" %
-                             (archive_file, e))
+                logger.debug("\n--> Removing: %s, was not necessary.\n %s", archive_file, e)
             return True
         else:
             if auto_remove:
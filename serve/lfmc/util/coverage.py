@@ -0,0 +1,138 @@
+import math
+
+import numpy as np
+from shapely.geometry.polygon import orient
+from shapely.ops import unary_union
+
+from serve.lfmc.util import logs
+
+logger = logs.get_logger(__name__)
+
+
+def transform_for_coords(lats, lons):
+    """
+    Derives an affine grid transform [a, b, c, d, e, f] from cell-centred latitude and longitude coordinates.
+    Works for both ascending and descending latitudes.
+    :param lats: 1D array of cell-centre latitudes
+    :param lons: 1D array of cell-centre longitudes
+    :return: list in the same order as ShapeQuery.transform
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    if len(lats) < 2 or len(lons) < 2:
+        raise ValueError('At least two coordinates per axis are needed to derive a grid transform.')
+    dx = (lons[-1] - lons[0]) / (len(lons) - 1)
+    dy = (lats[-1] - lats[0]) / (len(lats) - 1)
+    return [float(dx), 0.0, float(lons[0] - dx / 2), 0.0, float(dy), float(lats[0] - dy / 2)]
+
+
+def coverage_fractions(geometries, transform, out_shape):
+    """
+    Exact fraction of each grid cell covered by the union of the geometries.
+
+    Polygon edges are converted to pixel space and accumulated row by row as signed area and cover
+    contributions, then a single cumulative sum along each scanline yields the covered area of every cell.
+    No super-sampled raster is created and the transform is never modified.
+
+    :param geometries: iterable of shapely (Multi)Polygons in the same CRS as the transform
+    :param transform: affine [a, b, c, d, e, f] as used by rasterio (north-up, no rotation)
+    :param out_shape: (rows, cols) of the target grid
+    :return: float32 array of shape out_shape with values in [0, 1]
+    """
+    a, b, c, d, e, f = transform[:6]
+    if b != 0 or d != 0:
+        raise ValueError('Rotated grid transforms are not supported.')
+    if a == 0 or e == 0:
+        raise ValueError('Grid transform has a zero cell size.')
+
+    rows, cols = int(out_shape[0]), int(out_shape[1])
+    # Two spare columns absorb contributions at and beyond the right-hand edge of the grid
+    acc = np.zeros((rows, cols + 2), dtype=np.float64)
+
+    geometry = unary_union(list(geometries))
+    polygons = getattr(geometry, 'geoms', [geometry])
+
+    for polygon in polygons:
+        if polygon.is_empty or polygon.geom_type != 'Polygon':
+            continue
+        polygon = orient(polygon, sign=1.0)
+        for ring in [polygon.exterior] + list(polygon.interiors):
+            xy = np.asarray(ring.coords, dtype=np.float64)
+            px = (xy[:, 0] - c) / a
+            py = (xy[:, 1] - f) / e
+            for i in range(len(xy) - 1):
+                for x0, y0, x1, y1 in _clip_columns(px[i], py[i], px[i + 1], py[i + 1], cols):
+                    _accumulate_edge(acc, x0, y0, x1, y1, rows)
+
+    coverage = np.abs(np.cumsum(acc, axis=1)[:, :cols])
+    return np.clip(coverage, 0, 1).astype(np.float32)
+
+
+def _clip_columns(x0, y0, x1, y1, cols):
+    """
+    Splits an edge where it crosses the left and right borders of the grid and clamps the outer pieces onto
+    those borders. Area left of the grid then carries into column 0, area right of it falls in the spare columns.
+    """
+    cuts = [0.0, 1.0]
+    if x0 != x1:
+        for border in (0.0, float(cols)):
+            t = (border - x0) / (x1 - x0)
+            if 0.0 < t < 1.0:
+                cuts.append(t)
+    cuts.sort()
+
+    pieces = []
+    for t0, t1 in zip(cuts[:-1], cuts[1:]):
+        xa = min(max(x0 + (x1 - x0) * t0, 0.0), float(cols))
+        xb = min(max(x0 + (x1 - x0) * t1, 0.0), float(cols))
+        pieces.append((xa, y0 + (y1 - y0) * t0, xb, y0 + (y1 - y0) * t1))
+    return pieces
+
+
+def _accumulate_edge(acc, x0, y0, x1, y1, rows):
+    """ Adds the signed area contribution of one edge to each scanline it crosses. """
+    if y0 == y1:
+        return
+
+    direction = 1.0
+    if y0 > y1:
+        direction = -1.0
+        x0, y0, x1, y1 = x1, y1, x0, y0
+
+    dxdy = (x1 - x0) / (y1 - y0)
+
+    for row in range(max(int(math.floor(y0)), 0), min(int(math.ceil(y1)), rows)):
+        top = max(float(row), y0)
+        bottom = min(float(row + 1), y1)
+        if bottom <= top:
+            continue
+        xt = x0 + (top - y0) * dxdy
+        xb = x0 + (bottom - y0) * dxdy
+        dy = (bottom - top) * direction
+
+        left, right = min(xt, xb), max(xt, xb)
+        li = int(math.floor(left))
+        ri = int(math.ceil(right))
+
+        if ri <= li + 1:
+            # Edge stays within one cell on this row
+            mid = 0.5 * (xt + xb) - li
+            acc[row, li] += dy * (1 - mid)
+            acc[row, li + 1] += dy * mid
+        else:
+            s = 1.0 / (right - left)
+            lf = left - li
+            a0 = 0.5 * s * (1 - lf) ** 2
+            rf = right - ri + 1
+            am = 0.5 * s * rf ** 2
+            acc[row, li] += dy * a0
+            if ri == li + 2:
+                acc[row, li + 1] += dy * (1 - a0 - am)
+            else:
+                a1 = s * (1.5 - lf)
+                acc[row, li + 1] += dy * (a1 - a0)
+                for xi in range(li + 2, ri - 1):
+                    acc[row, xi] += dy * s
+                a2 = a1 + (ri - li - 3) * s
+                acc[row, ri - 1] += dy * (1 - a2 - am)
+            acc[row, ri] += dy * am
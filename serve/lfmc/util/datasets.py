@@ -0,0 +1,68 @@
+import os
+import threading
+from collections import OrderedDict
+
+import xarray as xr
+
+import serve.lfmc.config.compute as compute
+
+from serve.lfmc.util import logs
+
+logger = logs.get_logger(__name__)
+
+# Open datasets of this worker process, least recently used first, keyed by (path, chunks)
+_pool = OrderedDict()
+_lock = threading.Lock()
+
+
+def open_dataset(path, chunks=None):
+    """
+    A dataset for path from the worker's pool of open archives, so consecutive queries skip the HDF5 open and
+    metadata parse. Entries are dropped when their file is rewritten (its mtime or size changes).
+
+    Callers get a shallow copy: closing or modifying it leaves the pooled dataset untouched. Datasets are opened
+    with dask (chunks=None means the file's own chunking), so nothing is read until a query computes.
+    """
+    if chunks is None:
+        chunks = {}
+    path = os.path.abspath(str(path))
+    st = os.stat(path)
+    key = (path, repr(sorted(chunks.items())) if isinstance(chunks, dict) else repr(chunks))
+    stamp = (st.st_mtime, st.st_size)
+
+    with _lock:
+        entry = _pool.get(key)
+        if entry is not None and entry[0] == stamp:
+            _pool.move_to_end(key)
+            return entry[1].copy(deep=False)
+        if entry is not None:
+            logger.debug('%s was rewritten; reopening.', path)
+            del _pool[key]
+            entry[1].close()
+
+        ds = xr.open_dataset(path, chunks=chunks)
+        _pool[key] = (stamp, ds)
+        while len(_pool) > compute.DATASET_POOL_SIZE:
+            evicted, (_, old) = _pool.popitem(last=False)
+            logger.debug('Closing %s', evicted[0])
+            old.close()
+        return ds.copy(deep=False)
+
+
+def open_mfdataset(paths, chunks=None, concat_dim='time'):
+    """
+    Pooled equivalent of xr.open_mfdataset for archives split along one dimension (eg., one file per year).
+    The datasets are dask-backed, so the concatenation stays lazy.
+    """
+    datasets = [open_dataset(p, chunks) for p in sorted(set(paths))]
+    if len(datasets) == 1:
+        return datasets[0]
+    return xr.concat(datasets, dim=concat_dim)
+
+
+def clear():
+    """ Closes every pooled dataset, eg., before the worker process exits. """
+    with _lock:
+        while len(_pool) > 0:
+            _, (_, ds) = _pool.popitem()
+            ds.close()
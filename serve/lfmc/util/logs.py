@@ -0,0 +1,85 @@
+import json
+import logging
+
+import serve.lfmc.config.debug as dev
+
+_configured = False
+
+
+class JsonFormatter(logging.Formatter):
+    """ One JSON object per record, for log shippers. """
+
+    def format(self, record):
+        entry = {'time': self.formatTime(record),
+                 'level': record.levelname,
+                 'logger': record.name,
+                 'message': record.getMessage()}
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+def configure():
+    """ Configures the root handler once, from the environment (see serve.lfmc.config.debug). """
+    global _configured
+    if _configured:
+        return
+    handler = logging.StreamHandler()
+    if dev.LOG_FORMAT == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(dev.LOG_LEVEL)
+    _configured = True
+
+
+def get_logger(name):
+    configure()
+    return logging.getLogger(name)
+
+
+class brief:
+    """
+    Lazy, size-capped description of an object for use as a logging argument, eg.,
+    logger.debug('Result cube: %s', brief(sr)). Nothing is formatted unless the record is emitted
+    and xarray/pandas/numpy contents are never materialised, only their shapes are described.
+    """
+
+    def __init__(self, obj, limit=None):
+        self.obj = obj
+        self.limit = dev.LOG_REPR_LIMIT if limit is None else limit
+
+    def __str__(self):
+        obj = self.obj
+        if hasattr(obj, 'data_vars') and hasattr(obj, 'sizes'):
+            text = '<%s %s vars=%s>' % (type(obj).__name__, dict(obj.sizes), list(obj.data_vars))
+        elif hasattr(obj, 'sizes') and hasattr(obj, 'dims'):
+            text = '<%s %r %s %s>' % (type(obj).__name__, obj.name, dict(obj.sizes), obj.dtype)
+        elif hasattr(obj, 'columns') and hasattr(obj, 'shape'):
+            text = '<%s %s columns=%s>' % (type(obj).__name__, obj.shape, list(obj.columns))
+        elif hasattr(obj, 'shape') and hasattr(obj, 'dtype'):
+            text = '<%s %s %s>' % (type(obj).__name__, obj.shape, obj.dtype)
+        elif isinstance(obj, (list, tuple, set)):
+            text = '<%s of %s: %s>' % (type(obj).__name__, len(obj), [str(o) for o in list(obj)[:10]])
+        else:
+            text = str(obj)
+        if len(text) > self.limit:
+            text = text[:self.limit] + '...'
+        return text
+
+
+class table:
+    """ Lazy tabulation of the first rows of a DataFrame for use as a logging argument. """
+
+    def __init__(self, df, rows=20):
+        self.df = df
+        self.rows = rows
+
+    def __str__(self):
+        from tabulate import tabulate
+        text = tabulate(self.df.head(self.rows), headers='keys')
+        if len(self.df) > self.rows:
+            text += '\n... %s more rows' % (len(self.df) - self.rows)
+        return text
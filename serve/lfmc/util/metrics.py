@@ -0,0 +1,107 @@
+import contextlib
+import glob
+import os
+import threading
+import time
+
+from prometheus_client import CollectorRegistry, Counter, Histogram, REGISTRY, start_http_server
+from prometheus_client import multiprocess
+
+from serve.lfmc.util import logs
+
+logger = logs.get_logger(__name__)
+
+
+def multiprocess_dir():
+    """ Where each process writes its metrics when several share one /metrics endpoint; None if they don't. """
+    return os.environ.get('PROMETHEUS_MULTIPROC_DIR', os.environ.get('prometheus_multiproc_dir'))
+
+
+if multiprocess_dir() is not None:
+    os.makedirs(multiprocess_dir(), exist_ok=True)
+
+# discover, open, slice, load, weights, aggregate, serialise, encode; cache is hit or miss for stages that
+# looked up consolidated archives or cached files, otherwise empty
+STAGE_SECONDS = Histogram('lfmc_stage_seconds',
+                          'Time spent in each stage of a query.',
+                          ['stage', 'model', 'format', 'cache'],
+                          buckets=(.01, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, float('inf')))
+
+STAGE_ERRORS = Counter('lfmc_stage_errors_total',
+                       'Stages of a query that raised an exception.',
+                       ['stage', 'model', 'format'])
+
+# Labels of the query running on this thread
+_context = threading.local()
+
+
+def current_labels():
+    return getattr(_context, 'model', ''), getattr(_context, 'format', '')
+
+
+@contextlib.contextmanager
+def labelled(model='', format=''):
+    """ Labels every stage timed on this thread with the model code and output format. """
+    previous = current_labels()
+    _context.model, _context.format = model, format
+    try:
+        yield
+    finally:
+        _context.model, _context.format = previous
+
+
+@contextlib.contextmanager
+def timer(stage):
+    """ Times the enclosed block as one observation of stage, labelled with its cache lookups' outcome. """
+    model, fmt = current_labels()
+    outer = getattr(_context, 'cache', None)
+    _context.cache = None
+    began = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.labels(stage, model, fmt).inc()
+        raise
+    finally:
+        STAGE_SECONDS.labels(stage, model, fmt, _context.cache or '').observe(time.perf_counter() - began)
+        _context.cache = outer
+
+
+def cache(hit):
+    """ Records a cache lookup of the stage being timed; a stage with any miss counts as a miss. """
+    if not hit:
+        _context.cache = 'miss'
+    elif getattr(_context, 'cache', None) is None:
+        _context.cache = 'hit'
+
+
+def registry():
+    """
+    The registry to expose. Where several processes serve one endpoint (gunicorn workers, or the children of
+    a pre-forking Celery worker) each writes to PROMETHEUS_MULTIPROC_DIR and this aggregates them.
+    """
+    if multiprocess_dir() is not None:
+        r = CollectorRegistry()
+        multiprocess.MultiProcessCollector(r)
+        return r
+    return REGISTRY
+
+
+def clear_stale():
+    """ Removes metrics files left by an earlier run, before any process of this one has started writing. """
+    if multiprocess_dir() is not None:
+        for f in glob.glob(os.path.join(multiprocess_dir(), '*.db')):
+            os.remove(f)
+
+
+def start_exporter(port=None):
+    """ Serves the metrics of this (worker) process over HTTP. """
+    if port is None:
+        port = int(os.environ.get('LFMC_WORKER_METRICS_PORT', '9102'))
+    start_http_server(port, registry=registry())
+    logger.debug('Serving worker metrics on port %s', port)
+
+
+def mark_process_dead(pid):
+    if multiprocess_dir() is not None:
+        multiprocess.mark_process_dead(pid)
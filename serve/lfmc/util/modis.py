@@ -0,0 +1,124 @@
+import functools
+import math
+
+import numpy as np
+
+# MODIS sinusoidal grid: sphere radius and tile edge (metres), 36 x 18 tiles
+RADIUS = 6371007.181
+TILE_SIZE = 1111950.5196666666
+X_MIN = -20015109.354
+Y_MAX = 10007554.677
+
+# 500 m cells along each tile edge (MOD09A1)
+PIXELS = 2400
+
+# The tiles of the MOD09A1 composite covering Australia
+AUSTRALIA = [(h, v) for h in range(27, 31) for v in range(9, 13)]
+
+
+def tile_extent(h, v):
+    """ (x min, x max, y min, y max) of a tile, in sinusoidal metres. """
+    x0 = X_MIN + h * TILE_SIZE
+    y1 = Y_MAX - v * TILE_SIZE
+    return x0, x0 + TILE_SIZE, y1 - TILE_SIZE, y1
+
+
+# Precomputed extents of the tiles we hold
+EXTENTS = {hv: tile_extent(*hv) for hv in AUSTRALIA}
+
+
+def tile_for_point(lat, lon):
+    """ (h, v) of the tile containing a lat/lon point. """
+    x = RADIUS * math.radians(lon) * math.cos(math.radians(lat))
+    y = RADIUS * math.radians(lat)
+    return int((x - X_MIN) // TILE_SIZE), int((Y_MAX - y) // TILE_SIZE)
+
+
+def intersects(extent, lat1, lon1, lat2, lon2):
+    """
+    Whether a tile overlaps a lat/lon box. Within the tile's latitude band a longitude lies in the tile when
+    x min <= R.lon.cos(lat) <= x max, which is linear in cos(lat): the box overlaps the tile if one value of
+    cos(lat) over the shared latitudes satisfies both of its edges.
+    """
+    x0, x1, y0, y1 = extent
+    lat_low = max(min(lat1, lat2), math.degrees(y0 / RADIUS))
+    lat_high = min(max(lat1, lat2), math.degrees(y1 / RADIUS))
+    if lat_low > lat_high:
+        return False
+
+    c_low = math.cos(math.radians(max(abs(lat_low), abs(lat_high))))
+    c_high = 1.0 if lat_low <= 0 <= lat_high else math.cos(math.radians(min(abs(lat_low), abs(lat_high))))
+
+    # The box's east edge must not lie west of the tile and its west edge not east of it
+    for k, m, at_least in ((RADIUS * math.radians(max(lon1, lon2)), x0, True),
+                           (RADIUS * math.radians(min(lon1, lon2)), x1, False)):
+        if k == 0:
+            if (at_least and m > 0) or (not at_least and m < 0):
+                return False
+        elif (k > 0) == at_least:
+            c_low = max(c_low, m / k)
+        else:
+            c_high = min(c_high, m / k)
+    return c_low <= c_high
+
+
+def tiles_for_bbox(lat1, lon1, lat2, lon2, tiles=None):
+    """ 'h29v12' style ids of the tiles (of those we hold, by default) overlapping a lat/lon box. """
+    extents = EXTENTS if tiles is None else {hv: tile_extent(*hv) for hv in tiles}
+    return sorted("h%sv%s" % hv for hv, extent in extents.items() if intersects(extent, lat1, lon1, lat2, lon2))
+
+
+def lattice_step(pixels=PIXELS):
+    """ Cell size (degrees) of the global lat/lon lattice tiles are reprojected onto: 18 x pixels rows span 180. """
+    return math.degrees(TILE_SIZE / pixels / RADIUS)
+
+
+def _lattice(h, v, pixels):
+    """ The cells of the global lattice within the lat/lon bounding box of a tile. """
+    x0, x1, y0, y1 = tile_extent(h, v)
+    step = lattice_step(pixels)
+    lats = 90.0 - (np.arange(v * pixels, (v + 1) * pixels) + 0.5) * step
+
+    c_low = math.cos(max(abs(y0), abs(y1)) / RADIUS)
+    c_high = 1.0 if y0 <= 0 <= y1 else math.cos(min(abs(y0), abs(y1)) / RADIUS)
+    edges = [math.degrees(x / (RADIUS * c)) for x in (x0, x1) for c in (c_low, c_high)]
+    first = max(int(math.floor((min(edges) + 180.0) / step)), 0)
+    last = min(int(math.ceil((max(edges) + 180.0) / step)), 36 * pixels)
+    lons = -180.0 + (np.arange(first, last) + 0.5) * step
+    return lats, lons
+
+
+def tile_grid(h, v, pixels=PIXELS):
+    """
+    Cell centres of the lat/lon grid a tile is reprojected onto: the cells of one global lattice, at the tiles'
+    resolution, cropped to the tile's footprint, so neighbouring tiles line up and merge onto a regular grid.
+    :return: lats (descending), lons (ascending)
+    """
+    lats, lons, _ = resample_index(h, v, pixels)
+    return lats, lons
+
+
+@functools.lru_cache(maxsize=16)
+def resample_index(h, v, pixels=PIXELS):
+    """
+    Nearest-neighbour resampling of a tile onto its lat/lon grid, computed once per tile and process.
+    :return: lats, lons and, for each lat/lon cell, the flat index of its sinusoidal cell (-1 outside the tile)
+    """
+    lats, lons = _lattice(h, v, pixels)
+    x0, x1, y0, y1 = tile_extent(h, v)
+    size = TILE_SIZE / pixels
+    lat = np.radians(lats)[:, np.newaxis]
+    lon = np.radians(lons)[np.newaxis, :]
+    col = np.floor((RADIUS * lon * np.cos(lat) - x0) / size).astype(np.int64)
+    row = np.broadcast_to(np.floor((y1 - RADIUS * lat) / size).astype(np.int64), col.shape)
+    inside = (col >= 0) & (col < pixels) & (row >= 0) & (row < pixels)
+
+    # Crop the rows and columns no cell of the tile falls in
+    rows, cols = np.flatnonzero(inside.any(axis=1)), np.flatnonzero(inside.any(axis=0))
+    crop = (slice(rows[0], rows[-1] + 1), slice(cols[0], cols[-1] + 1))
+    index = np.where(inside, row * pixels + col, -1)[crop].astype(np.int32)
+    index.setflags(write=False)
+    lats, lons = lats[crop[0]], lons[crop[1]]
+    lats.setflags(write=False)
+    lons.setflags(write=False)
+    return lats, lons, index
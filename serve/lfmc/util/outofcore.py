@@ -0,0 +1,76 @@
+import contextlib
+
+import dask
+import numpy as np
+from dask.utils import parse_bytes
+
+import serve.lfmc.config.compute as compute
+
+from serve.lfmc.util import logs
+
+logger = logs.get_logger(__name__)
+
+
+def memory_budget():
+    return parse_bytes(compute.MEMORY_BUDGET)
+
+
+def open_chunks():
+    """ Chunks to pass to xr.open_dataset / open_mfdataset, None keeps the file un-chunked when not out-of-core. """
+    if compute.OUT_OF_CORE:
+        return {'time': 1}
+    return None
+
+
+def bytes_per_timestep(obj):
+    """ Bytes held by one time step of a Dataset or DataArray. """
+    variables = obj.data_vars.values() if hasattr(obj, 'data_vars') else [obj]
+    total = 0
+    for v in variables:
+        if 'time' in v.dims:
+            total += v.dtype.itemsize * int(np.prod([n for d, n in v.sizes.items() if d != 'time']))
+    return max(total, 1)
+
+
+def time_chunk(obj, budget=None):
+    """
+    Number of time steps per chunk so that every worker of the scheduler can hold a chunk within the budget.
+    """
+    if budget is None:
+        budget = memory_budget()
+    workers = 1 if compute.SCHEDULER == 'synchronous' else max(compute.WORKERS, 1)
+    return max(1, int(budget // (workers * bytes_per_timestep(obj))))
+
+
+def chunked(obj, budget=None):
+    """ Rechunks along time to fit the memory budget. """
+    if 'time' not in obj.dims:
+        return obj
+    return obj.chunk({'time': time_chunk(obj, budget)})
+
+
+def time_blocks(obj, budget=None):
+    """
+    Yields the object as loaded blocks of consecutive time steps.
+    When not out-of-core the whole (already loaded) object is a single block.
+    """
+    if not compute.OUT_OF_CORE or 'time' not in obj.dims:
+        yield obj
+        return
+
+    step = time_chunk(obj, budget)
+    for i in range(0, obj.sizes['time'], step):
+        logger.debug('Loading time steps %s to %s of %s.', i, i + step, obj.sizes['time'])
+        yield obj.isel(time=slice(i, i + step)).load()
+
+
+@contextlib.contextmanager
+def scheduler():
+    """ Runs the enclosed dask computations on the configured scheduler. """
+    if '://' in compute.SCHEDULER:
+        from distributed import Client
+        with Client(compute.SCHEDULER):
+            yield
+    else:
+        with dask.config.set(scheduler=compute.SCHEDULER, num_workers=compute.WORKERS):
+            yield
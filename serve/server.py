@@ -1,18 +1,24 @@
 #!/usr/bin/env python3
 
 import io
-import logging
+import json
+from serve.lfmc.util import logs
 import os
 import sys
+import time
 import traceback
 from pathlib import Path
 
 import hug
 from celery import Celery
 from celery import group
+from celery.exceptions import TimeoutError
 from celery.result import AsyncResult
+from dateutil.parser import parse
 from marshmallow import fields
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
+import serve.lfmc.config.caching as caching
 import serve.lfmc.config.debug as dev
 from serve.facade import consolidate
 from serve.facade import do_conversion
@@ -20,35 +26,134 @@ from serve.facade import do_mp4
 from serve.facade import do_netcdf
 from serve.facade import do_query
 from serve.lfmc.models.Model import ModelSchema
+from serve.lfmc.models.Availability import AvailabilityIndex
 from serve.lfmc.models.ModelRegister import ModelRegister, ModelsRegisterSchema
+from serve.lfmc.process.Profiling import QueryProfile
+from serve.lfmc.resource.ResultStore import ResultStore
+from serve.lfmc.results.CachedResponse import CachedResponse
+from serve.lfmc.results.ModelResult import ModelResult, COLUMNAR
+from serve.lfmc.process.Progress import PROGRESS
+from serve.lfmc.results.ResultStream import ResultStream, PartialResultSchema, EventStream
+from serve.lfmc.util import metrics
 
-logging.basicConfig()
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-logger.debug("logger set to DEBUG")
+logger = logs.get_logger(__name__)
 
 api_ = hug.API(__name__)
 api_.http.add_middleware(hug.middleware.CORSMiddleware(api_, max_age=10))
 
 api = hug.get(on_invalid=hug.redirect.not_found)
 
+
+def status_or(handler):
+    """ Wraps a file output format so a task's status (a dict), sent while it isn't finished, goes out as JSON. """
+    def output(content, request=None, response=None, **kwargs):
+        if isinstance(content, dict):
+            response.content_type = hug.output_format.pretty_json.content_type
+            return hug.output_format.pretty_json(content)
+        return handler(content, request=request, response=response)
+
+    output.content_type = handler.content_type
+    output.__doc__ = handler.__doc__
+    return output
+
+
 suffix_output = hug.output_format.suffix({'.json': hug.output_format.pretty_json,
-                                          '.mp4': hug.output_format.mp4_video,
-                                          '.nc': hug.output_format.file})
+                                          '.mp4': status_or(hug.output_format.mp4_video),
+                                          '.nc': status_or(hug.output_format.file)})
 
 content_output = hug.output_format.on_content_type(
     {'application/x-netcdf4': hug.output_format.file})
 
+
+@hug.format.content_type(CONTENT_TYPE_LATEST)
+def prometheus_text(content, **kwargs):
+    return content
+
+
+@hug.format.content_type('application/json')
+def json_bytes(content, **kwargs):
+    """ Passes JSON that was already serialised (see CachedResponse) straight through. """
+    return content
+
+
+@hug.format.content_type('text/event-stream')
+def event_stream(content, **kwargs):
+    """ Passes an EventStream of Server-Sent Events straight through to be streamed. """
+    return content
+
 app = Celery('facade',
-             backend='redis://caching:6379/0',
-             broker='redis://caching:6379/0')
+             backend=caching.REDIS_URL,
+             broker=caching.REDIS_URL)
 app.Task.resultrepr_maxsize = 2000
+app.conf.update(result_serializer=caching.RESULT_SERIALIZER,
+                accept_content=['json', 'msgpack'],
+                result_expires=caching.RESULT_RETENTION)
 
 logger.debug(app)
 
 with open(Path(os.getcwd()).joinpath('VERSION'), 'r') as vers:
     API_VERSION = vers.read()
 
+# Model metadata only changes with a deploy: serialise it once, stamped with the release
+CachedResponse.modified = os.path.getmtime(Path(os.getcwd()).joinpath('VERSION'))
+CachedResponse.precompute(ModelRegister.shared().metadata())
+
+# Longest a request is held open waiting for a task to finish (seconds)
+WAIT_LIMIT = 60
+
+# Longest an event stream is held open (seconds); clients reconnect and resume from the Last-Event-ID
+STREAM_LIMIT = 10 * 60
+
+
+def wait_for(res, timeout):
+    """
+    Blocks for up to timeout seconds (at most WAIT_LIMIT) until the task is ready.
+    The Redis result backend delivers the result over pub/sub, so nothing is polled meanwhile.
+    :return: whether the task is ready
+    """
+    if timeout > 0 and not res.ready():
+        try:
+            res.get(timeout=min(timeout, WAIT_LIMIT), propagate=False)
+        except TimeoutError:
+            pass
+    return res.ready()
+
+
+def available(models, start, finish):
+    """
+    Splits the requested models into those worth submitting and refusals for those the availability index
+    knows have no data between start and finish. Only archive-only models are refused: the others fetch or
+    compile data on demand, so a range the index doesn't cover may still have data.
+    """
+    index = AvailabilityIndex.shared()
+    registry = ModelRegister.shared()
+    submit, refused = [], []
+    for name in models:
+        model = registry.get(name)
+        if model is not None and model.archive_only and \
+                index.covers(model.code, parse(start), parse(finish)) is False:
+            refused.append({'uuid': None, 'model': name, 'error': 'No data exists for that date range',
+                            'availability': index.model_summary(model.code), 'api_version': API_VERSION})
+        else:
+            submit.append(name)
+    return submit, refused
+
+
+def task_status(res):
+    """ State of a task, with its progress while running and the traceback if it failed. """
+    o = {
+        'id': res.id,
+        'STATE': res.state,  # PENDING, STARTED, RETRY, PROGRESS, FAILURE, SUCCESS
+        'api_version': API_VERSION
+    }
+    if not res.ready():
+        if res.state == PROGRESS and isinstance(res.info, dict):
+            # percent, stage, elapsed and eta as reported from inside the model
+            o.update(res.info)
+    elif not res.successful():
+        o['error'] = res.traceback
+    return o
+
 
 @api.get('/revoke', version=1)
 def revoke(uuid):
@@ -68,34 +173,48 @@ def ip(request=None, **kwargs):
 
 
 @hug.cli()
-@api.urls('/models/idents', versions=range(1, 2), content_output=hug.output_format.pretty_json)
 def model_idents():
-    mr = ModelRegister()
-    return mr.get_model_ids()
+    return ModelRegister.shared().get_model_ids()
+
+
+@api.urls('/models/idents', versions=range(1, 2), output=json_bytes)
+def serve_model_idents(request, response):
+    return CachedResponse.lookup('/models/idents').send(request, response)
 
 
 @hug.cli()
-@api.urls('/models/names', versions=range(1, 2), content_output=hug.output_format.pretty_json)
 def model_names():
-    mr = ModelRegister()
-    return mr.get_model_names()
+    return ModelRegister.shared().get_model_names()
+
+
+@api.urls('/models/names', versions=range(1, 2), output=json_bytes)
+def serve_model_names(request, response):
+    return CachedResponse.lookup('/models/names').send(request, response)
 
 
 @hug.cli()
-@api.urls('/models/codes', versions=range(1, 2), content_output=hug.output_format.pretty_json)
 def model_codes():
-    mr = ModelRegister()
-    return mr.get_model_codes()
+    return ModelRegister.shared().get_model_codes()
+
+
+@api.urls('/models/codes', versions=range(1, 2), output=json_bytes)
+def serve_model_codes(request, response):
+    return CachedResponse.lookup('/models/codes').send(request, response)
 
 
 @hug.cli()
 @hug.get('/result.mp4', versions=1, output=suffix_output)
 @hug.post('/result.mp4', versions=1, output=suffix_output)
-def result_mpg(uuid):
+def result_mpg(uuid, wait: hug.types.number = 0):
+    """
+    The finished MP4 video. Waits up to wait seconds for the task to finish; if it still hasn't, or it failed,
+    returns its status instead.
+    """
     res = AsyncResult(uuid, app=app)
-    if res.state == 'SUCCESS':
-        logger.debug(res)
-        return res.get()
+    if not wait_for(res, wait) or not res.successful():
+        return task_status(res)
+    logger.debug(res)
+    return res.get()
 
 
 @hug.get('/submit_query.mp4', versions=1, output=hug.output_format.pretty_json)
@@ -103,22 +222,26 @@ def result_mpg(uuid):
 def submit_mp4_query(geo_json,
                      start: fields.String(),
                      finish: fields.String(),
-                     models: hug.types.delimited_list(',')
+                     models: hug.types.delimited_list(','),
+                     profile: hug.types.smart_boolean = False
                      ):
     """
     Takes query parameters and returns endpoint where progress/status can be monitored.
     Utilises Partial Chain to use result of ShapeQuery in call signature of 'do_query'.
     HUG then handles formatting the result as a json object.
     """
+    models, refused = available(models, start, finish)
+    if len(models) == 0:
+        return refused
     final_result = group(
-        [do_mp4.s(geo_json, start, finish, model) for model in models])
+        [do_mp4.s(geo_json, start, finish, model, profile) for model in models])
 
     res = final_result.delay()  # Removed 1 minute from now
 
     resulting_task_uuids = [
         {'uuid': r.id, 'api_version': API_VERSION} for r in res.children]
 
-    return resulting_task_uuids
+    return resulting_task_uuids + refused
 
 ###############
 # NetCDF Code #
@@ -128,11 +251,16 @@ def submit_mp4_query(geo_json,
 @hug.cli()
 @hug.get('/result.nc', versions=1, output=suffix_output)
 @hug.post('/result.nc', versions=1, output=suffix_output)
-def result_netcdf(uuid):
+def result_netcdf(uuid, wait: hug.types.number = 0):
+    """
+    The finished NetCDF file. Waits up to wait seconds for the task to finish; if it still hasn't, or it failed,
+    returns its status instead.
+    """
     res = AsyncResult(uuid, app=app)
-    if res.state == 'SUCCESS':
-        logger.debug(res)
-        return res.get()
+    if not wait_for(res, wait) or not res.successful():
+        return task_status(res)
+    logger.debug(res)
+    return res.get()
 
 
 @hug.get('/submit_query.nc', versions=1, output=hug.output_format.pretty_json)
@@ -140,17 +268,21 @@ def result_netcdf(uuid):
 def submit_nc_query(geo_json,
                     start: fields.String(),
                     finish: fields.String(),
-                    models: hug.types.delimited_list(',')):
+                    models: hug.types.delimited_list(','),
+                    profile: hug.types.smart_boolean = False):
     """
     Takes query parameters and returns endpoint where progress/status can be monitored.
     Utilises Partial Chain to use result of ShapeQuery in call signature of 'do_query'.
     HUG then handles formatting the result as a json object.
     """
+    models, refused = available(models, start, finish)
+    if len(models) == 0:
+        return refused
     final_result = group(
-        [do_netcdf.s(geo_json, start, finish, model) for model in models])
+        [do_netcdf.s(geo_json, start, finish, model, profile) for model in models])
 
     res = final_result.delay()  # Removed 1 minute from now
-    return [{'uuid': r.id, 'api_version': API_VERSION} for r in res.children]
+    return [{'uuid': r.id, 'api_version': API_VERSION} for r in res.children] + refused
 
 
 #############
@@ -160,12 +292,23 @@ def submit_nc_query(geo_json,
 @hug.cli()
 @hug.get('/result.json', versions=1, output=suffix_output)
 @hug.post('/result.json', versions=1, output=suffix_output)
-def result(uuid):
+def result(uuid, layout: hug.types.one_of(('series', COLUMNAR)) = 'series', wait: hug.types.number = 0):
+    """
+    The finished JSON result. layout=columnar returns arrays of times and statistics as stored,
+    otherwise they are expanded into the per-point 'series' layout.
+    Waits up to wait seconds for the task to finish; if it still hasn't, returns its status instead.
+    """
     res = AsyncResult(uuid, app=app)
-    if res.state == 'SUCCESS':
-        resp = res.get()
-        resp['api_version'] = API_VERSION
-        return res.get()
+    if not wait_for(res, wait) or not res.successful():
+        return task_status(res)
+
+    resp = ResultStore.fetch(res.get())
+    if resp is None:
+        return {'id': uuid, 'STATE': res.state, 'error': 'Result has expired.', 'api_version': API_VERSION}
+    if layout != COLUMNAR:
+        resp = ModelResult.as_series(resp)
+    resp['api_version'] = API_VERSION
+    return resp
 
 
 @hug.get('/submit_query.json', versions=1, output=suffix_output)
@@ -173,46 +316,146 @@ def result(uuid):
 def submit_query(geo_json,
                  start: fields.String(),
                  finish: fields.String(),
-                 models: hug.types.delimited_list(',')):
+                 models: hug.types.delimited_list(','),
+                 profile: hug.types.smart_boolean = False):
     """
     Takes query parameters and returns endpoint where progress/status can be monitored.
     Utilises Partial Chain to use result of ShapeQuery in call signature of 'do_query'.
     HUG then handles formatting the result as a json object.
     """
-    print(models)
+    logger.debug('Models: %s', models)
 
+    models, refused = available(models, start, finish)
+    if len(models) == 0:
+        return refused
     final_result = group(
-        [do_query.s(geo_json, start, finish, model) for model in models])
+        [do_query.s(geo_json, start, finish, model, profile) for model in models])
 
     res = final_result.delay()  # Removed 1 minute from now
-    return [{'uuid': r.id, 'api_version': API_VERSION} for r in res.children]
+    return [{'uuid': r.id, 'api_version': API_VERSION} for r in res.children] + refused
+
+
+@hug.get('/partial.json', versions=1, output=hug.output_format.pretty_json)
+@hug.post('/partial.json', versions=1, output=hug.output_format.pretty_json)
+def partial_result(uuid, offset: hug.types.number = 0):
+    """
+    The time-series published so far by a running JSON query, from offset onwards,
+    with the fraction of the query completed and the offset to ask for next.
+    """
+    partial = ResultStream.read(uuid, offset)
+    if partial is None:
+        return {'id': uuid, 'STATE': AsyncResult(uuid, app=app).state, 'api_version': API_VERSION}
+
+    resp, errors = PartialResultSchema().dump(partial)
+    resp['api_version'] = API_VERSION
+    return resp
+
+
+@hug.get('/stream', versions=1, output=event_stream)
+def stream_result(uuid, offset: hug.types.number = 0, request=None):
+    """
+    Streams the time-series of a running JSON query as Server-Sent Events, one event per published batch,
+    until the query completes, for at most STREAM_LIMIT seconds. Each event's id is the offset to resume from.
+    Stops after WAIT_LIMIT seconds if the task is unknown (or still queued) and has published nothing.
+    """
+    if request is not None and request.get_header('Last-Event-ID') is not None:
+        offset = int(request.get_header('Last-Event-ID'))
+
+    def events(offset):
+        started = time.time()
+        while time.time() - started < STREAM_LIMIT:
+            partial = ResultStream.read(uuid, offset)
+            if partial is not None and (len(partial.series) > 0 or partial.complete):
+                resp, errors = PartialResultSchema().dump(partial)
+                resp['api_version'] = API_VERSION
+                yield ('id: %d\ndata: %s\n\n' % (partial.offset, json.dumps(resp))).encode('utf-8')
+                offset = partial.offset
+                if partial.complete:
+                    return
+            elif partial is None:
+                res = AsyncResult(uuid, app=app)
+                if res.ready() or (res.state == 'PENDING' and time.time() - started >= WAIT_LIMIT):
+                    return
+            elif AsyncResult(uuid, app=app).ready():
+                return
+            time.sleep(1)
+
+    return EventStream(events(offset))
+
+
+def valid_task_id(uuid, response):
+    """ Whether uuid is a task id, setting 400 Bad Request if not; it is joined into file paths. """
+    try:
+        QueryProfile.task_id(uuid)
+        return True
+    except ValueError:
+        if response is not None:
+            response.status = hug.HTTP_400
+        return False
+
+
+@hug.get('/profile.json', versions=1, output=hug.output_format.pretty_json)
+@hug.post('/profile.json', versions=1, output=hug.output_format.pretty_json)
+def get_profile(uuid, response=None):
+    """
+    Wall time, peak memory, hottest functions and largest allocation sites of a task submitted with profile=true.
+    """
+    if not valid_task_id(uuid, response):
+        return {'errors': {'uuid': 'Not a task id'}, 'api_version': API_VERSION}
+    summary = QueryProfile.read(uuid)
+    if summary is None:
+        return {'id': uuid, 'STATE': AsyncResult(uuid, app=app).state, 'api_version': API_VERSION}
+    summary['api_version'] = API_VERSION
+    return summary
+
+
+@hug.get('/profile', versions=1, output=hug.output_format.file)
+def get_profile_artefact(uuid, response=None):
+    """
+    The raw profile of a task submitted with profile=true; a cProfile .prof file or a pyinstrument .html report.
+    """
+    if not valid_task_id(uuid, response):
+        return {'errors': {'uuid': 'Not a task id'}, 'api_version': API_VERSION}
+    summary = QueryProfile.read(uuid)
+    if summary is not None:
+        return QueryProfile.artefact_path(uuid, os.path.splitext(summary['artefact'])[1])
+
+
+@api.urls('/availability.json', versions=range(1, 2), output=json_bytes)
+def serve_availability(request, response, model=None):
+    """
+    Dates with data (runs and gaps), time step, bounding box and cell size of every indexed model, or just one.
+    """
+    index = AvailabilityIndex.shared()
+    if model is None:
+        if index.response is None:
+            index.response = CachedResponse(index.summary(), modified=index.modified())
+        return index.response.send(request, response)
+
+    m = ModelRegister.shared().get(model)
+    summary = index.model_summary(m.code) if m is not None else None
+    if summary is None:
+        response.status = hug.HTTP_404
+        return json.dumps({'error': 'No availability for model: %s' % model, 'api_version': API_VERSION}).encode('utf-8')
+    return CachedResponse(summary, modified=index.modified()).send(request, response)
 
 
 @hug.get('/progress.json', versions=1)
 @hug.post('/progress.json', versions=1)
 def get_progress(uuid):
+    return task_status(AsyncResult(uuid, app=app))
+
+
+@hug.get('/wait.json', versions=1)
+@hug.post('/wait.json', versions=1)
+def wait_for_task(uuid, timeout: hug.types.number = 30):
+    """
+    Long-poll alternative to polling /progress.json: holds the request until the task finishes
+    or timeout seconds (at most WAIT_LIMIT) pass, then returns the task's status.
+    """
     res = AsyncResult(uuid, app=app)
-    if not res.ready():
-        o = {
-            'id': res.id,
-            'STATE': res.state,  # PENDING, STARTED, RETRY, FAILURE, SUCCESS
-            'api_version': API_VERSION
-        }
-    else:
-        if res.successful():
-            o = {
-                'id': res.id,
-                'STATE': res.state,  # PENDING, STARTED, RETRY, FAILURE, SUCCESS
-                'api_version': API_VERSION
-            }
-        else:
-            o = {
-                'id': res.id,
-                'STATE': res.state,  # PENDING, STARTED, RETRY, FAILURE, SUCCESS
-                'api_version': API_VERSION,
-                'error': res.traceback
-            }
-    return o
+    wait_for(res, timeout)
+    return task_status(res)
 
 
 # @hug.cli()
@@ -298,36 +541,57 @@ def consolidation():
         return "OK"
 
 
+@hug.get('/metrics', output=prometheus_text)
+def get_metrics():
+    """ Prometheus exposition of this API process' metrics. """
+    return generate_latest(metrics.registry())
+
+
 @hug.cli()
-@api.urls('/hostname', versions=range(1, 2))
 def get_hostname():
     return os.uname()[1]
 
 
+@api.urls('/hostname', versions=range(1, 2), output=json_bytes)
+def serve_hostname(request, response):
+    return CachedResponse.get('/hostname', get_hostname).send(request, response)
+
+
 @hug.cli()
-@api.urls('/models', versions=range(1, 2))
 def get_models():
     if dev.DEBUG:
         logger.debug('Got models call. Answering now...')
 
-    mr = ModelRegister()
     models_list_schema = ModelsRegisterSchema()
-    resp, errors = models_list_schema.dump(mr)
+    resp, errors = models_list_schema.dump(ModelRegister.shared())
     return resp
 
 
+@api.urls('/models', versions=range(1, 2), output=json_bytes)
+def serve_models(request, response):
+    return CachedResponse.lookup('/models').send(request, response)
+
+
 @hug.cli()
-@api.urls('/model', examples='?name=ffdi', versions=range(1, 2), content_output=hug.output_format.pretty_json)
 def get_model(name):
-    mr = ModelRegister()
     model_schema = ModelSchema()
-    resp, errors = model_schema.dump(mr.get(name))
+    resp, errors = model_schema.dump(ModelRegister.shared().get(name))
     return resp
 
 
+@api.urls('/model', examples='?name=ffdi', versions=range(1, 2), output=json_bytes)
+def serve_model(name, request, response):
+    model = ModelRegister.shared().get(name)
+    if model is None:
+        response.status = hug.HTTP_404
+        return json.dumps({'error': 'No such model: %s' % name, 'api_version': API_VERSION}).encode('utf-8')
+    # Precomputed by code so every alias (name, code or ident) shares one entry
+    return CachedResponse.lookup('/model?name=%s' % model.code).send(request, response)
+
+
 @hug.post('/convert.json', versions=range(1, 2))
 def convert_this_shapefile(shp: str):
-    logger.debug('Now Converting: %s' % shp)
+    logger.debug('Now Converting: %s', shp)
     final_result = do_conversion.s(shp)
     r = final_result.delay()
     return {'uuid': r.id}
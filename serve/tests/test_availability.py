@@ -0,0 +1,97 @@
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from serve.lfmc.models.Availability import AvailabilityIndex
+
+DAY = 24 * 60 * 60
+
+
+class Model:
+    def __init__(self, code, paths=()):
+        self.code = code
+        self.paths = list(paths)
+
+    def all_netcdfs(self):
+        return self.paths
+
+
+def days(*dates):
+    return np.array(dates, dtype='datetime64[s]')
+
+
+def test_runs_split_at_gaps():
+    times = days('2019-01-01', '2019-01-02', '2019-01-03', '2019-01-10', '2019-01-11')
+    assert AvailabilityIndex.runs(times, DAY) == [['2019-01-01T00:00:00', '2019-01-03T00:00:00'],
+                                                  ['2019-01-10T00:00:00', '2019-01-11T00:00:00']]
+    assert AvailabilityIndex.runs(days('2019-01-01'), None) == [['2019-01-01T00:00:00', '2019-01-01T00:00:00']]
+    assert AvailabilityIndex.runs(days(), DAY) == []
+
+
+def test_covers(tmp_path):
+    index = AvailabilityIndex(str(tmp_path.joinpath('availability.json')))
+    index.models = {'M': {'a.nc': {'runs': [['2019-01-05T12:00:00', '2019-01-10T12:00:00']]}}}
+    # Data stamped at midday on the finish date is within the range
+    assert index.covers('M', pd.Timestamp('2019-01-01'), pd.Timestamp('2019-01-05'))
+    assert index.covers('M', pd.Timestamp('2019-01-10'), pd.Timestamp('2019-01-20'))
+    assert not index.covers('M', pd.Timestamp('2019-01-11'), pd.Timestamp('2019-01-20'))
+    assert not index.covers('M', pd.Timestamp('2018-12-01'), pd.Timestamp('2019-01-04'))
+    assert index.covers('unindexed', pd.Timestamp('2019-01-01'), pd.Timestamp('2019-01-02')) is None
+
+
+def test_update_summarises_files(tmp_path):
+    nc = str(tmp_path.joinpath('m_2019.nc'))
+    xr.Dataset({'v': (('time', 'lat', 'lon'), np.zeros((3, 2, 2)))},
+               coords={'time': pd.date_range('2019-01-01', periods=3),
+                       'lat': [-30.0, -30.5], 'lon': [140.0, 140.5]}).to_netcdf(nc)
+    index = AvailabilityIndex(str(tmp_path.joinpath('availability.json')))
+    assert index.update(Model('M', [nc])) == 1
+    # Unchanged files are not read again
+    assert index.update(Model('M', [nc])) == 0
+
+    reread = AvailabilityIndex(index.path)
+    reread.refresh()
+    summary = reread.summary()['M']
+    assert summary['start'] == '2019-01-01T00:00:00'
+    assert summary['finish'] == '2019-01-03T00:00:00'
+    assert summary['step'] == DAY
+    assert summary['bbox'] == [-30.5, 140.0, -30.0, 140.5]
+    assert summary['gaps'] == []
+
+
+def test_corrupt_index_keeps_the_previous_one(tmp_path):
+    path = tmp_path.joinpath('availability.json')
+    path.write_text(json.dumps({'M': {}}))
+    index = AvailabilityIndex(str(path))
+    index.refresh()
+    assert index.models == {'M': {}}
+
+    path.write_text('{"M": {')
+    index.refresh()
+    assert index.models == {'M': {}}
+
+
+def test_concurrent_updates_are_not_lost(tmp_path):
+    path = str(tmp_path.joinpath('availability.json'))
+    threads = [threading.Thread(target=AvailabilityIndex(path).update, args=(Model('M%d' % i),))
+               for i in range(8)]
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+
+    with open(path) as f:
+        assert sorted(json.load(f)) == sorted('M%d' % i for i in range(8))
+    assert [p.name for p in tmp_path.iterdir() if p.suffix == '.part'] == []
+
+
+def test_modified_follows_the_index_file(tmp_path):
+    path = tmp_path.joinpath('availability.json')
+    index = AvailabilityIndex(str(path))
+    assert index.modified() is None
+
+    path.write_text(json.dumps({'M': {}}))
+    index.refresh()
+    assert index.modified() == pytest.approx(path.stat().st_mtime)
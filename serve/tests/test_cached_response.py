@@ -0,0 +1,85 @@
+import json
+from email.utils import formatdate
+
+import hug
+
+from serve.lfmc.results.CachedResponse import CachedResponse
+
+
+class Request:
+    def __init__(self, **headers):
+        self.headers = headers
+
+    def get_header(self, name):
+        return self.headers.get(name)
+
+
+class Response:
+    def __init__(self):
+        self.headers = {}
+        self.status = hug.HTTP_200
+
+    def set_header(self, name, value):
+        self.headers[name] = value
+
+
+def test_body_and_caching_headers():
+    cached = CachedResponse({'models': ['A']}, max_age=60)
+    response = Response()
+    body = cached.send(Request(), response)
+    assert json.loads(body.decode('utf-8')) == {'models': ['A']}
+    assert response.headers['ETag'] == cached.etag
+    assert response.headers['Cache-Control'] == 'public, max-age=60'
+    assert response.status == hug.HTTP_200
+
+
+def test_matching_etag_is_not_modified():
+    cached = CachedResponse({'models': ['A']})
+    response = Response()
+    assert cached.send(Request(**{'If-None-Match': '"other", %s' % cached.etag}), response) == b''
+    assert response.status == hug.HTTP_304
+    assert response.headers['Cache-Control'] == 'no-cache'
+
+
+def test_changed_content_is_sent_again():
+    old = CachedResponse({'models': ['A']})
+    new = CachedResponse({'models': ['A', 'B']})
+    assert old.etag != new.etag
+    response = Response()
+    assert new.send(Request(**{'If-None-Match': old.etag}), response) == new.body
+    assert response.status == hug.HTTP_200
+
+
+def test_if_modified_since():
+    cached = CachedResponse({'models': []})
+    current = formatdate(CachedResponse.modified + 1, usegmt=True)
+    stale = formatdate(CachedResponse.modified - 3600, usegmt=True)
+    assert cached.not_modified(Request(**{'If-Modified-Since': current}))
+    assert not cached.not_modified(Request(**{'If-Modified-Since': stale}))
+    assert not cached.not_modified(Request(**{'If-Modified-Since': 'not a date'}))
+
+
+def test_if_modified_since_uses_the_content_time():
+    # Eg., the availability index, rewritten after the deploy
+    changed = CachedResponse.modified + 3600
+    cached = CachedResponse({'models': []}, modified=changed)
+    assert cached.last_modified == formatdate(changed, usegmt=True)
+    deployed = formatdate(CachedResponse.modified + 1, usegmt=True)
+    assert not cached.not_modified(Request(**{'If-Modified-Since': deployed}))
+    assert cached.not_modified(Request(**{'If-Modified-Since': formatdate(changed, usegmt=True)}))
+
+
+def test_precompute_and_get_build_once():
+    CachedResponse.precompute({'/test/models': {'models': []}}, max_age=5)
+    assert CachedResponse.lookup('/test/models').max_age == 5
+
+    calls = []
+
+    def build():
+        calls.append(1)
+        return {'built': True}
+
+    first = CachedResponse.get('/test/built', build)
+    second = CachedResponse.get('/test/built', build)
+    assert first is second
+    assert calls == [1]
@@ -0,0 +1,70 @@
+import datetime
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from serve.lfmc.process.Climatology import Climatology
+
+
+def granule(directory, day, values):
+    path = os.path.join(str(directory), 'MOD09A1.A2001%03d.h29v12.nc' % day)
+    xr.Dataset({'vari': (('time', 'lat', 'lon'), np.array(values, dtype=np.float32)[np.newaxis])},
+               coords={'time': [pd.Timestamp('2001-01-01')], 'lat': [-30.0, -30.5], 'lon': [140.0, 140.5]}
+               ).to_netcdf(path)
+    return path
+
+
+def date_of(f):
+    return datetime.datetime.strptime(os.path.basename(f).split('.')[1][1:], '%Y%j')
+
+
+def test_running_statistics(tmp_path):
+    path = str(tmp_path) + '/'
+    files = [granule(tmp_path, 1, [[0.1, np.nan], [0.3, 0.4]]),
+             granule(tmp_path, 9, [[0.3, np.nan], [0.1, np.nan]])]
+    climatology = Climatology(path, 'h29v12')
+    assert climatology.update(files, date_of) == 2
+    climatology.write()
+
+    with xr.open_dataset(path + 'min_vari_h29v12.nc') as ds:
+        np.testing.assert_allclose(ds['vari'].values, [[0.1, np.nan], [0.1, 0.4]])
+    with xr.open_dataset(path + 'mean_vari_h29v12.nc') as ds:
+        np.testing.assert_allclose(ds['vari'].values, [[0.2, np.nan], [0.2, 0.4]])
+
+    # Resumes from the checkpoint, reading only new granules
+    files.append(granule(tmp_path, 17, [[0.5, 0.2], [0.2, 0.2]]))
+    resumed = Climatology(path, 'h29v12')
+    assert resumed.update(files, date_of) == 1
+    np.testing.assert_array_equal(resumed.count, [[3, 1], [3, 2]])
+
+
+def test_empty_climatology_is_not_written(tmp_path):
+    path = str(tmp_path) + '/'
+    climatology = Climatology(path, 'h29v12')
+    assert climatology.update([], date_of) == 0
+    climatology.write()
+
+    climatology.update([granule(tmp_path, 1, [[np.nan, np.nan], [np.nan, np.nan]])], date_of)
+    climatology.write()
+    assert sorted(os.listdir(path)) == ['MOD09A1.A2001001.h29v12.nc']
+
+
+def test_state_on_other_coords_is_rebuilt(tmp_path):
+    path = str(tmp_path) + '/'
+    files = [granule(tmp_path, 1, [[0.1, 0.2], [0.3, 0.4]])]
+    old = Climatology(path, 'h29v12')
+    old.update(files, date_of, (np.array([-30.0, -30.5]), np.array([139.9, 140.4])))
+    assert old.seen == {'MOD09A1.A2001001.h29v12.nc'}
+
+    climatology = Climatology(path, 'h29v12')
+    coords = (np.array([-30.0, -30.5]), np.array([140.0, 140.5]))
+    assert climatology.update(files, date_of, coords) == 1
+    np.testing.assert_array_equal(climatology.lons, coords[1])
+    np.testing.assert_array_equal(climatology.count, [[1, 1], [1, 1]])
+
+    # Granules on other coords are refused rather than broadcast
+    with pytest.raises(ValueError):
+        Climatology(path, 'h29v12').update([granule(tmp_path, 9, [[0.1, 0.2, 0.3]])], date_of, coords)
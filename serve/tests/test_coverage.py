@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+import shapely
+from shapely.geometry import MultiPolygon, Point, Polygon, box
+
+from serve.lfmc.util.coverage import coverage_fractions, transform_for_coords
+
+# 0.5 degree cells over 140E to 145E, 30S to 35S
+LONS = np.arange(140.25, 145.0, 0.5)
+DESCENDING = np.arange(-30.25, -35.0, -0.5)
+
+POLYGONS = {
+    'triangle': Polygon([(140.1, -30.2), (144.3, -31.1), (141.7, -34.6)]),
+    'holed': Polygon(box(140.6, -34.4, 144.4, -30.6).exterior.coords,
+                     [Point(142.5, -32.5).buffer(1.1).exterior.coords]),
+    'multi': MultiPolygon([box(140.0, -31.0, 141.3, -30.0), Point(143.2, -33.1).buffer(0.9)]),
+    'outside': Polygon([(138.0, -29.0), (142.2, -32.7), (146.5, -36.0), (139.0, -36.0)]),
+}
+
+
+def supersampled(geometry, lats, lons, n=40):
+    """ Fraction of an n x n lattice of points in each cell inside the geometry. """
+    step_lat, step_lon = lats[1] - lats[0], lons[1] - lons[0]
+    offsets = (np.arange(n) + 0.5) / n - 0.5
+    result = np.zeros((len(lats), len(lons)))
+    for i, lat in enumerate(lats):
+        ys = lat + offsets * step_lat
+        for j, lon in enumerate(lons):
+            xs, ys_ = np.meshgrid(lon + offsets * step_lon, ys)
+            result[i, j] = shapely.contains_xy(geometry, xs, ys_).mean()
+    return result
+
+
+@pytest.mark.parametrize('name', sorted(POLYGONS))
+@pytest.mark.parametrize('lats', [DESCENDING, DESCENDING[::-1]], ids=['descending', 'ascending'])
+def test_matches_supersampling(name, lats):
+    transform = transform_for_coords(lats, LONS)
+    original = list(transform)
+    coverage = coverage_fractions([POLYGONS[name]], transform, (len(lats), len(LONS)))
+
+    assert transform == original
+    assert coverage.dtype == np.float32
+    np.testing.assert_allclose(coverage, supersampled(POLYGONS[name], lats, LONS), atol=0.05)
+    # Exact: the covered cell area is the area of the polygon within the grid
+    inside = POLYGONS[name].intersection(box(140.0, -35.0, 145.0, -30.0)).area
+    assert coverage.sum() * 0.25 == pytest.approx(inside, rel=1e-6)
+
+
+def test_transform_for_coords():
+    assert transform_for_coords(DESCENDING, LONS) == pytest.approx([0.5, 0.0, 140.0, 0.0, -0.5, -30.0])
+    assert transform_for_coords(DESCENDING[::-1], LONS) == pytest.approx([0.5, 0.0, 140.0, 0.0, 0.5, -35.0])
+    with pytest.raises(ValueError):
+        transform_for_coords([-30.25], LONS)
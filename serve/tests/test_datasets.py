@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+import serve.lfmc.config.compute as compute
+from serve.lfmc.util import datasets
+
+
+@pytest.fixture(autouse=True)
+def pool():
+    datasets.clear()
+    yield
+    datasets.clear()
+
+
+def write(path, start, values):
+    xr.Dataset({'v': (('time', 'lat'), np.array(values, dtype=np.float32)[:, np.newaxis])},
+               coords={'time': pd.date_range(start, periods=len(values)), 'lat': [-30.0]}).to_netcdf(str(path))
+    return str(path)
+
+
+def test_pooled_datasets_are_lazy(tmp_path):
+    fs = [write(tmp_path.joinpath('a.nc'), '2019-01-01', [1, 2]),
+          write(tmp_path.joinpath('b.nc'), '2019-01-03', [3])]
+    ds = datasets.open_mfdataset(fs)
+    assert ds['v'].chunks is not None
+    assert ds['v'].values.ravel().tolist() == [1, 2, 3]
+
+
+def test_rewritten_file_is_reopened(tmp_path):
+    f = write(tmp_path.joinpath('a.nc'), '2019-01-01', [1, 2])
+    assert datasets.open_dataset(f)['v'].values.ravel().tolist() == [1, 2]
+
+    # As the ingest does: write alongside, then replace
+    os.replace(write(tmp_path.joinpath('a.nc.part'), '2019-01-01', [5, 6, 7]), f)
+    assert datasets.open_dataset(f)['v'].values.ravel().tolist() == [5, 6, 7]
+
+
+def test_stale_entry_is_replaced(tmp_path):
+    f = write(tmp_path.joinpath('a.nc'), '2019-01-01', [1, 2])
+    datasets.open_dataset(f)
+    (key, (stamp, ds)), = datasets._pool.items()
+
+    st = os.stat(f)
+    os.utime(f, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    datasets.open_dataset(f)
+    (_, (new_stamp, new_ds)), = datasets._pool.items()
+    assert new_stamp != stamp
+    assert new_ds is not ds
+
+
+def test_least_recently_used_are_evicted(tmp_path, monkeypatch):
+    monkeypatch.setattr(compute, 'DATASET_POOL_SIZE', 2)
+    fs = [write(tmp_path.joinpath('%s.nc' % i), '2019-01-01', [i]) for i in range(3)]
+    datasets.open_dataset(fs[0])
+    datasets.open_dataset(fs[1])
+    datasets.open_dataset(fs[0])
+    datasets.open_dataset(fs[2])
+    assert [k[0] for k in datasets._pool] == [os.path.abspath(fs[0]), os.path.abspath(fs[2])]
+
+
+def test_closing_a_copy_keeps_the_pooled_dataset(tmp_path):
+    f = write(tmp_path.joinpath('a.nc'), '2019-01-01', [1, 2])
+    datasets.open_dataset(f).close()
+    assert datasets.open_dataset(f)['v'].values.ravel().tolist() == [1, 2]
+    assert len(datasets._pool) == 1
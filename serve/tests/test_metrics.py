@@ -0,0 +1,58 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+from prometheus_client import REGISTRY
+
+from serve.lfmc.util import metrics
+
+
+def observations(stage, cache):
+    return REGISTRY.get_sample_value('lfmc_stage_seconds_count',
+                                     {'stage': stage, 'model': 'test', 'format': 'json', 'cache': cache}) or 0
+
+
+def test_stages_are_labelled_with_their_cache_outcome():
+    before = {c: observations('discover', c) for c in ('hit', 'miss', '')}
+    with metrics.labelled(model='test', format='json'):
+        with metrics.timer('discover'):
+            metrics.cache(True)
+        with metrics.timer('discover'):
+            metrics.cache(True)
+            metrics.cache(False)
+            metrics.cache(True)
+        with metrics.timer('discover'):
+            pass
+    assert observations('discover', 'hit') == before['hit'] + 1
+    assert observations('discover', 'miss') == before['miss'] + 1
+    assert observations('discover', '') == before[''] + 1
+
+
+def test_nested_stages_keep_their_own_cache_outcome():
+    before = observations('load', 'miss'), observations('open', '')
+    with metrics.labelled(model='test', format='json'):
+        with metrics.timer('open'):
+            with metrics.timer('load'):
+                metrics.cache(False)
+    assert (observations('load', 'miss'), observations('open', '')) == (before[0] + 1, before[1] + 1)
+
+
+def test_workers_are_aggregated_in_multiprocess_mode(tmp_path):
+    # The value store is chosen when prometheus_client is imported, so each worker is its own interpreter
+    worker = textwrap.dedent('''
+        from serve.lfmc.util import metrics
+        with metrics.labelled(model='test', format='json'), metrics.timer('load'):
+            metrics.cache(False)
+    ''')
+    reader = textwrap.dedent('''
+        from serve.lfmc.util import metrics
+        print(metrics.registry().get_sample_value(
+            'lfmc_stage_seconds_count', {'stage': 'load', 'model': 'test', 'format': 'json', 'cache': 'miss'}))
+    ''')
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path / 'metrics'))
+    cwd = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    for _ in range(2):
+        subprocess.run([sys.executable, '-c', worker], env=env, cwd=cwd, check=True)
+    out = subprocess.run([sys.executable, '-c', reader], env=env, cwd=cwd, check=True, capture_output=True, text=True)
+    assert float(out.stdout.strip().splitlines()[-1]) == 2
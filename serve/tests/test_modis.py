@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from serve.lfmc.util import modis
+
+# Every tile of the grid, so point sampling and the bbox test see the same candidates
+WORLD = [(h, v) for h in range(36) for v in range(18)]
+
+BOXES = [
+    (-33.9, 151.0, -33.8, 151.3),   # Sydney
+    (-44.0, 112.0, -10.0, 154.0),   # Australia
+    (-10.5, 130.0, -9.5, 133.0),    # Across the h29/h30 v9/v10 corner
+    (-5.0, 100.0, 5.0, 119.5),      # Across the equator (lon 120 there is exactly the h29/h30 edge)
+    (60.0, -30.0, 75.0, 10.0),      # High latitudes, where tiles shear most
+    (-35.0, 150.0, -25.0, 140.0),   # Corners given in either order
+]
+
+
+def sampled(lat1, lon1, lat2, lon2, n=400):
+    """ Tiles of an n x n grid of points spanning a box, edges included. """
+    lats = np.linspace(min(lat1, lat2), max(lat1, lat2), n)
+    lons = np.linspace(min(lon1, lon2), max(lon1, lon2), n)
+    return {"h%sv%s" % modis.tile_for_point(lat, lon) for lat in lats for lon in lons}
+
+
+@pytest.mark.parametrize('box', BOXES)
+def test_tiles_for_bbox_matches_point_sampling(box):
+    assert set(modis.tiles_for_bbox(*box, tiles=WORLD)) == sampled(*box)
+
+
+@pytest.mark.parametrize('box', BOXES)
+def test_tiles_for_bbox_defaults_to_the_tiles_we_hold(box):
+    held = {"h%sv%s" % hv for hv in modis.AUSTRALIA}
+    assert set(modis.tiles_for_bbox(*box)) == sampled(*box) & held
+
+
+def test_sydney():
+    assert modis.tile_for_point(-33.87, 151.21) == (30, 12)
+    assert modis.tiles_for_bbox(-33.87, 151.21, -33.87, 151.21) == ['h30v12']
+    assert 'h30v12' in modis.tiles_for_bbox(-34.0, 150.5, -33.5, 151.5)
@@ -0,0 +1,110 @@
+import datetime
+import math
+import os
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from serve.lfmc.process.ModisTransform import ModisTransform, RED, GREEN, BLUE, FILL
+from serve.lfmc.util import modis
+
+PIXELS = 24
+GRANULE = 'MOD09A1.A2000049.h29v12.006.2015136104424.hdf'
+
+
+def test_vari():
+    red = np.array([0.1, 0.2, 0.3, np.nan], dtype=np.float32)
+    green = np.array([0.3, 0.2, 0.4, 0.1], dtype=np.float32)
+    blue = np.array([0.2, 0.4, 0.2, 0.1], dtype=np.float32)
+    np.testing.assert_allclose(ModisTransform.vari(red, green, blue), [1.0, np.nan, 0.2, np.nan], rtol=1e-6)
+
+
+def test_grid_is_on_the_global_lattice():
+    step = modis.lattice_step(PIXELS)
+    lats, lons = modis.tile_grid(29, 12, PIXELS)
+    assert len(lats) == PIXELS
+    np.testing.assert_allclose(lats[0], -30 - step / 2)
+    np.testing.assert_allclose(np.diff(lats), -step)
+    np.testing.assert_allclose(np.diff(lons), step)
+
+    # Neighbouring tiles share the lattice, so they merge onto one regular grid
+    east_lats, east_lons = modis.tile_grid(30, 12, PIXELS)
+    north_lats, _ = modis.tile_grid(29, 11, PIXELS)
+    assert np.array_equal(lats, east_lats)
+    shared = np.intersect1d(lons, east_lons)
+    assert len(shared) > 0
+    np.testing.assert_allclose(np.diff(np.union1d(lons, east_lons)), step)
+    np.testing.assert_allclose(north_lats[-1] - lats[0], step)
+
+
+def test_resample_index():
+    lats, lons, index = modis.resample_index(29, 12, PIXELS)
+    assert index.shape == (len(lats), len(lons))
+    # Every sinusoidal cell is sampled, and no row or column is all fill
+    assert np.array_equal(np.unique(index[index >= 0]), np.arange(PIXELS * PIXELS))
+    assert (index >= 0).any(axis=0).all() and (index >= 0).any(axis=1).all()
+
+    x0, _, _, y1 = modis.tile_extent(29, 12)
+    size = modis.TILE_SIZE / PIXELS
+    i, j = np.argwhere(index >= 0)[len(np.argwhere(index >= 0)) // 2]
+    x = modis.RADIUS * math.radians(lons[j]) * math.cos(math.radians(lats[i]))
+    y = modis.RADIUS * math.radians(lats[i])
+    assert index[i, j] == int((y1 - y) // size) * PIXELS + int((x - x0) // size)
+
+
+def test_reproject():
+    _, _, index = modis.resample_index(29, 12, PIXELS)
+    values = np.arange(PIXELS * PIXELS, dtype=np.float32).reshape(PIXELS, PIXELS)
+    result = ModisTransform.reproject(values, index)
+    assert result.shape == index.shape
+    assert np.array_equal(result[index >= 0], index[index >= 0].astype(np.float32))
+    assert np.isnan(result[index < 0]).all()
+
+
+def bands(hdf):
+    rows, cols = np.indices((PIXELS, PIXELS))
+    red = np.full((PIXELS, PIXELS), 0.1, dtype=np.float32)
+    green = (0.2 + 0.001 * cols).astype(np.float32)
+    blue = np.full((PIXELS, PIXELS), 0.05, dtype=np.float32)
+    return [red, green, blue]
+
+
+def test_read_bands(tmp_path):
+    # GDAL reads the bands as subdatasets of the granule, as it does those of an HDF-EOS granule
+    pytest.importorskip('gdal')
+    hdf = str(tmp_path.joinpath('granule.nc'))
+    red = np.arange(PIXELS * PIXELS, dtype=np.int16).reshape(PIXELS, PIXELS)
+    red[0, 0] = FILL
+    xr.Dataset({band: (('YDim', 'XDim'), red + i) for i, band in enumerate((RED, GREEN, BLUE))}).to_netcdf(
+        hdf, encoding={band: {'_FillValue': None} for band in (RED, GREEN, BLUE)})
+
+    bands = ModisTransform.read_bands(hdf)
+    assert [b.dtype for b in bands] == [np.float32] * 3
+    assert np.isnan(bands[0][0, 0])
+    assert bands[0][0, 1] == 1 and bands[1][0, 1] == 2 and bands[2][5, 0] == 5 * PIXELS + 2
+
+
+def test_transform_writes_atomically(tmp_path, monkeypatch):
+    monkeypatch.setattr(ModisTransform, 'read_bands', staticmethod(bands))
+    target = ModisTransform.transform(GRANULE, str(tmp_path))
+    assert os.listdir(str(tmp_path)) == [os.path.basename(target)]
+
+    lats, lons, index = modis.resample_index(29, 12, PIXELS)
+    expected = ModisTransform.reproject(ModisTransform.vari(*bands(GRANULE)), index)
+    with xr.open_dataset(target) as ds:
+        assert ds['time'].values[0] == np.datetime64(datetime.datetime(2000, 2, 18))
+        np.testing.assert_array_equal(ds['lat'].values, lats)
+        np.testing.assert_array_equal(ds['lon'].values, lons)
+        np.testing.assert_allclose(ds['vari'].values[0], expected)
+
+    # A failed transform leaves the previous file in place and no partial one
+    def broken(hdf):
+        raise OSError('Could not open %s' % hdf)
+
+    monkeypatch.setattr(xr.Dataset, 'to_netcdf', lambda self, path, **kwargs: (open(path, 'w').close(), broken(path)))
+    with pytest.raises(OSError):
+        ModisTransform.transform(GRANULE, str(tmp_path))
+    assert os.listdir(str(tmp_path)) == [os.path.basename(target)]
+    with xr.open_dataset(target) as ds:
+        np.testing.assert_allclose(ds['vari'].values[0], expected)
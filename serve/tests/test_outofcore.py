@@ -0,0 +1,81 @@
+import dask.array
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+import serve.lfmc.config.compute as compute
+from serve.lfmc.util import outofcore
+
+
+@pytest.fixture
+def out_of_core(monkeypatch):
+    monkeypatch.setattr(compute, 'OUT_OF_CORE', True)
+    monkeypatch.setattr(compute, 'SCHEDULER', 'synchronous')
+
+
+def cube(steps=10):
+    """ A float32 time x 4 x 5 cube whose values identify their time step, 80 bytes per step. """
+    values = np.repeat(np.arange(steps, dtype=np.float32), 20).reshape(steps, 4, 5)
+    return xr.Dataset({'lfmc': (('time', 'lat', 'lon'), values)},
+                      coords={'time': pd.date_range('2020-01-01', periods=steps, freq='8D'),
+                              'lat': np.linspace(-30, -33, 4), 'lon': np.linspace(150, 154, 5)})
+
+
+def test_bytes_per_timestep():
+    assert outofcore.bytes_per_timestep(cube()) == 80
+    assert outofcore.bytes_per_timestep(cube()['lfmc']) == 80
+
+
+@pytest.mark.parametrize('budget', [1, 80, 240, 250, 800, 10000])
+def test_time_blocks_cover_the_range_without_gaps_or_overlap(out_of_core, budget):
+    ds = cube()
+    blocks = list(outofcore.time_blocks(ds, budget))
+    step = max(1, budget // 80)
+    assert [b.sizes['time'] for b in blocks[:-1]] == [step] * (len(blocks) - 1)
+    times = np.concatenate([b['time'].values for b in blocks])
+    np.testing.assert_array_equal(times, ds['time'].values)
+    xr.testing.assert_identical(xr.concat(blocks, dim='time'), ds)
+    assert all(isinstance(b['lfmc'].data, np.ndarray) for b in blocks)
+
+
+def test_time_blocks_in_core_is_one_block(monkeypatch):
+    monkeypatch.setattr(compute, 'OUT_OF_CORE', False)
+    ds = cube()
+    assert [b is ds for b in outofcore.time_blocks(ds, 1)] == [True]
+
+
+def test_time_chunk_shares_the_budget_between_workers(monkeypatch):
+    monkeypatch.setattr(compute, 'SCHEDULER', 'threads')
+    monkeypatch.setattr(compute, 'WORKERS', 4)
+    assert outofcore.time_chunk(cube(), 800) == 2
+    monkeypatch.setattr(compute, 'SCHEDULER', 'synchronous')
+    assert outofcore.time_chunk(cube(), 800) == 10
+
+
+def test_chunked_is_dask_backed(out_of_core):
+    ds = outofcore.chunked(cube(), 240)
+    assert isinstance(ds['lfmc'].data, dask.array.Array)
+    assert ds['lfmc'].chunks[0] == (3, 3, 3, 1)
+    xr.testing.assert_identical(ds.compute(), cube())
+
+
+def test_chunked_leaves_timeless_objects(out_of_core):
+    ds = cube().isel(time=0)
+    assert outofcore.chunked(ds, 1) is ds
+
+
+def test_open_chunks(monkeypatch, tmp_path):
+    path = str(tmp_path / 'cube.nc')
+    cube().to_netcdf(path)
+
+    monkeypatch.setattr(compute, 'OUT_OF_CORE', True)
+    assert outofcore.open_chunks() == {'time': 1}
+    with xr.open_dataset(path, chunks=outofcore.open_chunks()) as ds:
+        assert isinstance(ds['lfmc'].data, dask.array.Array)
+        assert ds['lfmc'].chunks[0] == (1,) * 10
+
+    monkeypatch.setattr(compute, 'OUT_OF_CORE', False)
+    assert outofcore.open_chunks() is None
+    with xr.open_dataset(path, chunks=outofcore.open_chunks()) as ds:
+        assert not isinstance(ds['lfmc'].data, dask.array.Array)
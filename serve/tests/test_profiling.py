@@ -0,0 +1,71 @@
+import os
+import uuid
+
+import pytest
+
+import serve.lfmc.config.compute as compute
+import serve.lfmc.process.Profiling as profiling
+from serve.lfmc.process.Profiling import QueryProfile
+
+
+@pytest.fixture
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(compute, 'PROFILE_DIR', str(tmp_path))
+    # cProfile is always available, pyinstrument may not be
+    monkeypatch.setattr(profiling, 'SamplingProfiler', None)
+    return tmp_path
+
+
+ABC, FAILING, OFF, MISSING, CORRUPT = (str(uuid.uuid4()) for i in range(5))
+
+
+def workload():
+    return sum(len(str(i)) for i in range(20000))
+
+
+def test_profile_summary_round_trip(profile_dir):
+    with QueryProfile(ABC):
+        workload()
+
+    summary = QueryProfile.read(ABC)
+    assert summary['id'] == ABC
+    assert summary['profiler'] == 'cProfile'
+    assert summary['failed'] is False
+    assert summary['wall_seconds'] >= 0
+    assert summary['peak_memory_bytes'] > 0
+    assert len(summary['functions']) > 0
+    assert os.path.isfile(QueryProfile.artefact_path(ABC, '.prof'))
+    assert summary['artefact'] == ABC + '.prof'
+
+
+def test_failed_task_is_profiled_and_raises(profile_dir):
+    with pytest.raises(ZeroDivisionError):
+        with QueryProfile(FAILING):
+            1 / 0
+    assert QueryProfile.read(FAILING)['failed'] is True
+
+
+def test_disabled_profile_writes_nothing(profile_dir):
+    with QueryProfile(OFF, enabled=False):
+        workload()
+    assert QueryProfile.read(OFF) is None
+    assert os.listdir(str(profile_dir)) == []
+
+
+def test_unreadable_summary(profile_dir):
+    assert QueryProfile.read(MISSING) is None
+    with open(QueryProfile.summary_path(CORRUPT), 'w') as f:
+        f.write('{not json')
+    assert QueryProfile.read(CORRUPT) is None
+
+
+def test_ids_that_are_not_task_ids_are_refused(profile_dir):
+    outside = profile_dir.joinpath('..', 'secret.json')
+    outside.write_text('{"secret": true}')
+    for bad in ('../secret', '../' + ABC, '', 'abc'):
+        with pytest.raises(ValueError):
+            QueryProfile.summary_path(bad)
+        with pytest.raises(ValueError):
+            QueryProfile.artefact_path(bad, '.prof')
+        assert QueryProfile.read(bad) is None
+    assert QueryProfile.task_id(ABC.upper()) == ABC
@@ -0,0 +1,68 @@
+import pytest
+
+from serve.lfmc.process.Progress import ProgressReporter, PROGRESS
+
+
+class Task:
+    def __init__(self):
+        self.states = []
+
+    def update_state(self, state, meta):
+        self.states.append((state, meta))
+
+
+def test_percent_covers_the_whole_task():
+    task = Task()
+    progress = ProgressReporter(task)
+    progress.report(1, 1, 'discover')
+    progress.report(0, 4, 'load')
+    progress.report(4, 4, 'load')
+    progress.report(1, 1, 'serialise')
+
+    percents = [meta['percent'] for state, meta in task.states]
+    assert all(state == PROGRESS for state, meta in task.states)
+    assert percents == sorted(percents)
+    # Discover done, download skipped, so load starts at 30%
+    assert percents[:3] == [5.0, 30.0, 55.0]
+    assert percents[-1] == 100.0
+    assert task.states[-1][1]['eta'] == 0.0
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_eta_uses_the_whole_task():
+    clock = Clock()
+    task = Task()
+    progress = ProgressReporter(task, clock=clock)
+    clock.now = 10.0
+    progress.report(2, 4, 'aggregate')
+    meta = task.states[-1][1]
+    # Half of aggregate after 10 seconds puts the task at 75%
+    assert meta['percent'] == 75.0
+    assert meta['stage_percent'] == 50.0
+    assert meta['elapsed'] == 10.0
+    assert meta['eta'] == pytest.approx(10.0 / 0.75 * 0.25, abs=0.1)
+
+
+def test_updates_within_a_stage_are_throttled():
+    clock = Clock()
+    task = Task()
+    progress = ProgressReporter(task, clock=clock)
+    progress.report(1, 4, 'load')
+    clock.now = 0.5
+    progress.report(2, 4, 'load')
+    clock.now = 1.5
+    progress.report(3, 4, 'load')
+    progress.report(4, 4, 'load')
+    assert [meta['done'] for state, meta in task.states] == [1, 3, 4]
+
+
+def test_unknown_stage():
+    with pytest.raises(ValueError):
+        ProgressReporter().report(0, 1, 'unknown')
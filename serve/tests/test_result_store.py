@@ -0,0 +1,74 @@
+import gzip
+import hashlib
+import json
+import os
+import time
+
+import pytest
+
+import serve.lfmc.config.caching as caching
+from serve.lfmc.resource.ResultStore import ResultStore, LocalResultStore, STORED
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(caching, 'RESULT_INLINE_LIMIT', 100)
+    return LocalResultStore(str(tmp_path))
+
+
+def large_result():
+    return {'name': 'model', 'layout': 'columnar', 'columns': {'value': list(range(1000))}}
+
+
+def test_small_results_stay_inline(store):
+    content = {'name': 'model', 'series': []}
+    assert ResultStore.stash(content, store) is content
+    assert ResultStore.fetch(content, store) is content
+
+
+def test_large_results_round_trip(store):
+    pointer = ResultStore.stash(large_result(), store)
+    assert pointer['layout'] == STORED
+    assert pointer['store'] == 'local'
+    assert pointer['compressed'] < pointer['bytes']
+    assert store.object_exists(pointer['key'])
+    assert ResultStore.fetch(pointer, store) == large_result()
+
+
+def test_identical_results_share_a_key(store):
+    first = ResultStore.stash(large_result(), store)
+    second = ResultStore.stash(large_result(), store)
+    assert first['key'] == second['key']
+    assert len(store.list_objects()) == 1
+    # The key depends on the content alone, not on when it was compressed
+    encoded = json.dumps(large_result()).encode('utf-8')
+    assert first['key'] == hashlib.sha256(encoded).hexdigest() + '.json.gz'
+    with open(str(store.path_for(first['key'])), 'rb') as f:
+        assert f.read() == gzip.compress(encoded, mtime=0)
+
+
+def test_writes_leave_no_temporary_files(store, tmp_path):
+    pointer = ResultStore.stash(large_result(), store)
+    assert os.listdir(str(store.path_for(pointer['key']).parent)) == [pointer['key']]
+
+
+def test_evicted_results_fetch_as_none(store):
+    pointer = ResultStore.stash(large_result(), store)
+    store.delete_object(pointer['key'])
+    assert ResultStore.fetch(pointer, store) is None
+
+
+def test_evict_applies_retention(store, monkeypatch):
+    pointer = ResultStore.stash(large_result(), store)
+    old = time.time() - caching.RESULT_RETENTION - 60
+    os.utime(str(store.path_for(pointer['key'])), (old, old))
+    assert store.evict() == 1
+    assert not store.object_exists(pointer['key'])
+
+
+def test_stores_must_implement_get_and_delete():
+    class Incomplete(ResultStore):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
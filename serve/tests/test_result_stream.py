@@ -0,0 +1,25 @@
+from serve.lfmc.results.ResultStream import EventStream, PartialResult
+
+
+def test_event_stream_reads_one_event_at_a_time():
+    stream = EventStream(iter([b'data: 1\n\n', b'data: 2\n\n']))
+    assert stream.read() == b'data: 1\n\n'
+    assert stream.read(8192) == b'data: 2\n\n'
+    assert stream.read() == b''
+
+
+def test_event_stream_close_stops_the_generator():
+    def events():
+        yield b'data: 1\n\n'
+        yield b'data: 2\n\n'
+
+    stream = EventStream(events())
+    stream.read()
+    stream.close()
+    assert stream.read() == b''
+
+
+def test_partial_result_fraction():
+    assert PartialResult('id', 'm', [], 0, 3, 4, False).fraction == 0.75
+    assert PartialResult('id', 'm', [], 0, 0, 0, False).fraction == 0.0
+    assert PartialResult('id', 'm', [], 0, 1, 4, True).fraction == 1.0
@@ -0,0 +1,137 @@
+import os
+
+import netCDF4
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from serve.lfmc.process import TileArchive
+
+LABEL = 'h29v12'
+LATS = np.array([-30.0, -30.5])
+LONS = np.array([140.0, 140.5, 141.0])
+
+
+def raster(value):
+    return np.full((len(LATS), len(LONS)), value, dtype=np.float32)
+
+
+def granule(directory, day, vari):
+    path = os.path.join(str(directory), 'projd', 'MOD09A1.A2019%03d.%s.006.2019001000000.nc' % (day, LABEL))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    xr.Dataset({'vari': (('time', 'lat', 'lon'), vari[np.newaxis])},
+               coords={'time': [pd.Timestamp('2019-01-01')], 'lat': LATS, 'lon': LONS}).to_netcdf(path)
+    return path
+
+
+def climatology(directory, low, high):
+    for name, values in (('min', low), ('max', high)):
+        xr.Dataset({'vari': (('lat', 'lon'), values)}, coords={'lat': LATS, 'lon': LONS}).to_netcdf(
+            os.path.join(str(directory), '%s_vari_%s.nc' % (name, LABEL)))
+
+
+def test_lfmc_from_vari():
+    vari = np.array([[0.1, 0.2, 0.3, 0.6, np.nan]], dtype=np.float32)
+    low = np.full(vari.shape, 0.1, dtype=np.float32)
+    scale = np.full(vari.shape, 1 / 0.4, dtype=np.float32)
+    expected = 52.51 ** (1.36 * np.array([[0.0, 0.25, 0.5, 1.0, np.nan]]))
+    lfmc = TileArchive.lfmc_from_vari(vari, low, scale)
+    assert lfmc.dtype == np.float32
+    np.testing.assert_allclose(lfmc, expected, rtol=1e-5)
+    # The input is left as it was
+    assert vari[0, 1] == np.float32(0.2)
+
+
+def test_vari_range_follows_the_climatology(tmp_path):
+    path = str(tmp_path) + '/'
+    climatology(tmp_path, raster(0.1), raster(0.5))
+    low, scale = TileArchive.vari_range(path, LABEL)
+    np.testing.assert_allclose(low, 0.1)
+    np.testing.assert_allclose(scale, 2.5, rtol=1e-6)
+
+    # Rewritten rasters replace the memory-mapped copies
+    climatology(tmp_path, raster(0.2), raster(0.4))
+    for f in ('min_vari_', 'max_vari_'):
+        target = path + f + LABEL + '.nc'
+        os.utime(target, (os.path.getmtime(target) + 10, os.path.getmtime(target) + 10))
+    low, scale = TileArchive.vari_range(path, LABEL)
+    np.testing.assert_allclose(low, 0.2)
+    np.testing.assert_allclose(scale, 5.0, rtol=1e-6)
+
+
+def steps(*days):
+    return {float(d): (lambda d=d: raster(d)) for d in days}
+
+
+def test_update_archive_keeps_time_in_order(tmp_path):
+    archive = str(tmp_path.joinpath('LFMC_2019_%s.nc' % LABEL))
+    TileArchive.update_archive(archive, steps(10, 18), LATS, LONS, LABEL)
+    TileArchive.update_archive(archive, steps(26), LATS, LONS, LABEL)
+    # A late granule goes in its place, not at the end
+    TileArchive.update_archive(archive, steps(2), LATS, LONS, LABEL)
+
+    assert TileArchive.archived_dates(archive) == [2.0, 10.0, 18.0, 26.0]
+    with xr.open_dataset(archive) as ds:
+        assert ds.indexes['time'].is_monotonic_increasing
+        assert [float(v) for v in ds['lfmc'].values[:, 0, 0]] == [2.0, 10.0, 18.0, 26.0]
+        np.testing.assert_array_equal(ds['lat'].values, LATS)
+        np.testing.assert_array_equal(ds['lon'].values, LONS)
+        assert ds['lfmc'].attrs['granule'] == LABEL
+    assert os.listdir(str(tmp_path)) == [os.path.basename(archive)]
+
+
+def test_failed_update_leaves_the_archive(tmp_path):
+    archive = str(tmp_path.joinpath('LFMC_2019_%s.nc' % LABEL))
+    TileArchive.update_archive(archive, steps(10), LATS, LONS, LABEL)
+
+    def broken():
+        raise OSError('granule unreadable')
+
+    with pytest.raises(OSError):
+        TileArchive.update_archive(archive, {18.0: broken}, LATS, LONS, LABEL)
+    assert TileArchive.archived_dates(archive) == [10.0]
+    assert os.listdir(str(tmp_path)) == [os.path.basename(archive)]
+
+
+def test_replacing_keeps_open_readers_consistent(tmp_path):
+    archive = str(tmp_path.joinpath('LFMC_2019_%s.nc' % LABEL))
+    TileArchive.update_archive(archive, steps(10), LATS, LONS, LABEL)
+    with netCDF4.Dataset(archive, 'r') as reader:
+        TileArchive.update_archive(archive, steps(18), LATS, LONS, LABEL)
+        assert len(reader['time']) == 1
+    assert TileArchive.archived_dates(archive) == [10.0, 18.0]
+
+
+def test_derive_tile_lfmc_resumes(tmp_path):
+    path = str(tmp_path) + '/'
+    climatology(tmp_path, raster(0.0), raster(1.0))
+    files = [granule(tmp_path, 9, raster(0.5)), granule(tmp_path, 1, raster(1.0))]
+
+    assert TileArchive.derive_tile_lfmc(path, LABEL, files, (LATS, LONS)) == [2019]
+    assert TileArchive.derive_tile_lfmc(path, LABEL, files, (LATS, LONS)) == []
+
+    archive = path + 'LFMC_2019_%s.nc' % LABEL
+    with xr.open_dataset(archive) as ds:
+        assert list(ds['time'].dt.dayofyear.values) == [1, 9]
+        np.testing.assert_allclose(ds['lfmc'].values[:, 0, 0], [52.51 ** 1.36, 52.51 ** 0.68], rtol=1e-5)
+
+    with pytest.raises(ValueError):
+        TileArchive.derive_tile_lfmc(path, LABEL, [granule(tmp_path, 17, raster(0.5))], (LATS[:1], LONS))
+
+
+def test_archive_on_other_coords_is_rebuilt(tmp_path):
+    path = str(tmp_path) + '/'
+    climatology(tmp_path, raster(0.0), raster(1.0))
+    archive = path + 'LFMC_2019_%s.nc' % LABEL
+    TileArchive.update_archive(archive, steps(1, 9), LATS, LONS + 0.1, LABEL)
+
+    # Appending new-grid steps to it is refused
+    with pytest.raises(ValueError):
+        TileArchive.update_archive(archive, steps(17), LATS, LONS, LABEL)
+
+    files = [granule(tmp_path, 1, raster(0.5)), granule(tmp_path, 17, raster(0.5))]
+    assert TileArchive.derive_tile_lfmc(path, LABEL, files, (LATS, LONS)) == [2019]
+    first = (pd.Timestamp('2019-01-01') - TileArchive.EPOCH).days
+    assert TileArchive.archived_dates(archive) == [first, first + 16]
+    assert TileArchive.on_grid(archive, LATS, LONS)
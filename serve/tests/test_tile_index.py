@@ -0,0 +1,82 @@
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from serve.lfmc.models.TileIndex import TileIndex
+from serve.lfmc.process import TileArchive
+
+
+def tile(directory, year, label, lats, lons, value=1.0):
+    path = os.path.join(str(directory), 'LFMC_%s_%s.nc' % (year, label))
+    xr.Dataset({'lfmc': (('time', 'lat', 'lon'), np.full((2, len(lats), len(lons)), value, dtype=np.float32))},
+               coords={'time': pd.date_range('%s-01-01' % year, periods=2), 'lat': lats, 'lon': lons}
+               ).to_netcdf(path)
+    return path
+
+
+def test_update_and_intersecting(tmp_path):
+    west = tile(tmp_path, 2019, 'h29v12', [-30.0, -31.0], [140.0, 141.0])
+    east = tile(tmp_path, 2019, 'h30v12', [-30.0, -31.0], [142.0, 143.0])
+    other = tile(tmp_path, 2018, 'h29v12', [-30.0, -31.0], [140.0, 141.0])
+    index = TileIndex(str(tmp_path.joinpath('tiles.json')))
+    assert index.update([west, east, other, str(tmp_path.joinpath('unrelated.nc'))]) == 3
+    assert index.update([west, east, other]) == 0
+
+    assert index.tiles[west]['bbox'] == [-31.0, 140.0, -30.0, 141.0]
+    assert index.tiles[west]['tile'] == 'h29v12'
+    assert sorted(index.for_year(2019)) == sorted([west, east])
+    assert index.intersecting(2019, -30.5, 142.5, -35.0, 150.0) == [east]
+    assert index.intersecting(2019, -20.0, 100.0, -25.0, 110.0) == []
+
+    # Deleted tiles are dropped
+    assert index.update([west]) == 0
+    assert sorted(index.tiles) == [west]
+
+
+def test_corrupt_index_keeps_the_previous_one(tmp_path):
+    path = tmp_path.joinpath('tiles.json')
+    path.write_text(json.dumps({'a.nc': {'year': 2019}}))
+    index = TileIndex(str(path))
+    index.refresh()
+    path.write_text('{"a.nc": ')
+    index.refresh()
+    assert index.tiles == {'a.nc': {'year': 2019}}
+
+
+def test_concurrent_updates_are_not_lost(tmp_path):
+    tiles = [tile(tmp_path, 2000 + i, 'h29v12', [-30.0, -31.0], [140.0, 141.0]) for i in range(6)]
+    path = str(tmp_path.joinpath('index', 'tiles.json'))
+    # Each task indexes what it sees, eg., one more year written
+    threads = [threading.Thread(target=TileIndex(path).update, args=(tiles[:i + 1],)) for i in range(6)]
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+
+    index = TileIndex(path)
+    index.refresh()
+    assert set(index.tiles) <= set(tiles) and len(index.tiles) > 0
+    assert [f for f in os.listdir(os.path.dirname(path)) if f.endswith('.part')] == []
+
+
+def test_write_mosaic(tmp_path):
+    step = 0.5
+    lons = np.arange(8) * step + 140.25
+    # Neighbouring tiles share the lattice and overlap by two columns, NaN outside their footprints
+    west = tile(tmp_path, 2019, 'h29v12', [-30.25, -30.75], lons[:5], value=2.0)
+    east = tile(tmp_path, 2019, 'h30v12', [-30.25, -30.75], lons[3:], value=2.0)
+    with xr.open_dataset(east) as ds:
+        values = ds.load()
+    values['lfmc'][:, :, :2] = np.nan
+    os.remove(east)
+    values.to_netcdf(east)
+
+    target = str(tmp_path.joinpath('mosaic', 'LFMC_2019.nc'))
+    TileArchive.write_mosaic([west, east], target)
+    assert os.listdir(os.path.dirname(target)) == ['LFMC_2019.nc']
+    with xr.open_dataset(target) as ds:
+        np.testing.assert_allclose(ds['lon'].values, lons)
+        assert not np.isnan(ds['lfmc'].values).any()
+        assert ds['lfmc'].encoding['chunksizes'] == (1, 2, 8)